@@ -0,0 +1,114 @@
+"""
+Query embedding benchmark: /vdb/docs retrieval latency for cold vs warm queries.
+
+Weaviate and Ollama are replaced by local stubs (bench.stubs), Postgres by NullPool.
+Weaviate stub charges `--vectorize-latency` for queries it embeds itself (near_text),
+Ollama stub charges `--embed-latency` per /api/embed call (near_vector, embedded by the backend).
+
+- near_text:    every query is embedded by weaviate
+- near_vector:  query embedded by the backend, cached (LRU)
+- near_vector + --disk: embeddings also on disk, `restart` pass runs after app restart
+
+embed_calls and hit_rate are counted since the app start
+
+Usage:
+    python -m bench.embed_bench --queries 32 --embed-latency 0.03 --vectorize-latency 0.03 --disk
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+import src.main
+from bench.load_test import APP_PORT, OLLAMA_PORT, WEAVIATE_GRPC_PORT, WEAVIATE_PORT, null_pool
+from bench.stubs import (
+    FakeWeaviateSearch, make_ollama_app, make_weaviate_http_app, start_grpc, start_http, Server,
+)
+from src.core.settings import settings
+
+
+async def drive(queries: list[str]) -> dict:
+    """ Sequential /vdb/docs requests, then embedding stats """
+    latencies: list[float] = []
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{APP_PORT}', timeout=300) as client:
+        for query_text in queries:
+            start = time.perf_counter()
+            resp = await client.get('/vdb/docs', params={'query_text': query_text})
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        embeddings: dict = (await client.get('/vdb/embeddings')).json()
+
+    latencies.sort()
+    return {
+        'p50': round(latencies[len(latencies) // 2], 4),
+        'mean': round(statistics.mean(latencies), 4),
+        'max': round(latencies[-1], 4),
+        'embed_calls': embeddings['calls'],
+        'hit_rate': round(embeddings['cache']['hit_rate'], 3),
+    }
+
+
+def run_passes(passes: list[str], queries: list[str]) -> list[dict]:
+    """ Passes over the same queries on one app run. `restart` restarts the app before the pass """
+    results: list[dict] = []
+    app_server: Server | None = None
+    thread = None
+    try:
+        for name in passes:
+            if app_server is None or name == 'restart':
+                if app_server is not None:
+                    app_server.should_exit = True
+                    thread.join()
+                app_server = Server(uvicorn.Config(src.main.app, host='127.0.0.1', port=APP_PORT, log_level='warning'))
+                thread = app_server.start()
+            results.append({'pass': name, **asyncio.run(drive(queries))})
+    finally:
+        app_server.should_exit = True
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--queries', type=int, default=32)
+    parser.add_argument('--vdb-latency', type=float, default=0.01)
+    parser.add_argument('--vectorize-latency', type=float, default=0.03, help='Weaviate-side query embedding')
+    parser.add_argument('--embed-latency', type=float, default=0.03, help='Ollama /api/embed call')
+    parser.add_argument('--disk', action='store_true', help='Also run with on-disk embedding store')
+    args = parser.parse_args()
+
+    settings.weaviate_host = '127.0.0.1'
+    settings.weaviate_port = WEAVIATE_PORT
+    settings.weaviate_grpc_port = WEAVIATE_GRPC_PORT
+    settings.llm_url = f'http://127.0.0.1:{OLLAMA_PORT}'
+    settings.embed_url = settings.llm_url
+    src.main.init_pool = null_pool
+
+    start_http(make_weaviate_http_app(), WEAVIATE_PORT)
+    grpc_server = start_grpc(FakeWeaviateSearch(args.vdb_latency, args.vectorize_latency), WEAVIATE_GRPC_PORT)
+    start_http(make_ollama_app(embed_latency=args.embed_latency), OLLAMA_PORT)
+
+    queries: list[str] = [f'Музей Прадо {i}' for i in range(args.queries)]
+    results: list[dict] = []
+    settings.vdb_search_mode = 'near_text'
+    results += [{'mode': 'near_text', **r} for r in run_passes(['cold', 'warm'], queries)]
+    settings.vdb_search_mode = 'near_vector'
+    results += [{'mode': 'near_vector', **r} for r in run_passes(['cold', 'warm'], queries)]
+    if args.disk:
+        with tempfile.TemporaryDirectory() as path:
+            settings.embed_cache_path = path
+            results += [
+                {'mode': 'near_vector+disk', **r}
+                for r in run_passes(['cold', 'warm', 'restart'], queries)
+            ]
+    grpc_server.stop(0)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
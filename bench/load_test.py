@@ -0,0 +1,105 @@
+"""
+Load test: concurrent /front/query throughput on one uvicorn worker.
+
+Weaviate and Ollama are replaced by local stubs (bench.stubs), Postgres by NullPool.
+Compares settings.exec_mode = 'async' vs 'sync'.
+
+Usage:
+    python -m bench.load_test --requests 64 --concurrency 32 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import uvicorn
+
+import src.main
+from bench.stubs import (
+    FakeWeaviateSearch, NullPool, make_ollama_app, make_weaviate_http_app,
+    start_grpc, start_http, Server,
+)
+from src.core.settings import settings
+
+WEAVIATE_PORT = 18080
+WEAVIATE_GRPC_PORT = 18051
+OLLAMA_PORT = 18434
+APP_PORT = 18000
+
+
+async def null_pool():
+    return NullPool()
+
+
+async def drive(n_requests: int, concurrency: int) -> dict:
+    """ Fire n_requests to /front/query with given concurrency """
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors: int = 0
+
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{APP_PORT}', timeout=300) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                resp = await client.get('/front/query', params={'query_text': f'Музей Прадо {i}'})
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code != 200 or 'error' in str(resp.json().get('response_text')):
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': n_requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'rps': round(n_requests / elapsed, 2),
+        'p50': round(latencies[len(latencies) // 2], 3),
+        'max': round(latencies[-1], 3),
+    }
+
+
+def run_mode(exec_mode: str, args) -> dict:
+    settings.exec_mode = exec_mode
+    app_server = Server(uvicorn.Config(src.main.app, host='127.0.0.1', port=APP_PORT, log_level='warning'))
+    thread = app_server.start()
+    try:
+        result = asyncio.run(drive(args.requests, args.concurrency))
+    finally:
+        app_server.should_exit = True
+        thread.join()
+    return {'exec_mode': exec_mode, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--vdb-latency', type=float, default=0.02)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--modes', default='async,sync')
+    args = parser.parse_args()
+
+    settings.weaviate_host = '127.0.0.1'
+    settings.weaviate_port = WEAVIATE_PORT
+    settings.weaviate_grpc_port = WEAVIATE_GRPC_PORT
+    settings.llm_url = f'http://127.0.0.1:{OLLAMA_PORT}'
+    settings.embed_url = settings.llm_url
+    src.main.init_pool = null_pool
+
+    start_http(make_weaviate_http_app(), WEAVIATE_PORT)
+    grpc_server = start_grpc(FakeWeaviateSearch(args.vdb_latency), WEAVIATE_GRPC_PORT)
+    start_http(make_ollama_app(args.llm_latency), OLLAMA_PORT)
+
+    results = [run_mode(mode, args) for mode in args.modes.split(',')]
+    grpc_server.stop(0)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Metrics overhead benchmark: cost of the metric updates made for one /front/query, in microseconds.
+
+- request:    metric updates of one query: 8 status transitions, vdb/rerank/prompt/llm/total latencies,
+              prompt tokens, context docs
+- decorator:  measure_latency_async(stage=...) vs bare measure_latency_async, on an empty coroutine
+- render:     /metrics response body
+
+Usage:
+    python -m bench.metrics_bench --iterations 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from src.core.metrics import CONTEXT_DOCS, PROMPT_TOKENS, QUERY_STATUS, REGISTRY, STAGE_LATENCY
+from src.core.util import measure_latency_async
+from src.models.cat_public import Status
+
+STATUSES: list[Status] = [
+    Status.new, Status.vdb_start, Status.vdb_done, Status.rnk_start, Status.rnk_done,
+    Status.llm_start, Status.llm_done, Status.done,
+]
+
+
+def one_request():
+    """ Same calls as update_query_status, the stage decorators and save_query_result """
+    for status in STATUSES:
+        QUERY_STATUS.labels(status.value).inc()
+    for stage, latency in (('vdb', 0.02), ('rerank', 0.003), ('prompt', 0.001), ('llm', 1.5), ('total', 1.6)):
+        STAGE_LATENCY.labels(stage).observe(latency)
+    PROMPT_TOKENS.labels().observe(1500)
+    CONTEXT_DOCS.labels().observe(4)
+
+
+async def noop():
+    pass
+
+
+def per_call_us(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - start) / iterations * 1e6, 3)
+
+
+async def per_await_us(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    return round((time.perf_counter() - start) / iterations * 1e6, 3)
+
+
+async def run(iterations: int) -> dict:
+    plain = measure_latency_async(noop)
+    observed = measure_latency_async(stage='bench')(noop)
+    await per_await_us(observed, 1000)      # Warm-up
+    plain_us: float = await per_await_us(plain, iterations)
+    observed_us: float = await per_await_us(observed, iterations)
+    return {
+        'iterations': iterations,
+        'request_us': per_call_us(one_request, iterations),
+        'decorator_plain_us': plain_us,
+        'decorator_metrics_us': observed_us,
+        'decorator_overhead_us': round(observed_us - plain_us, 3),
+        'render_us': per_call_us(REGISTRY.render, max(1, iterations // 100)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.iterations)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
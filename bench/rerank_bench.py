@@ -0,0 +1,97 @@
+"""
+Reranking benchmark: prompt size and end-to-end /front/query latency with and without reranker.
+
+Weaviate and Ollama are replaced by local stubs (bench.stubs), Postgres by NullPool.
+The Ollama stub charges `--prefill` seconds per prompt token, so a shorter prompt is a faster answer.
+
+- none: settings.weaviate_doc_limit docs go to the prompt
+- bm25 (or a cross-encoder model): settings.rnk_candidates docs retrieved, settings.rnk_top_k go to the prompt
+
+Usage:
+    python -m bench.rerank_bench --requests 32 --rnk-models none,bm25 --prefill 0.0002
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+import uvicorn
+
+import src.main
+from bench.load_test import APP_PORT, OLLAMA_PORT, WEAVIATE_GRPC_PORT, WEAVIATE_PORT, null_pool
+from bench.stubs import (
+    FakeWeaviateSearch, make_ollama_app, make_weaviate_http_app, start_grpc, start_http, Server,
+)
+from src.core.settings import settings
+
+
+async def drive(n_requests: int) -> dict:
+    """ Sequential /front/query requests: latency without queueing effects """
+    latencies: list[float] = []
+    rnk_latencies: list[float] = []
+    context_docs: list[int] = []
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{APP_PORT}', timeout=300) as client:
+        for i in range(n_requests):
+            start = time.perf_counter()
+            resp = await client.get('/front/query', params={'query_text': f'Музей Прадо {i}'})
+            latencies.append(time.perf_counter() - start)
+            answer: dict = resp.json()
+            context_docs.append(answer['context_doc_count'])
+            rnk_latencies.append(answer['rnk_latency'] or 0.0)
+
+    latencies.sort()
+    return {
+        'requests': n_requests,
+        'context_docs': statistics.mean(context_docs),
+        'rnk_latency': round(statistics.mean(rnk_latencies), 4),
+        'p50': round(latencies[len(latencies) // 2], 3),
+        'mean': round(statistics.mean(latencies), 3),
+        'max': round(latencies[-1], 3),
+    }
+
+
+def run_model(rnk_model: str, ollama_app, args) -> dict:
+    settings.rnk_model = rnk_model
+    settings.cache_enabled = False      # Every request goes through the whole pipeline
+    ollama_app.state.prompt_tokens.clear()
+    app_server = Server(uvicorn.Config(src.main.app, host='127.0.0.1', port=APP_PORT, log_level='warning'))
+    thread = app_server.start()
+    try:
+        result = asyncio.run(drive(args.requests))
+    finally:
+        app_server.should_exit = True
+        thread.join()
+    tokens: list[int] = ollama_app.state.prompt_tokens
+    return {'rnk_model': rnk_model, 'prompt_tokens': round(statistics.mean(tokens)), **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--rnk-models', default='none,bm25')
+    parser.add_argument('--vdb-latency', type=float, default=0.02)
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--prefill', type=float, default=0.0002, help='LLM seconds per prompt token')
+    args = parser.parse_args()
+
+    settings.weaviate_host = '127.0.0.1'
+    settings.weaviate_port = WEAVIATE_PORT
+    settings.weaviate_grpc_port = WEAVIATE_GRPC_PORT
+    settings.llm_url = f'http://127.0.0.1:{OLLAMA_PORT}'
+    settings.embed_url = settings.llm_url
+    src.main.init_pool = null_pool
+
+    ollama_app = make_ollama_app(args.llm_latency, prefill=args.prefill)
+    start_http(make_weaviate_http_app(), WEAVIATE_PORT)
+    grpc_server = start_grpc(FakeWeaviateSearch(args.vdb_latency), WEAVIATE_GRPC_PORT)
+    start_http(ollama_app, OLLAMA_PORT)
+
+    results = [run_model(rnk_model, ollama_app, args) for rnk_model in args.rnk_models.split(',')]
+    grpc_server.stop(0)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+Local stand-ins for Weaviate (HTTP + gRPC) and Ollama servers.
+
+Used by benchmarks/load tests: the backend talks to them through its usual clients,
+so the whole pipeline is measured, except the real models.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent import futures
+from contextlib import asynccontextmanager
+from datetime import datetime, UTC
+from uuid import NAMESPACE_URL, UUID, uuid5
+
+import grpc
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.requests import Request
+from weaviate.proto.v1 import weaviate_pb2_grpc, search_get_pb2, properties_pb2
+
+WEAVIATE_VERSION = "1.30.0"
+
+
+def make_doc(i: int) -> dict:
+    """ Fake document with properties of the catsearch collection """
+    return {
+        'type':       'file',
+        'name':       f'{i:02d}_Великие_музеи_мира.pdf',
+        'site_name':  'Музеи',
+        'size':       1000 + i,
+        'link':       f'https://example.org/docs/{i}',
+        'content':    f'Документ {i}. ' + 'Текст о музеях мира. ' * 40,
+    }
+
+
+def doc_uuid(i: int) -> str:
+    return str(uuid5(NAMESPACE_URL, f'https://example.org/docs/{i}'))
+
+
+DOC_ROWS: dict[str, int] = {doc_uuid(i): i for i in range(1000)}
+
+
+def filter_ids(filters) -> list[str]:
+    """ uuids of id conditions in the filter tree """
+    if list(filters.on) == ['_id'] or filters.target.property == '_id':
+        return list(filters.value_text_array.values) or [filters.value_text]
+    return [uuid for nested in filters.filters for uuid in filter_ids(nested)]
+
+
+def requested_ids(request: search_get_pb2.SearchRequest) -> list[str] | None:
+    """ fetch_objects_by_ids: uuids of the id filter. None: not an id fetch """
+    if not request.HasField('filters'):
+        return None
+    return filter_ids(request.filters) or None
+
+
+class Latency:
+    """
+    Latency distribution of a stub, seconds:
+    `0.5` (fixed), `uniform:0.2:0.8` (min, max), `exp:0.5` (mean), `lognormal:0.5:0.4` (median, sigma)
+    """
+
+    def __init__(self, spec: float | str = 0.0, seed: int = None):
+        self.spec: str = str(spec)
+        kind, *params = self.spec.split(':') if ':' in self.spec else ('fixed', self.spec)
+        self.kind: str = kind
+        self.params: list[float] = [float(p) for p in params]
+        if kind not in ('fixed', 'uniform', 'exp', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {self.spec}")
+        self.random: random.Random = random.Random(seed)
+
+    @classmethod
+    def of(cls, latency: 'float | str | Latency') -> 'Latency':
+        return latency if isinstance(latency, Latency) else cls(latency)
+
+    def sample(self) -> float:
+        if self.kind == 'uniform':
+            return self.random.uniform(*self.params)
+        if self.kind == 'exp':
+            return self.random.expovariate(1 / self.params[0]) if self.params[0] else 0.0
+        if self.kind == 'lognormal':
+            return self.params[0] * self.random.lognormvariate(0, self.params[1])
+        return self.params[0]
+
+    def __repr__(self) -> str:
+        return self.spec
+
+
+def fake_embedding(text: str, dim: int = 64) -> list[float]:
+    """ Deterministic pseudo-embedding of the text """
+    digest = hashlib.sha512(text.encode()).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(dim)]
+
+
+class FakeWeaviateSearch(weaviate_pb2_grpc.WeaviateServicer):
+    """
+    gRPC Search: returns `limit` fake documents after `latency` seconds (float or Latency spec).
+    Queries embedded by weaviate (near_text, hybrid) take `vectorize_latency` more.
+    Fetch by ids returns those documents. Only requested properties are returned
+    """
+
+    def __init__(self, latency: float | str = 0.02, vectorize_latency: float | str = 0.0):
+        self.latency: Latency = Latency.of(latency)
+        self.vectorize_latency: Latency = Latency.of(vectorize_latency)
+
+    def Search(self, request: search_get_pb2.SearchRequest, context):
+        vectorize: bool = request.HasField('near_text') or request.HasField('hybrid_search')
+        took: float = self.latency.sample() + (self.vectorize_latency.sample() if vectorize else 0.0)
+        time.sleep(took)
+        results = []
+        ids: list[str] | None = requested_ids(request)
+        rows = range(request.limit or 6) if ids is None else [DOC_ROWS[u] for u in ids if u in DOC_ROWS]
+        wanted: set[str] = set(request.properties.non_ref_properties)
+        for i in rows:
+            fields = {}
+            for k, v in make_doc(i).items():
+                if wanted and not request.properties.return_all_nonref_properties and k not in wanted:
+                    continue
+                if isinstance(v, int):
+                    fields[k] = properties_pb2.Value(int_value=v)
+                else:
+                    fields[k] = properties_pb2.Value(text_value=v)
+            results.append(
+                search_get_pb2.SearchResult(
+                    properties=search_get_pb2.PropertiesResult(
+                        target_collection=request.collection,
+                        non_ref_props=properties_pb2.Properties(fields=fields),
+                    ),
+                    metadata=search_get_pb2.MetadataResult(
+                        id=doc_uuid(i),
+                        id_as_bytes=UUID(doc_uuid(i)).bytes,
+                        distance=0.1 * (i + 1),
+                        distance_present=True,
+                    ),
+                )
+            )
+        return search_get_pb2.SearchReply(took=took, results=results)
+
+
+def make_weaviate_http_app() -> FastAPI:
+    """ Fake weaviate REST: meta, readiness, schema (collections in app.state.collections, deletable) """
+    app = FastAPI()
+    app.state.collections = {'Catsearch'}
+
+    @app.get('/v1/meta')
+    async def meta():
+        return {'version': WEAVIATE_VERSION, 'hostname': 'http://fake-weaviate', 'modules': {}}
+
+    @app.get('/v1/.well-known/ready')
+    async def ready():
+        return {}
+
+    @app.get('/v1/.well-known/live')
+    async def live():
+        return {}
+
+    @app.get('/v1/schema')
+    async def schema():
+        return {'classes': [{'class': name, 'properties': [], 'vectorizer': 'none'} for name in sorted(app.state.collections)]}
+
+    @app.delete('/v1/schema/{name}')
+    async def delete_class(name: str):
+        app.state.collections.discard(name)
+        return {}
+
+    return app
+
+
+def prompt_tokens(prompt: str) -> int:
+    """ Rough token count of the prompt: ~4 chars per token """
+    return len(prompt) // 4 + 1
+
+
+def make_ollama_app(
+        latency: float | str = 0.5,
+        tokens: int = 20,
+        prefill: float = 0.0,
+        embed_latency: float | str = 0.0,
+        token_rate: float = None,
+        load_latency: float = 0.0,
+) -> FastAPI:
+    """
+    Fake Ollama. /api/generate waits `latency` seconds (float or Latency spec, spread over `tokens` tokens),
+    or `tokens / token_rate` seconds if token_rate (tokens per second) is set,
+    plus `prefill` seconds per prompt token. Prompt token counts are kept in app.state.prompt_tokens.
+    /api/embed waits `embed_latency` seconds per call, calls are counted in app.state.embed_calls.
+    app.state.fail = True: /api/generate, /api/show and /api/ps answer 500 (host down)
+    A model not in app.state.loaded (listed by /api/ps) is loaded first: `load_latency` seconds
+    """
+    latency: Latency = Latency.of(latency)
+    embed_latency: Latency = Latency.of(embed_latency)
+    app = FastAPI()
+    app.state.prompt_tokens = []
+    app.state.embed_calls = 0
+    app.state.fail = False
+    app.state.loaded = {'llama3:latest'}
+
+    @app.post('/api/generate')
+    async def generate(request: Request):
+        if app.state.fail:
+            return JSONResponse({'error': 'stub failure'}, status_code=500)
+        body: dict = await request.json()
+        model: str = body.get('model')
+        load: float = 0.0
+        if (name := model if ':' in model else f'{model}:latest') not in app.state.loaded:
+            load = load_latency
+            await asyncio.sleep(load)
+            app.state.loaded.add(name)
+        if 'prompt' not in body:        # Load the model
+            return {'model': model, 'response': '', 'done': True, 'done_reason': 'load'}
+        n_prompt: int = prompt_tokens(body.get('prompt', ''))
+        app.state.prompt_tokens.append(n_prompt)
+        generation: float = latency.sample() if token_rate is None else tokens / token_rate
+
+        def line(response: str, done: bool) -> str:
+            data = {
+                'model': model,
+                'created_at': datetime.now(UTC).isoformat(),
+                'response': response,
+                'done': done,
+            }
+            if done:
+                data.update({
+                    'done_reason': 'stop',
+                    'total_duration': int((load + generation + n_prompt * prefill) * 1e9),
+                    'load_duration': int(load * 1e9),
+                    'prompt_eval_count': n_prompt,
+                    'prompt_eval_duration': int(n_prompt * prefill * 1e9),
+                    'eval_count': tokens,
+                    'eval_duration': int(generation * 1e9),
+                })
+            return json.dumps(data) + '\n'
+
+        async def stream():
+            await asyncio.sleep(n_prompt * prefill)
+            for i in range(tokens):
+                await asyncio.sleep(generation / tokens)
+                yield line(f'tok{i} ', False)
+            yield line('', True)
+
+        if body.get('stream', True):
+            return StreamingResponse(stream(), media_type='application/x-ndjson')
+        await asyncio.sleep(generation + n_prompt * prefill)
+        return json.loads(line(' '.join(f'tok{i}' for i in range(tokens)), True))
+
+    @app.post('/api/embed')
+    async def embed(request: Request):
+        body: dict = await request.json()
+        texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+        app.state.embed_calls += 1
+        await asyncio.sleep(embed_latency.sample())
+        return {'model': body.get('model'), 'embeddings': [fake_embedding(t) for t in texts]}
+
+    @app.get('/api/tags')
+    async def tags():
+        return {'models': [{'name': 'llama3:latest', 'model': 'llama3:latest'}]}
+
+    @app.post('/api/show')
+    async def show(request: Request):
+        if app.state.fail:
+            return JSONResponse({'error': 'stub failure'}, status_code=500)
+        body: dict = await request.json()
+        return {'modelfile': '', 'details': {'family': 'llama'}, 'model_info': {}, 'model': body.get('model')}
+
+    @app.get('/api/ps')
+    async def ps():
+        if app.state.fail:
+            return JSONResponse({'error': 'stub failure'}, status_code=500)
+        return {'models': [{'name': name, 'model': name} for name in sorted(app.state.loaded)]}
+
+    return app
+
+
+class Server(uvicorn.Server):
+    """ uvicorn server running in a background thread """
+
+    def install_signal_handlers(self):
+        pass
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        while not self.started:
+            time.sleep(0.01)
+        return thread
+
+
+def start_http(app: FastAPI, port: int) -> Server:
+    server = Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    server.start()
+    return server
+
+
+def start_grpc(servicer: weaviate_pb2_grpc.WeaviateServicer, port: int, workers: int = 32) -> grpc.Server:
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    weaviate_pb2_grpc.add_WeaviateServicer_to_server(servicer, server)
+    server.add_insecure_port(f'127.0.0.1:{port}')
+    server.start()
+    return server
+
+
+class NullPool:
+    """ Stand-in for asyncpg pool (and its connections): accepts and drops statements """
+
+    def __init__(self):
+        self.executed: int = 0      # Rows "written"
+
+    async def execute(self, *args, **kwargs) -> str:
+        self.executed += 1
+        return 'INSERT 0 1'
+
+    async def executemany(self, query: str, args, **kwargs) -> None:
+        self.executed += len(args)
+
+    async def fetch(self, *args, **kwargs) -> list:
+        return []
+
+    async def fetchrow(self, *args, **kwargs):
+        return None
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def close(self) -> None:
+        return None
@@ -0,0 +1,270 @@
+"""
+Benchmark suite: /front/query and /vdb/docs latency and throughput per configuration and load level.
+
+Weaviate (HTTP + gRPC) and Ollama are replaced by local stubs (bench.stubs), Postgres by NullPool.
+Stub latencies are fixed or drawn from a distribution (bench.stubs.Latency spec):
+`0.5`, `uniform:0.2:0.8`, `exp:0.5`, `lognormal:0.5:0.4`.
+
+Scenarios (settings overrides, the app is restarted for each one):
+- async:     exec_mode=async, answer cache off, reranker off
+- sync:      exec_mode=sync, answer cache off, reranker off
+- cached:    async, answer cache on, queries repeat (--distinct queries)
+- rerank:    async, answer cache off, bm25 reranker
+
+Load levels:
+- --concurrency 1,8,32: closed loop, N clients send requests back to back
+- --rps 5,20: open loop, requests start on schedule, latency is counted from the scheduled start
+  (no coordinated omission: a stalled server is seen as latency, not as fewer requests)
+
+Output: JSON, one result per scenario x endpoint x load level
+(requests, errors, error_rate, throughput, p50/p95/p99/mean/max latency, seconds).
+--baseline: compare p95 and throughput with a previous output, exit code 1 on regressions
+
+Usage:
+    LOG_LEVEL=WARNING python -m bench.suite --concurrency 1,8,32 --requests 64 --output bench.json
+    LOG_LEVEL=WARNING python -m bench.suite --scenarios async,sync --rps 10,40 --duration 10
+    LOG_LEVEL=WARNING python -m bench.suite --llm-latency lognormal:0.5:0.4 --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import statistics
+import sys
+import time
+
+import httpx
+import uvicorn
+
+import src.main
+from bench.load_test import APP_PORT, OLLAMA_PORT, WEAVIATE_GRPC_PORT, WEAVIATE_PORT, null_pool
+from bench.stubs import (
+    FakeWeaviateSearch, Latency, make_ollama_app, make_weaviate_http_app, start_grpc, start_http, Server,
+)
+from src.core.settings import settings
+
+SCENARIOS: dict[str, dict] = {
+    'async':  {'exec_mode': 'async', 'cache_enabled': False, 'rnk_model': 'none'},
+    'sync':   {'exec_mode': 'sync', 'cache_enabled': False, 'rnk_model': 'none'},
+    'cached': {'exec_mode': 'async', 'cache_enabled': True, 'rnk_model': 'none'},
+    'rerank': {'exec_mode': 'async', 'cache_enabled': False, 'rnk_model': 'bm25'},
+}
+ENDPOINTS: list[str] = ['/front/query', '/vdb/docs']
+
+
+def quantile(values: list[float], q: float) -> float:
+    """ Nearest-rank quantile of sorted values """
+    return values[max(0, math.ceil(len(values) * q) - 1)] if values else 0.0
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    requests: int = len(latencies)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'elapsed': round(elapsed, 3),
+        'throughput': round((requests - errors) / elapsed, 2) if elapsed else 0.0,
+        'p50': round(quantile(latencies, 0.50), 4),
+        'p95': round(quantile(latencies, 0.95), 4),
+        'p99': round(quantile(latencies, 0.99), 4),
+        'mean': round(statistics.mean(latencies), 4) if latencies else 0.0,
+        'max': round(latencies[-1], 4) if latencies else 0.0,
+    }
+
+
+class Driver:
+    """ Requests to one endpoint of the app, latencies and errors """
+
+    def __init__(self, client: httpx.AsyncClient, endpoint: str, queries: list[str]):
+        self.client: httpx.AsyncClient = client
+        self.endpoint: str = endpoint
+        self.queries: list[str] = queries
+        self.latencies: list[float] = []
+        self.errors: int = 0
+
+    async def request(self, i: int, start: float = None):
+        """ start: scheduled start (open loop), default now """
+        start = time.perf_counter() if start is None else start
+        try:
+            resp: httpx.Response = await self.client.get(
+                self.endpoint, params={'query_text': self.queries[i % len(self.queries)]},
+            )
+            failed: bool = resp.status_code != 200 or (
+                self.endpoint == '/front/query' and str(resp.json().get('response_text')).startswith('error:')
+            )
+        except httpx.HTTPError:
+            failed = True
+        self.latencies.append(time.perf_counter() - start)
+        self.errors += failed
+
+    async def closed_loop(self, concurrency: int, n_requests: int) -> dict:
+        """ `concurrency` clients, each sends the next request when the previous one is done """
+        counter = iter(range(n_requests))
+
+        async def client():
+            for i in counter:
+                await self.request(i)
+
+        start: float = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return {'concurrency': concurrency, **summarize(self.latencies, self.errors, time.perf_counter() - start)}
+
+    async def open_loop(self, rps: float, duration: float) -> dict:
+        """ Requests start every 1/rps seconds for `duration` seconds, whatever the server does """
+        tasks: list[asyncio.Task] = []
+        start: float = time.perf_counter()
+        for i in range(int(rps * duration)):
+            scheduled: float = start + i / rps
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            tasks.append(asyncio.create_task(self.request(i, scheduled)))
+        await asyncio.gather(*tasks)
+        return {'rps': rps, **summarize(self.latencies, self.errors, time.perf_counter() - start)}
+
+
+async def drive(endpoint: str, load: tuple[str, float], queries: list[str], args) -> dict:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    base_url: str = f'http://127.0.0.1:{APP_PORT}'
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        # Warm-up: connections, lazy model loads. Not counted
+        warmup: Driver = Driver(client, endpoint, queries)
+        await asyncio.gather(*(warmup.request(i) for i in range(args.warmup)))
+
+        driver: Driver = Driver(client, endpoint, queries)
+        kind, level = load
+        if kind == 'concurrency':
+            return await driver.closed_loop(int(level), args.requests)
+        return await driver.open_loop(level, args.duration)
+
+
+def run_scenario(name: str, loads: list[tuple[str, float]], args) -> list[dict]:
+    """ All endpoints and load levels on one app run with the scenario settings """
+    overrides: dict = SCENARIOS[name]
+    saved: dict = {key: getattr(settings, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    # Cached: few distinct queries repeat, answers come from the cache after the first round.
+    # Otherwise every request of the run has its own query: no embedding cache hits either
+    distinct: int = args.distinct if settings.cache_enabled else None
+
+    app_server = Server(uvicorn.Config(src.main.app, host='127.0.0.1', port=APP_PORT, log_level='warning'))
+    thread = app_server.start()
+    results: list[dict] = []
+    try:
+        for endpoint in args.endpoints.split(','):
+            for load in loads:
+                kind, level = load
+                count: int = args.warmup + (args.requests if kind == 'concurrency' else int(level * args.duration))
+                queries: list[str] = [
+                    f'Музей Прадо {i}' if distinct else f'Музей Прадо {endpoint} {kind} {level} {i}'
+                    for i in range(distinct or count)
+                ]
+                result: dict = asyncio.run(drive(endpoint, load, queries, args))
+                results.append({'scenario': name, 'endpoint': endpoint, **result})
+                print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        app_server.should_exit = True
+        thread.join()
+        for key, value in saved.items():
+            setattr(settings, key, value)
+    return results
+
+
+def result_key(result: dict) -> tuple:
+    return result['scenario'], result['endpoint'], result.get('concurrency'), result.get('rps')
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    """ Results with p95 or throughput worse than baseline by more than `tolerance` (share) """
+    previous: dict[tuple, dict] = {result_key(r): r for r in baseline}
+    regressions: list[dict] = []
+    for result in results:
+        base: dict | None = previous.get(result_key(result))
+        if base is None:
+            continue
+        if result['p95'] > base['p95'] * (1 + tolerance) or result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append({
+                'scenario': result['scenario'], 'endpoint': result['endpoint'],
+                'concurrency': result.get('concurrency'), 'rps': result.get('rps'),
+                'p95': result['p95'], 'baseline_p95': base['p95'],
+                'throughput': result['throughput'], 'baseline_throughput': base['throughput'],
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', default='1,8,32', help='Closed loop levels, comma separated')
+    parser.add_argument('--rps', default='', help='Open loop levels (requests per second), comma separated')
+    parser.add_argument('--requests', type=int, default=64, help='Requests per closed loop level')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per open loop level')
+    parser.add_argument('--warmup', type=int, default=4, help='Requests before each level, not counted')
+    parser.add_argument('--distinct', type=int, default=8, help='Distinct queries of the cached scenario')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Request timeout, counted as error')
+    parser.add_argument('--vdb-latency', default='0.02', help='Weaviate search, seconds or distribution')
+    parser.add_argument('--embed-latency', default='0.01', help='Ollama /api/embed, seconds or distribution')
+    parser.add_argument('--llm-latency', default='0.5', help='Ollama generation, seconds or distribution')
+    parser.add_argument('--tokens', type=int, default=20, help='Generated tokens per answer')
+    parser.add_argument('--token-rate', type=float, default=None, help='Tokens per second, overrides --llm-latency')
+    parser.add_argument('--prefill', type=float, default=0.0, help='LLM seconds per prompt token')
+    parser.add_argument('--output', default=None, help='JSON file, default stdout')
+    parser.add_argument('--baseline', default=None, help='Previous JSON output to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 / throughput change')
+    args = parser.parse_args()
+
+    unknown: set[str] = set(args.scenarios.split(',')) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    loads: list[tuple[str, float]] = (
+        [('concurrency', float(c)) for c in args.concurrency.split(',') if c]
+        + [('rps', float(r)) for r in args.rps.split(',') if r]
+    )
+
+    settings.weaviate_host = '127.0.0.1'
+    settings.weaviate_port = WEAVIATE_PORT
+    settings.weaviate_grpc_port = WEAVIATE_GRPC_PORT
+    settings.llm_url = f'http://127.0.0.1:{OLLAMA_PORT}'
+    settings.embed_url = settings.llm_url
+    src.main.init_pool = null_pool
+
+    start_http(make_weaviate_http_app(), WEAVIATE_PORT)
+    grpc_server = start_grpc(FakeWeaviateSearch(Latency(args.vdb_latency)), WEAVIATE_GRPC_PORT)
+    start_http(
+        make_ollama_app(
+            Latency(args.llm_latency), args.tokens, args.prefill, Latency(args.embed_latency), args.token_rate,
+        ),
+        OLLAMA_PORT,
+    )
+
+    results: list[dict] = []
+    for name in args.scenarios.split(','):
+        results += run_scenario(name, loads, args)
+    grpc_server.stop(0)
+
+    report: dict = {
+        'config': {
+            'vdb_latency': args.vdb_latency, 'embed_latency': args.embed_latency,
+            'llm_latency': args.llm_latency, 'tokens': args.tokens, 'token_rate': args.token_rate,
+            'prefill': args.prefill, 'requests': args.requests, 'duration': args.duration,
+        },
+        'results': results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            report['regressions'] = compare(results, json.load(f)['results'], args.tolerance)
+
+    output: str = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import time
+from asyncio import Lock
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.types import Backend
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.vectordb.base import Doc
+
+
+class TTLCache:
+    """
+    LRU cache with TTL and size cap. Not thread safe: use from event loop only
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > time.monotonic()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups: int = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+class AnswerCache:
+    """
+    Cache of /front/query answers
+
+    - exact:    key = normalised query + config (llm model, collection, prompt template)
+    - semantic: answers of queries with close embeddings (cosine distance), same config
+    """
+
+    def __init__(self, max_size: int, ttl: float, semantic_distance: float = None):
+        self.exact: TTLCache = TTLCache(max_size, ttl)
+        self.semantic_distance: float = semantic_distance
+        # key -> (config key, normalised embedding)
+        self._vectors: dict[str, tuple[str, np.ndarray]] = {}
+        self.semantic_hits: int = 0
+        self.semantic_misses: int = 0
+        self.invalidations: int = 0
+
+    def get(self, key: str) -> Any:
+        return self.exact.get(key)
+
+    def get_similar(self, config_key: str, vector: list[float]) -> Any:
+        """ Answer of the closest cached query within semantic_distance """
+        # Drop vectors of evicted/expired answers
+        for key in [k for k in self._vectors if k not in self.exact]:
+            del self._vectors[key]
+        keys = [k for k, (c, _) in self._vectors.items() if c == config_key]
+        if not keys:
+            self.semantic_misses += 1
+            return None
+        matrix = np.stack([self._vectors[k][1] for k in keys])
+        distances = 1.0 - matrix @ normalize(vector)
+        best: int = int(np.argmin(distances))
+        if distances[best] > self.semantic_distance:
+            self.semantic_misses += 1
+            return None
+        self.semantic_hits += 1
+        return self.exact.get(keys[best])
+
+    def set(self, key: str, value: Any, config_key: str = None, vector: list[float] = None):
+        self.exact.set(key, value)
+        if vector is not None:
+            self._vectors[key] = (config_key, normalize(vector))
+
+    def clear(self):
+        self.exact.clear()
+        self._vectors.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.exact.stats(),
+            'semantic': self.semantic_distance is not None,
+            'semantic_distance': self.semantic_distance,
+            'semantic_size': len(self._vectors),
+            'semantic_hits': self.semantic_hits,
+            'semantic_misses': self.semantic_misses,
+            'invalidations': self.invalidations,
+        }
+
+
+class MemoryBackend(InMemoryBackend):
+    """ fastapi-cache in-memory backend with own store and a size cap: oldest entries are dropped first """
+
+    def __init__(self, max_size: int):
+        self._store: OrderedDict = OrderedDict()
+        self._lock: Lock = Lock()
+        self.max_size: int = max_size
+
+    async def set(self, key: str, value: bytes, expire: int = None):
+        await super().set(key, value, expire)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_size:
+            self._store.popitem(last=False)
+
+
+class RetrievalCache:
+    """
+    Cache of retrieved docs in the fastapi-cache backend (settings.cache_backend: memory, or redis shared by workers)
+
+    - key:      collection, its version, search mode, k, filters, query text
+    - value:    compact doc references: uuid, distance, settings.retrieval_cache_properties
+    - version:  per-collection token in the backend, replaced on writes (ingestion, delete, alias change).
+                Entries of the old version are not read any more and expire with ttl
+    Backend errors are logged and count as misses: retrieval goes on without the cache
+    """
+    PREFIX: str = 'retrieval'
+
+    def __init__(self, backend: Backend, ttl: int, properties: list[str] = None):
+        self.backend: Backend = backend
+        self.ttl: int = ttl
+        self.properties: list[str] | None = properties      # None: all
+        self.hits: int = 0
+        self.misses: int = 0
+        self.bumps: int = 0
+        self.errors: int = 0
+
+    def version_key(self, collection: str) -> str:
+        return f"{self.PREFIX}:version:{collection.lower()}"
+
+    async def version(self, collection: str) -> str:
+        version: bytes | None = await self.backend.get(self.version_key(collection))
+        return '0' if version is None else version.decode()
+
+    async def key(self, collection: str, query_text: str, k: int, filters: dict = None, mode: str = None) -> str:
+        params: str = json.dumps(
+            [
+                mode or settings.vdb_search_mode, settings.vdb_hybrid_alpha, settings.embed_model, k,
+                filters or {}, query_text.strip(),
+            ],
+            sort_keys=True, default=str, ensure_ascii=False,
+        )
+        version: str = await self.version(collection)
+        return f"{self.PREFIX}:{collection.lower()}:{version}:{hashlib.sha1(params.encode()).hexdigest()}"
+
+    async def get(self, key: str) -> list[Doc] | None:
+        try:
+            value: bytes | None = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Retrieval cache read failed: {repr(e)}")
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [Doc(uuid, distance, properties) for uuid, distance, properties in json.loads(value)]
+
+    async def set(self, key: str, docs: list[Doc]):
+        value: list = [
+            (
+                doc.uuid,
+                doc.distance,
+                doc.properties if self.properties is None else
+                {p: doc.properties[p] for p in self.properties if p in doc.properties},
+            )
+            for doc in docs
+        ]
+        try:
+            await self.backend.set(key, json.dumps(value, default=str, ensure_ascii=False).encode(), expire=self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Retrieval cache write failed: {repr(e)}")
+
+    async def bump(self, collection: str):
+        """
+        New version of the collection: cached docs of it are stale.
+        The version outlives the entries made before it (2 x ttl), else they could be read again
+        """
+        try:
+            await self.backend.set(self.version_key(collection), str(time.time_ns()).encode(), expire=2 * self.ttl)
+            self.bumps += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Retrieval cache invalidation failed: {collection}: {repr(e)}")
+
+    async def clear(self) -> int:
+        return await self.backend.clear(namespace=self.PREFIX)
+
+    def stats(self) -> dict:
+        lookups: int = self.hits + self.misses
+        return {
+            'backend': settings.cache_backend,
+            'ttl': self.ttl,
+            'properties': self.properties,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bumps': self.bumps,
+            'errors': self.errors,
+        }
+
+
+def normalize(vector: list[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def normalize_query(query_text: str) -> str:
+    """ Lower case, single spaces, no trailing punctuation """
+    return " ".join(query_text.lower().split()).rstrip("?!. ")
+
+
+def config_key(collection: str, filters: dict = None) -> str:
+    """
+    Active configuration the answer depends on, and query filters
+
+    Args:
+        collection: Physical collection the alias resolves to. Answers computed before a flip never match after it
+    """
+    prompt_hash: str = hashlib.sha1(settings.llm_prompt_template.encode()).hexdigest()
+    retrieval: str = f"{settings.vdb_search_mode}:{settings.vdb_hybrid_alpha}"
+    filters_key: str = json.dumps(filters, sort_keys=True, default=str) if filters else ""
+    return f"{settings.llm_model}|{collection}|{retrieval}|{prompt_hash}|{filters_key}"
+
+
+def answer_key(query_text: str, collection: str, filters: dict = None) -> str:
+    return hashlib.sha1(f"{config_key(collection, filters)}|{normalize_query(query_text)}".encode()).hexdigest()
+
+
+def init_answer_cache() -> AnswerCache:
+    return AnswerCache(
+        max_size=settings.cache_max_size,
+        ttl=settings.cache_ttl,
+        semantic_distance=settings.cache_semantic_distance if settings.cache_semantic else None,
+    )
+
+
+def init_cache_backend() -> Backend:
+    """ fastapi-cache backend by settings.cache_backend: memory | redis """
+    if settings.cache_backend == 'memory':
+        return MemoryBackend(settings.cache_memory_size)
+    if settings.cache_backend == 'redis':
+        from fastapi_cache.backends.redis import RedisBackend      # Optional dependency: redis
+        from redis import asyncio as aioredis
+        return RedisBackend(aioredis.from_url(settings.cache_redis_url))
+    raise ValueError(f"Unknown cache_backend: {settings.cache_backend}")
+
+
+def init_retrieval_cache(backend: Backend) -> RetrievalCache | None:
+    """ None: settings.retrieval_cache_enabled is off """
+    if not settings.retrieval_cache_enabled:
+        return None
+    return RetrievalCache(backend, settings.retrieval_cache_ttl, settings.retrieval_cache_properties)
@@ -0,0 +1,159 @@
+"""
+Multi-worker mode: uvicorn workers (processes) share the runtime configuration through Postgres
+
+- settings changed by the API (RUNTIME_SETTINGS) are stored in backend_runtime_setting and loaded at start:
+  a new or restarted worker starts with the current configuration
+- every change is announced with NOTIFY on settings.cluster_channel. Each worker LISTENs on its own
+  connection and applies the events of the other workers:
+    settings:   runtime settings changed: reloaded from the table (NOTIFY payload is limited to 8000 bytes)
+    invalidate: a collection was written or deleted, or an alias changed: aliases reloaded, caches invalidated
+- the listening connection is checked every settings.cluster_check_interval and reopened if lost.
+  Events missed meanwhile are caught up by reloading settings and aliases
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, UTC
+
+import asyncpg
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.telemetry import upsert_sql
+from src.core.util import CatState
+from src.models.cat_public import RuntimeSetting
+from src.vectordb.retriever import invalidate_retrieval
+
+RUNTIME_SETTINGS: set[str] = {'llm_model', 'llm_prompt_template'}
+SETTING_SQL: str = upsert_sql(RuntimeSetting, ['name', 'value', 'worker', 'updated_at'], keys=['name'])
+
+
+class Cluster:
+    """ Runtime configuration and cache invalidation shared by the workers """
+
+    def __init__(self, cat_state: CatState):
+        self.cat_state: CatState = cat_state
+        self.worker_id: str = f"{os.getpid()}-{os.urandom(3).hex()}"
+        self.channel: str = settings.cluster_channel
+        self._conn: asyncpg.Connection = None
+        self._task: asyncio.Task = None
+        self._handlers: set[asyncio.Task] = set()
+        self.published: int = 0
+        self.received: int = 0
+        self.reconnects: int = 0
+        self.last_event_at: datetime = None
+
+    async def load_settings(self):
+        """ Runtime settings stored by any worker """
+        rows: list = await self.cat_state.db_pool.fetch(
+            f"SELECT name, value FROM {RuntimeSetting.__table__.fullname}"
+        )
+        self.apply_settings({row['name']: json.loads(row['value']) for row in rows if row['name'] in RUNTIME_SETTINGS})
+
+    def apply_settings(self, values: dict):
+        changed: dict = {name: value for name, value in values.items() if getattr(settings, name) != value}
+        for name, value in changed.items():
+            setattr(settings, name, value)
+        if changed:
+            self.cat_state.answer_cache.clear()     # Cached answers are for the old model/prompt
+            logger.info(f"Runtime settings applied: {', '.join(changed)}")
+
+    async def set_settings(self, **values):
+        """ Store runtime settings, apply them in this worker, announce them to the others """
+        for name in values:
+            if name not in RUNTIME_SETTINGS:
+                raise ValueError(f"Not a runtime setting: {name}")
+        now: datetime = datetime.now(UTC).replace(tzinfo=None)
+        await self.cat_state.db_pool.executemany(
+            SETTING_SQL,
+            [(name, json.dumps(value, ensure_ascii=False), self.worker_id, now) for name, value in values.items()],
+        )
+        self.apply_settings(values)
+        await self.publish('settings', names=list(values))
+
+    async def publish(self, event: str, **data):
+        """ NOTIFY the other workers. Errors are logged: the change is already applied in this worker """
+        payload: str = json.dumps({'event': event, 'worker': self.worker_id, **data}, ensure_ascii=False)
+        try:
+            await self.cat_state.db_pool.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            self.published += 1
+        except Exception as e:
+            logger.error(f"Cluster event not published: {event}: {repr(e)}")
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str):
+        event: dict = json.loads(payload)
+        if event.get('worker') == self.worker_id:
+            return
+        self.received += 1
+        self.last_event_at = datetime.now(UTC)
+        task: asyncio.Task = asyncio.create_task(self.handle(event))
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+
+    async def handle(self, event: dict):
+        try:
+            if event['event'] == 'settings':
+                await self.load_settings()
+            elif event['event'] == 'invalidate':
+                await self.cat_state.aliases.load()
+                self.cat_state.answer_cache.clear()
+                await invalidate_retrieval(self.cat_state, event['collection'], publish=False)
+            else:
+                logger.warning(f"Unknown cluster event: {event}")
+        except Exception as e:
+            logger.error(f"Cluster event failed: {event}: {repr(e)}")
+
+    async def listen(self):
+        self._conn = await asyncpg.connect(settings.db_conn_str, timeout=settings.cluster_check_interval)
+        await self._conn.add_listener(self.channel, self._on_notify)
+
+    async def _watch(self):
+        """ Reopen a lost listening connection, catch up with missed changes """
+        while True:
+            await asyncio.sleep(settings.cluster_check_interval)
+            if self._conn is not None and not self._conn.is_closed():
+                continue
+            try:
+                await self.listen()
+                await self.load_settings()
+                await self.cat_state.aliases.load()
+                self.cat_state.answer_cache.clear()
+                self.reconnects += 1
+                logger.info(f"Cluster listener reconnected: {self.worker_id}")
+            except Exception as e:
+                logger.warning(f"Cluster listener reconnect failed: {repr(e)}")
+
+    async def start(self):
+        """ Load runtime settings, start listening. A DB without listener: retried by the watch task """
+        await self.load_settings()
+        try:
+            await self.listen()
+        except Exception as e:
+            logger.error(f"Cluster listener failed: {repr(e)}")
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, *self._handlers, return_exceptions=True)
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+    def stats(self) -> dict:
+        return {
+            'worker': self.worker_id,
+            'channel': self.channel,
+            'listening': self._conn is not None and not self._conn.is_closed(),
+            'published': self.published,
+            'received': self.received,
+            'reconnects': self.reconnects,
+            'last_event_at': self.last_event_at,
+            'settings': {name: str(getattr(settings, name))[:80] for name in sorted(RUNTIME_SETTINGS)},
+        }
+
+
+async def init_cluster(cat_state: CatState) -> Cluster:
+    cluster: Cluster = Cluster(cat_state)
+    await cluster.start()
+    logger.info(f"Cluster worker: {cluster.worker_id}")
+    return cluster
@@ -1,13 +1,17 @@
+import base64
+import json
+from datetime import datetime, timedelta, UTC
+from uuid import UUID
+
 import asyncpg
-from sqlalchemy import insert, update
-from sqlalchemy.dialects import postgresql
-from sqlalchemy.sql import bindparam
-from sqlalchemy.types import Interval
 
 from src.core.log import logger
+from src.core.metrics import QUERY_STATUS
 from src.core.settings import settings
+from src.core.telemetry import DETAIL_COLUMNS, JSON_COLUMNS
+from src.core.tracing import traced
 from src.core.util import CatState
-from src.models.cat_public import QueryStatus, QueryDetail, Status
+from src.models.cat_public import QueryDetail, QueryStatus, Status
 
 
 async def init_pool():
@@ -17,51 +21,111 @@ async def init_pool():
     return pool
 
 
-def compile_query(stmt) -> str:
-    result = stmt.compile(
-        dialect=postgresql.dialect(),
-        compile_kwargs={"literal_binds": True},
-    ).string
+@traced('register_query')
+async def register_query(params: dict, cat_state: CatState, **kwargs):
+    """
+    Register query in DB. Written in batches by telemetry writer
+    """
+    update_query_status(params.get('query_id'), Status.new, cat_state, params.get('timestamp'))
+    logger.debug(f"Registered query: {params.get('query_id')}")
+
+
+def update_query_status(
+        query_id: str, status: Status, cat_state: CatState, timestamp: datetime = None,
+):
+    """ Query status transition. Written in batches by telemetry writer, counted in metrics, seen by jobs """
+    QUERY_STATUS.labels(status.value).inc()
+    cat_state.telemetry.put_status(query_id, status.value, timestamp)
+    if cat_state.jobs is not None:
+        cat_state.jobs.on_status(query_id, status)
+
+
+def query_row(row: asyncpg.Record) -> dict:
+    """ backend_query_detail row -> json-friendly dict: UTC timestamps, latencies in seconds """
+    result: dict = {}
+    for k, v in row.items():
+        if isinstance(v, datetime):
+            v = v.replace(tzinfo=UTC)
+        elif isinstance(v, timedelta):
+            v = v.total_seconds()
+        elif k in JSON_COLUMNS and v is not None:
+            v = json.loads(v)
+        result[k] = v
     return result
 
 
-async def register_query(params: dict, cat_state: CatState, **kwargs):
+async def get_query(pool: asyncpg.Pool, query_id: str) -> dict | None:
     """
-    Register query in DB
+    Status and details of the query. Details are None while the query is in progress.
+    Both are written by telemetry writer: a query appears after settings.telemetry_flush_interval
     """
-    # params = kwargs.get('params')
-    # cat_state: CatState = kwargs.get('request').app.state.cat
-    pool: asyncpg.Pool = cat_state.db_pool
-    stmt = insert(QueryStatus).values(
-        query_id=params.get('query_id'),
-        status=Status.new,
-        timestamp=params.get('timestamp'),
+    row: asyncpg.Record | None = await pool.fetchrow(
+        f"SELECT s.status, {', '.join('d.' + c for c in DETAIL_COLUMNS[1:])} "
+        f"FROM {QueryStatus.__table__.fullname} s "
+        f"LEFT JOIN {QueryDetail.__table__.fullname} d USING (query_id) "
+        f"WHERE s.query_id = $1",
+        query_id,
     )
-    res = await pool.execute(compile_query(stmt))
-    logger.debug(f"Registered query: {res}")
+    if row is None:
+        return None
+    result: dict = query_row(row)
+    if result['query_text'] is None:       # No details yet
+        result = {'status': result['status']}
+    return {'query_id': query_id, **result}
+
 
+def encode_cursor(timestamp: datetime, query_id: str) -> str:
+    """ Keyset pagination cursor: last (timestamp, query_id) of the page """
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{query_id}".encode()).decode()
 
-async def update_query_status():
-    pass
 
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        timestamp, query_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), str(UUID(query_id))       # naive UTC, as in the table
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
-async def get_query_status():
-    pass
 
+async def query_history(
+        pool: asyncpg.Pool, limit: int, cursor: str = None, with_docs: bool = False,
+) -> tuple[list[dict], str | None]:
+    """
+    Finished queries, newest first. Keyset pagination on (timestamp DESC, query_id DESC):
+    the timestamp index is used for any page, unlike OFFSET
 
-async def update_query_detail(**kwargs):
-    params: dict = kwargs.get('params')
-    cat_state: CatState = kwargs.get('request').app.state.cat
-    pool: asyncpg.Pool = cat_state.db_pool
-    stmt = update(QueryDetail).where(
-        QueryDetail.query_id == params.get('query_id')
-    ).values(
-        # TODO: I'm here. It's failing with an error:
-        #  sqlalchemy.exc.CompileError: Unconsumed column names: status
-        status=params.get('status'),
-        vdb=settings.vdb_type,
-        vdb_index=settings.vdb_index,
-        vdb_latency=bindparam("vdb_latency", type_=Interval),
+    Returns:
+        (queries, cursor of the next page or None)
+    """
+    columns: list[str] = [c for c in DETAIL_COLUMNS if with_docs or c != 'docs']
+    params: list = [limit + 1]
+    where: str = "WHERE timestamp IS NOT NULL"
+    if cursor is not None:
+        params += decode_cursor(cursor)
+        where += " AND timestamp <= $2 AND (timestamp < $2 OR query_id < $3::uuid)"
+    rows: list[asyncpg.Record] = await pool.fetch(
+        f"SELECT {', '.join(columns)} FROM {QueryDetail.__table__.fullname} {where} "
+        f"ORDER BY timestamp DESC, query_id DESC LIMIT $1",
+        *params,
     )
-    # res = await pool.execute(compile_query(stmt))
-    # logger.debug(f"Update result: {res}")
+    queries: list[dict] = [query_row(row) for row in rows[:limit]]
+    next_cursor: str | None = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1]['timestamp'], rows[limit - 1]['query_id'])
+    return queries, next_cursor
+
+
+def update_query_detail(params: dict, cat_state: CatState):
+    """
+    Query details: latencies (seconds), models and index names.
+    vdb_index: collection the query used (alias resolved), default settings.weaviate_collection.
+    Written in batches by telemetry writer. Missing values don't overwrite saved ones
+    """
+    row: dict = {
+        'vdb': settings.vdb_type,
+        'vdb_index': settings.weaviate_collection,
+        'llm_model': settings.llm_model,
+        'rnk_model': settings.rnk_model,
+        **{k: v for k, v in params.items() if k != 'vdb_index' or v is not None},
+    }
+    cat_state.telemetry.put_detail(row)
@@ -0,0 +1,241 @@
+"""
+Dependency health: probes and circuit breakers of Postgres (db), the vector store (vdb) and Ollama (llm)
+
+- probes every settings.health_interval, each within settings.health_timeout, latencies are recorded
+    db:  SELECT 1 on db_pool
+    vdb: weaviate is_ready (local store: always ready)
+    llm: /api/show of settings.llm_model on its hosts, one answer is enough
+- circuit breaker per dependency: settings.breaker_failures failures in a row (calls or probes) open it.
+  An open breaker fails calls at once (DependencyUnavailable, 503) instead of letting them hang
+  until request_timeout. After settings.breaker_open_seconds one trial call is let through (half-open):
+  success closes the breaker, failure opens it again. A successful probe closes it too
+- cached answers don't need the dependencies: they are served whatever the breakers are
+- /ready: 200 if the worker is warmed up and no breaker of settings.ready_dependencies is open
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from src.core.log import logger
+from src.core.metrics import REGISTRY, Family, Histogram
+from src.core.settings import settings
+from src.core.util import CatState
+
+PROBE_LATENCY: Family = REGISTRY.histogram(
+    'cat_dependency_probe_seconds', 'Dependency probe latency', ('dependency',),
+)
+BREAKER_REJECTIONS: Family = REGISTRY.counter(
+    'cat_breaker_rejections_total', 'Calls failed fast by an open circuit breaker', ('dependency',),
+)
+BREAKER_OPENINGS: Family = REGISTRY.counter(
+    'cat_breaker_openings_total', 'Circuit breaker transitions to open', ('dependency',),
+)
+
+
+class DependencyUnavailable(Exception):
+    """ Call is failed fast: circuit breaker of the dependency is open """
+
+    def __init__(self, dependency: str, retry_after: int):
+        super().__init__(f"Dependency unavailable: {dependency}")
+        self.dependency: str = dependency
+        self.retry_after: int = retry_after
+
+
+class CircuitBreaker:
+    """ closed -> open (failures in a row) -> half_open (after open_seconds: one trial call) -> closed | open """
+
+    def __init__(self, name: str, failures: int, open_seconds: float):
+        self.name: str = name
+        self.max_failures: int = failures
+        self.open_seconds: float = open_seconds
+        self.state: str = 'closed'
+        self.failures: int = 0          # In a row
+        self.opened_at: float = None    # monotonic
+        self.trial: bool = False        # half_open: trial call in flight
+        self.rejected: int = 0
+        self.openings: int = 0
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 1
+        return max(1, int(self.opened_at + self.open_seconds - time.monotonic() + 0.999))
+
+    def allow(self) -> bool:
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = 'half_open'
+            self.trial = False
+        if self.state == 'closed':
+            return True
+        if self.state == 'half_open' and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def check(self):
+        """
+        Raises:
+            DependencyUnavailable: breaker is open
+        """
+        if not self.allow():
+            self.rejected += 1
+            BREAKER_REJECTIONS.labels(self.name).inc()
+            raise DependencyUnavailable(self.name, self.retry_after())
+
+    def success(self):
+        if self.state != 'closed':
+            logger.info(f"Circuit breaker closed: {self.name}")
+        self.state = 'closed'
+        self.failures = 0
+        self.trial = False
+
+    def release(self):
+        """ Call passed check(), but never reached the dependency (rejected, cancelled): trial is given back """
+        if self.state == 'half_open':
+            self.trial = False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.max_failures):
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+            self.trial = False
+            self.openings += 1
+            BREAKER_OPENINGS.labels(self.name).inc()
+            logger.warning(f"Circuit breaker open: {self.name}: {self.failures} failures in a row")
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'retry_after': self.retry_after() if self.state == 'open' else None,
+            'rejected': self.rejected,
+            'openings': self.openings,
+        }
+
+
+class Dependency:
+    """ Probe, its latencies and outcome, circuit breaker """
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable]):
+        self.name: str = name
+        self.probe: Callable[[], Awaitable] = probe
+        self.breaker: CircuitBreaker = CircuitBreaker(name, settings.breaker_failures, settings.breaker_open_seconds)
+        self.latency: Histogram = PROBE_LATENCY.labels(name)
+        self.last_latency: float = None
+        self.healthy: bool = None       # None: not probed yet
+        self.error: str = None
+        self.checked_at: float = None   # monotonic
+
+    async def check(self):
+        start: float = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.probe(), settings.health_timeout)
+            if not self.healthy and self.healthy is not None:
+                logger.info(f"Dependency is up: {self.name}")
+            self.healthy, self.error = True, None
+            self.breaker.success()
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Dependency probe failed: {self.name}: {repr(e)}")
+            self.healthy, self.error = False, repr(e)
+            self.breaker.failure()
+        self.last_latency = time.perf_counter() - start
+        self.latency.observe(self.last_latency)
+        self.checked_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            'healthy': self.healthy,
+            'breaker': self.breaker.stats(),
+            'latency': round(self.last_latency, 4) if self.last_latency is not None else None,
+            'latency_avg': round(self.latency.sum / self.latency.count, 4) if self.latency.count else None,
+            'checked_ago': None if self.checked_at is None else round(time.monotonic() - self.checked_at, 1),
+            'error': self.error,
+        }
+
+
+class DependencyHealth:
+    """ Dependencies of the worker: periodic probes, breakers, readiness """
+
+    def __init__(self, dependencies: list[Dependency]):
+        self.dependencies: dict[str, Dependency] = {d.name: d for d in dependencies}
+        self._task: asyncio.Task = None
+
+    def check(self, *names: str):
+        """
+        Fail fast if a dependency is down
+
+        Raises:
+            DependencyUnavailable: breaker of a dependency is open
+        """
+        for name in names:
+            self.dependencies[name].breaker.check()
+
+    def record(self, name: str, ok: bool):
+        """ Outcome of a call that passed check() """
+        breaker: CircuitBreaker = self.dependencies[name].breaker
+        breaker.success() if ok else breaker.failure()
+
+    def release(self, name: str):
+        """ A call that passed check() didn't reach the dependency: no outcome """
+        self.dependencies[name].breaker.release()
+
+    @asynccontextmanager
+    async def guard(self, name: str) -> AsyncIterator[None]:
+        """ check(), then the outcome of the wrapped call: an exception is a failure """
+        self.check(name)
+        try:
+            yield
+        except Exception:
+            self.record(name, False)
+            raise
+        self.record(name, True)
+
+    async def probe(self):
+        await asyncio.gather(*(d.check() for d in self.dependencies.values()))
+
+    async def _run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(settings.health_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def ready(self) -> bool:
+        return all(
+            self.dependencies[name].breaker.state != 'open'
+            for name in settings.ready_dependencies if name in self.dependencies
+        )
+
+    def stats(self) -> dict:
+        return {name: dependency.stats() for name, dependency in self.dependencies.items()}
+
+
+def init_health(cat_state: CatState) -> DependencyHealth:
+    async def db():
+        await cat_state.db_pool.execute("SELECT 1")
+
+    async def vdb():
+        if not await cat_state.retriever.is_ready():
+            raise RuntimeError("Vector store is not ready")
+
+    async def llm():
+        async def show(url: str):
+            response = await cat_state.ht_client.post(f"{url}/api/show", json={'model': settings.llm_model})
+            response.raise_for_status()
+
+        hosts: list[str] = [backend.url for backend in cat_state.llm_backends.hosts(settings.llm_model)]
+        results: list = await asyncio.gather(*(show(url) for url in hosts), return_exceptions=True)
+        if all(isinstance(result, Exception) for result in results):
+            raise results[0] if results else RuntimeError(f"No LLM host for {settings.llm_model}")
+
+    health: DependencyHealth = DependencyHealth([Dependency('db', db), Dependency('vdb', vdb), Dependency('llm', llm)])
+    health.start()
+    return health
@@ -0,0 +1,195 @@
+"""
+Metrics: histograms and counters, exposed in prometheus text format on /metrics.
+No locks: updates are a few int/float additions under the GIL, cheap enough to run on every request
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable
+
+LATENCY_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS: tuple[float, ...] = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS: tuple[float, ...] = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets (prometheus style: bucket is `value <= le`)
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)   # Last one is +Inf
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """ [(le, count of values <= le), ..., ('+Inf', count)] """
+        result: list[tuple[str, int]] = []
+        total: int = 0
+        for le, n in zip([*map(str, self.buckets), '+Inf'], self.counts):
+            total += n
+            result.append((le, total))
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'buckets': dict(self.cumulative()),
+        }
+
+
+class Counter:
+    def __init__(self):
+        self.value: float = 0
+
+    def inc(self, n: float = 1):
+        self.value += n
+
+
+class Family:
+    """ Metric with labels: one Counter/Histogram per label values """
+
+    def __init__(self, name: str, help: str, kind: str, labels: tuple[str, ...], factory: Callable):
+        self.name: str = name
+        self.help: str = help
+        self.kind: str = kind       # counter | histogram | gauge
+        self.label_names: tuple[str, ...] = labels
+        self.factory: Callable = factory
+        self.children: dict[tuple[str, ...], Counter | Histogram] = {}
+
+    def labels(self, *values: str) -> Counter | Histogram:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def samples(self) -> list[str]:
+        lines: list[str] = []
+        for values, child in self.children.items():
+            pairs: list[str] = [f'{k}="{v}"' for k, v in zip(self.label_names, values)]
+            if self.kind == 'histogram':
+                for le, count in child.cumulative():
+                    bucket: str = ",".join([*pairs, f'le="{le}"'])
+                    lines.append(f'{self.name}_bucket{{{bucket}}} {count}')
+                labels: str = f'{{{",".join(pairs)}}}' if pairs else ''
+                lines.append(f'{self.name}_sum{labels} {child.sum}')
+                lines.append(f'{self.name}_count{labels} {child.count}')
+            else:
+                value = child() if self.kind == 'gauge' else child.value
+                lines.append(f'{self.name}{{{",".join(pairs)}}} {value}' if pairs else f'{self.name} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.families: dict[str, Family] = {}
+
+    def add(self, family: Family) -> Family:
+        self.families[family.name] = family
+        if not family.label_names:
+            family.labels()     # Single series, rendered from the start
+        return family
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Family:
+        return self.add(Family(name, help, 'counter', labels, Counter))
+
+    def histogram(
+            self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Family:
+        return self.add(Family(name, help, 'histogram', labels, lambda: Histogram(buckets)))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Family:
+        """ Value is read on scrape """
+        return self.add(Family(name, help, 'gauge', (), lambda: func))
+
+    def register(self, name: str, help: str, histogram: Histogram) -> Family:
+        """ Existing histogram (e.g. LLM scheduler wait time) """
+        return self.add(Family(name, help, 'histogram', (), lambda: histogram))
+
+    def render(self) -> str:
+        """ Prometheus text exposition format """
+        lines: list[str] = []
+        for family in self.families.values():
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            lines.extend(family.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY: Registry = Registry()
+STAGE_LATENCY: Family = REGISTRY.histogram(
+    'cat_stage_latency_seconds', 'Query pipeline stage latency: vdb, rerank, prompt, llm, embed, total', ('stage',),
+)
+STAGE_ERRORS: Family = REGISTRY.counter(
+    'cat_stage_errors_total', 'Failed stage calls: vdb (weaviate), llm and embed (ollama), rerank', ('stage',),
+)
+QUERY_STATUS: Family = REGISTRY.counter('cat_query_status_total', 'Query status transitions', ('status',))
+PROMPT_TOKENS: Family = REGISTRY.histogram('cat_prompt_tokens', 'LLM prompt size, tokens', buckets=TOKEN_BUCKETS)
+CONTEXT_DOCS: Family = REGISTRY.histogram('cat_context_docs', 'Docs in the LLM prompt context', buckets=COUNT_BUCKETS)
+
+
+def observe_call(stage: str, func: Callable, on_latency: Callable[[object, float], object] = None) -> Callable:
+    """
+    Wrap sync or async func: latency into STAGE_LATENCY, exceptions into STAGE_ERRORS.
+    on_latency(result, latency): return value of the wrapper. Default: result
+    """
+    latency_histogram: Histogram | None = STAGE_LATENCY.labels(stage) if stage else None
+    errors: Counter | None = STAGE_ERRORS.labels(stage) if stage else None
+    finish: Callable = on_latency or (lambda result, latency: result)
+
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start: float = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:       # Cancellation (client gone, shutdown) is not a stage error
+                if errors is not None:
+                    errors.inc()
+                raise
+            latency: float = time.perf_counter() - start
+            if latency_histogram is not None:
+                latency_histogram.observe(latency)
+            return finish(result, latency)
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start: float = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc()
+                raise
+            latency: float = time.perf_counter() - start
+            if latency_histogram is not None:
+                latency_histogram.observe(latency)
+            return finish(result, latency)
+    return wrapper
+
+
+def timed(stage: str) -> Callable:
+    """ Decorator: stage latency and errors into metrics, return value unchanged """
+    return lambda func: observe_call(stage, func)
+
+
+def init_pool_metrics(pool):
+    """ db_pool utilisation gauges (asyncpg pool) """
+    if not hasattr(pool, 'get_size'):
+        return
+    REGISTRY.gauge('cat_db_pool_size', 'DB pool connections', pool.get_size)
+    REGISTRY.gauge('cat_db_pool_max_size', 'DB pool max connections', pool.get_max_size)
+    REGISTRY.gauge('cat_db_pool_in_use', 'DB pool connections in use', lambda: pool.get_size() - pool.get_idle_size())
+    REGISTRY.gauge(
+        'cat_db_pool_utilisation', 'DB pool connections in use / max',
+        lambda: (pool.get_size() - pool.get_idle_size()) / pool.get_max_size(),
+    )
@@ -12,18 +12,83 @@ class Settings(BaseSettings):
 
     request_timeout: int = 30
 
-    vdb_type: str        = 'weaviate'
+    # Query telemetry writer (backend_query_status, backend_query_detail)
+    telemetry_max_size: int          = 10000     # Buffered rows. Above: spill or drop
+    telemetry_batch_size: int        = 500
+    telemetry_flush_interval: float  = 1.0       # seconds
+    telemetry_spill_file: str | None = None      # Rows that don't fit the buffer. None: drop
+
+    # Tracing: spans of the query pipeline, trace id = query_id (src.core.tracing)
+    trace_exporter: str              = 'none'    # none | console | file
+    trace_file: str                  = 'data/traces.jsonl'    # file exporter: JSON lines
+    trace_sample_ratio: float        = 1.0       # Share of queries traced
+
+    # Query pipeline execution mode:
+    # - 'async': async weaviate/ollama clients, event loop is never blocked
+    # - 'sync':  blocking clients, run in a bounded thread pool (fallback)
+    exec_mode: str       = 'async'
+    sync_pool_size: int  = 8
+
+    vdb_type: str        = 'weaviate'   # Vector store: weaviate | local
+    vdb_search_mode: str = 'near_vector'  # near_vector (query embedded with embed_model) | near_text | bm25 | hybrid
+    vdb_hybrid_alpha: float = 0.5       # hybrid: 0 - bm25 only, 1 - vector only
+    # Lazy content: search returns light properties, content of the used docs is fetched by uuid (LRU by uuid)
+    vdb_lazy_content: bool              = True
+    vdb_light_properties: list[str]     = ['name', 'site_name', 'type', 'size', 'link', 'updated_at']
+    content_cache_size: int             = 5000      # Doc contents per worker
+    content_cache_ttl: int              = 3600      # seconds
+
+    # Vector DB. local: in-process numpy index, vectors made with embed_model
+    local_vdb_path: str                 = "data/local_vdb"
+    local_vdb_ivf_threshold: int        = 20000     # Collections above: approximate (IVF) search
+    local_vdb_nlist: int                = 0         # IVF lists. 0: sqrt(collection size)
+    local_vdb_nprobe: int               = 8         # IVF lists scanned per query
 
     # Vector DB. weaviate
     weaviate_host: str                  = "weaviate"
     weaviate_port: int                  = 8080
     weaviate_grpc_port: int             = 50051
     weaviate_api_key: str               = "Search_the_VK"
-    weaviate_collection: str            = "catsearch"
+    weaviate_collection: str            = "catsearch"       # Alias (or collection) used by queries
     weaviate_api_endpoint: str          = "http://ollama:11434"
     # Model name. If it's `None`, uses the server-defined default
     weaviate_doc_limit: int             = 6
 
+    # Query embeddings (ollama). Must be the same model as the collection vectorizer
+    embed_url: str                      = "http://ollama:11434"
+    embed_model: str                    = "nomic-embed-text"
+    embed_batch_size: int               = 32        # Texts per /api/embed call
+    embed_batch_wait: float             = 0.005     # seconds. Concurrent queries wait to share one call
+    embed_cache_size: int               = 10000     # Query embeddings in memory (LRU)
+    embed_cache_ttl: int                = 86400     # seconds
+    embed_cache_path: str | None        = None      # On-disk (memory-mapped) embedding store. None: memory only
+    embed_cache_disk_size: int          = 100000    # Embeddings on disk (ring buffer)
+
+    # Document ingestion: python -m src.ingest.ingest, POST /admin/ingest
+    ingest_workers: int                 = 0         # Chunking processes. 0: cpu count
+    ingest_chunk_size: int              = 500       # chars
+    ingest_chunk_overlap: int           = 100       # chars
+    ingest_extensions: str              = ".txt,.md"
+    ingest_embed_batch: int             = 64        # Chunks per /api/embed call
+    ingest_embed_concurrency: int       = 4         # Parallel /api/embed calls
+    ingest_files_in_flight: int         = 16        # Files hashed/chunked/embedded at once
+    # Vectorizer of new collections (ingestion, reindex). Vectors are ours, the vectorizer embeds near_text and
+    # hybrid queries: text2vec-ollama (weaviate_api_endpoint, embed_model) | none: near_vector and bm25 only
+    ingest_vectorizer: str              = "text2vec-ollama"
+
+    # Blue/green reindexing: POST /admin/reindex builds a new collection behind the
+    # weaviate_collection alias, warms it with recent queries, validates and flips the alias
+    reindex_warmup_queries: int         = 200       # Recent distinct queries replayed
+    reindex_warmup_rounds: int          = 5         # Max replay rounds
+    reindex_concurrency: int            = 4         # Parallel replayed queries
+    reindex_latency_ratio: float        = 1.2       # Hot: new collection p95 <= old p95 * ratio
+    reindex_min_recall: float           = 0.8       # Share of old top-k documents (links) found by the new one
+
+    # Reranker: 'none', 'bm25' (lexical) or local cross-encoder model name (sentence-transformers)
+    rnk_model: str                      = "bm25"
+    rnk_candidates: int                 = 20        # Docs retrieved for reranking
+    rnk_top_k: int                      = 4         # Docs kept for the LLM prompt
+
     llm_url: str                        = "http://ollama:11434"
     llm_model: str                      = "llama3"
     llm_temperature: float              = 0.3
@@ -31,6 +96,33 @@ class Settings(BaseSettings):
     llm_top_k: float                    = 40
     llm_num_ctx: float                  = 8192  # 8K context
     llm_repeat_penalty: float           = 1.15
+    # LLM prompt context budget: llm_num_ctx - llm_answer_tokens - prompt template and question
+    llm_answer_tokens: int              = 1024      # Reserved for the answer
+    llm_doc_min_tokens: int             = 64        # Docs with a smaller share of the budget are dropped
+    llm_tokenizer: str | None           = None      # HF tokenizer for exact token counts. None: approximate
+    # LLM admission control: parallel generations, waiting queue, max wait for a slot
+    llm_max_concurrency: int            = 4
+    llm_max_queue: int                  = 32
+    llm_queue_timeout: float            = 10.0      # seconds
+    # priority=high is for trusted callers: requests must send it in the X-Priority-Key header. None: high is refused
+    llm_priority_key: str | None        = None
+    # LLM backends: ollama hosts. Empty: llm_url only
+    llm_urls: list[str]                 = []
+    llm_backend_concurrency: int        = 4         # Parallel generations per host
+    llm_balance: str                    = 'least_outstanding'   # least_outstanding | latency (in-flight x EWMA)
+    llm_affinity_hosts: int             = 0         # Hosts per model (rendezvous hashing). 0: all hosts
+    llm_model_hosts: dict[str, list[str]] = {}      # model -> hosts. Overrides llm_affinity_hosts
+    llm_failover_attempts: int          = 2         # Backends tried per generation
+    llm_health_interval: float          = 10.0      # seconds
+    llm_health_timeout: float           = 2.0       # seconds
+    llm_unhealthy_errors: int           = 3         # Errors in a row: backend is out until a good health check
+    # LLM model residency: keep_alive, hot models pinged to stay loaded, model loaded before a switch
+    llm_keep_alive: str | int           = '30m'     # ollama keep_alive: '30m', seconds, -1 (forever)
+    llm_model_keep_alive: dict[str, str | int] = {}     # model -> keep_alive. Overrides llm_keep_alive
+    llm_hot_models: list[str]           = []        # Kept loaded, besides llm_model
+    llm_hot_interval: float             = 120.0     # Hot models ping period, seconds. Below keep_alive
+    llm_load_timeout: float             = 300.0     # Model load, seconds
+    llm_cold_load_seconds: float        = 1.0       # Load time counted as a cold start
     # 'updated_at': datetime.datetime(2025, 3, 28, 11, 7, 48, 983443, tzinfo=datetime.timezone.utc),
     # 'name': '02_Великие_музеи_мира_Прадо_Мадрид_2011.pdf',
     # 'site_name': 'Музеи',
@@ -63,6 +155,47 @@ class Settings(BaseSettings):
     #     3. Если ответа нет - скажи "Не знаю\""""
     # )
 
+    # Answer cache for /front/query
+    cache_enabled: bool                 = True
+    cache_ttl: int                      = 3600      # seconds
+    cache_max_size: int                 = 1000      # answers
+    # Semantic tier: reuse answers of queries with embeddings closer than cache_semantic_distance
+    cache_semantic: bool                = False
+    cache_semantic_distance: float      = 0.05      # cosine distance
+    # Retrieval cache: docs by collection version, query, search params. /front/query and /vdb/docs
+    retrieval_cache_enabled: bool       = True
+    retrieval_cache_ttl: int            = 600       # seconds
+    retrieval_cache_properties: list[str] | None = [    # Kept for the cached docs. Content: content store
+        'name', 'site_name', 'type', 'size', 'link', 'updated_at',
+    ]
+    # Cache store (fastapi-cache backend). redis: shared by all workers (needs `pip install redis`)
+    cache_backend: str                  = 'memory'  # memory | redis
+    cache_redis_url: str                = 'redis://localhost:6379/0'
+    cache_memory_size: int              = 10000     # memory: entries
+    # Identical concurrent queries share one retrieval + LLM generation
+    coalesce_enabled: bool              = True
+
+    # Job mode (/front/jobs): queries answered by a worker pool, independent of uvicorn request handling
+    job_workers: int                    = 4         # Concurrent pipelines. >= llm_max_concurrency saturates LLM
+    job_queue_size: int                 = 1000      # Waiting jobs. More: rejected (429)
+    job_ttl: float                      = 600.0     # Finished jobs are kept in memory, seconds
+    job_llm_timeout: float              = 300.0     # Max wait for an LLM slot, seconds
+    job_poll_timeout: float             = 30.0      # Max long-poll wait, seconds
+
+    # Multi-worker mode (uvicorn --workers, WEB_CONCURRENCY): runtime settings and invalidations via Postgres
+    cluster_channel: str                = 'cat_cluster'     # LISTEN/NOTIFY channel
+    cluster_check_interval: float       = 10.0      # Listening connection check, seconds
+    # Warm startup: /health is 503 until the vector store and the LLM model are warmed up
+    warmup_enabled: bool                = True
+    warmup_timeout: float               = 120.0     # Per step, seconds
+
+    # Dependency health: probes, circuit breakers, /ready (src.core.health)
+    health_interval: float              = 5.0       # Probes period, seconds
+    health_timeout: float               = 2.0       # Per probe, seconds
+    breaker_failures: int               = 5         # Failures in a row open the breaker
+    breaker_open_seconds: float         = 30.0      # Open breaker fails calls fast, then lets a trial call through
+    ready_dependencies: list[str]       = ['db', 'vdb', 'llm']   # /ready is 503 if one of these breakers is open
+
     # Ability to read variables from .env
     model_config = SettingsConfigDict(
         env_file='.env',
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight execution.
+    The execution runs as a separate task: a cancelled caller doesn't cancel the others
+    """
+
+    def __init__(self):
+        self._flights: dict[str, asyncio.Task] = {}
+        self.calls: int = 0         # All calls
+        self.coalesced: int = 0     # Calls served by an execution started by another call
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Returns:
+            (result, shared): shared is True if result came from another call's execution
+        """
+        self.calls += 1
+        task: asyncio.Task = self._flights.get(key)
+        shared: bool = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.create_task(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'coalescing_ratio': self.coalesced / self.calls if self.calls else 0.0,
+            'in_flight': len(self._flights),
+        }
@@ -0,0 +1,102 @@
+"""
+Warm startup: a worker reports ready on /health after its connections are open and the model is loaded
+
+- vector store: one search in the active collection (weaviate HTTP + gRPC connections, query embedding model,
+  local store: index loaded)
+- LLM: settings.llm_model and settings.llm_hot_models are loaded on their hosts (ollama /api/generate without prompt)
+Steps run concurrently, each within settings.warmup_timeout. A failed step is reported, the worker gets ready anyway.
+Startup-to-ready time counts from the process start: logged, /health, cat_startup_seconds
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from src.core.log import logger
+from src.core.metrics import REGISTRY
+from src.core.settings import settings
+from src.core.util import CatState
+
+IMPORTED_AT: float = time.time()
+
+
+def process_started() -> float:
+    """ Process start, unix time: /proc (Linux), else import of this module """
+    try:
+        with open('/proc/self/stat') as f:
+            ticks: int = int(f.read().rsplit(')', 1)[1].split()[19])    # Field 22: starttime, since boot
+        with open('/proc/uptime') as f:
+            uptime: float = float(f.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return IMPORTED_AT
+
+
+@dataclass
+class Startup:
+    started_at:     float = field(default_factory=process_started)     # unix
+    ready_at:       float = None
+    steps:          dict[str, dict] = field(default_factory=dict)      # step -> seconds, error
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def seconds(self) -> float | None:
+        """ Startup-to-ready time """
+        return None if self.ready_at is None else round(self.ready_at - self.started_at, 3)
+
+    def stats(self) -> dict:
+        return {
+            'status': 'ready' if self.ready else 'starting',
+            'worker_pid': os.getpid(),
+            'startup_seconds': self.seconds(),
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'warmup': self.steps,
+        }
+
+
+async def warm_vdb(cat_state: CatState):
+    await cat_state.retriever.search(
+        'warm-up', k=1, collection_name=cat_state.aliases.resolve(settings.weaviate_collection),
+        properties=settings.vdb_light_properties,
+    )
+
+
+async def warm_llm(cat_state: CatState):
+    """ Load the hot models on their hosts (src.llm.residency) """
+    await cat_state.llm_residency.warm_up()
+
+
+async def run_step(startup: Startup, name: str, step: Callable[[CatState], Awaitable], cat_state: CatState):
+    start: float = time.perf_counter()
+    error: str | None = None
+    try:
+        await asyncio.wait_for(step(cat_state), settings.warmup_timeout)
+    except Exception as e:
+        error = repr(e)
+        logger.warning(f"Warm-up failed: {name}: {error}")
+    startup.steps[name] = {'seconds': round(time.perf_counter() - start, 3), 'error': error}
+
+
+async def warm_up(startup: Startup, cat_state: CatState):
+    """ Warm-up steps, then ready """
+    logger.info(msg := f"Warming up: worker {os.getpid()} ...")
+    if settings.warmup_enabled:
+        await asyncio.gather(
+            run_step(startup, 'vdb', warm_vdb, cat_state),
+            run_step(startup, 'llm', warm_llm, cat_state),
+        )
+    startup.ready_at = time.time()
+    logger.info(f"{msg} done: ready {startup.seconds()} s after process start, warm-up: {startup.steps}")
+
+
+def init_startup(cat_state: CatState) -> tuple[Startup, asyncio.Task]:
+    """ Warm-up runs in background: /health answers 503 until it is done """
+    startup: Startup = Startup()
+    REGISTRY.gauge(
+        'cat_startup_seconds', 'Process start to ready (warm-up done), seconds. NaN: starting',
+        lambda: startup.seconds() if startup.ready else float('nan'),
+    )
+    return startup, asyncio.create_task(warm_up(startup, cat_state))
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, UTC
+
+import asyncpg
+from sqlalchemy import bindparam, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from src.core.log import logger
+from src.core.metrics import Histogram
+from src.core.settings import settings
+from src.models.cat_public import QueryStatus, QueryDetail
+
+STATUS_COLUMNS: list[str] = ['query_id', 'status', 'timestamp']
+DETAIL_COLUMNS: list[str] = [
+    'query_id', 'query_text', 'timestamp', 'total_latency',
+    'vdb', 'vdb_index', 'vdb_latency',
+    'llm_model', 'llm_latency',
+    'rnk_model', 'rnk_latency',
+    'response_text', 'prompt_tokens', 'docs',
+    'info',
+]
+TIMESTAMP_COLUMNS: set[str] = {'timestamp'}
+INTERVAL_COLUMNS: set[str] = {'total_latency', 'vdb_latency', 'llm_latency', 'rnk_latency'}
+JSON_COLUMNS: set[str] = {'docs', 'info'}
+
+
+def upsert_sql(
+        model,
+        columns: list[str],
+        keep: set[str] = frozenset(),
+        keys: list[str] = ('query_id',),
+) -> str:
+    """
+    Upsert statement with asyncpg positional params ($1, ...) in `columns` order.
+    Compiled once: executemany() reuses it as a prepared statement.
+    Columns missing in a row (NULL) don't overwrite existing values; `keep` columns
+    are never overwritten. `keys`: primary key columns (conflict target)
+    """
+    table = model.__table__
+    stmt = pg_insert(model).values({c: bindparam(c, type_=table.c[c].type) for c in columns})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            c: (
+                func.coalesce(table.c[c], stmt.excluded[c]) if c in keep
+                else func.coalesce(stmt.excluded[c], table.c[c])
+            )
+            for c in columns if c not in keys
+        },
+    )
+    compiled = stmt.compile(dialect=asyncpg_dialect())
+    assert list(compiled.positiontup) == columns
+    return compiled.string
+
+
+STATUS_SQL: str = upsert_sql(QueryStatus, STATUS_COLUMNS, keep={'timestamp'})
+DETAIL_SQL: str = upsert_sql(QueryDetail, DETAIL_COLUMNS, keep={'timestamp'})
+
+
+def to_record(row: dict, columns: list[str]) -> tuple:
+    """
+    Row of json-friendly values -> asyncpg record
+
+    - timestamp: ISO string -> naive UTC datetime (column is TIMESTAMP without tz)
+    - latencies: seconds -> timedelta (INTERVAL)
+    - docs, info: list, dict -> json string (JSONB)
+    """
+    record: list = []
+    for c in columns:
+        value = row.get(c)
+        if value is not None:
+            if c in TIMESTAMP_COLUMNS:
+                value = datetime.fromisoformat(value).astimezone(UTC).replace(tzinfo=None)
+            elif c in INTERVAL_COLUMNS:
+                value = timedelta(seconds=value)
+            elif c in JSON_COLUMNS:
+                value = json.dumps(value, ensure_ascii=False, default=str)
+        record.append(value)
+    return tuple(record)
+
+
+class TelemetryWriter:
+    """
+    Buffers QueryStatus/QueryDetail rows and writes them in batches
+
+    - put_*() never wait: if the buffer is full, rows are spilled to disk (or dropped)
+    - flush when batch_size rows are buffered or every flush_interval seconds
+    - spilled rows are loaded back on start, and after a successful flush while the buffer is less than half full
+    """
+
+    def __init__(
+            self,
+            pool: asyncpg.Pool,
+            max_size: int,
+            batch_size: int,
+            flush_interval: float,
+            spill_file: str = None,
+    ):
+        self.pool: asyncpg.Pool = pool
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.spill_file: str = spill_file
+        # Items: (table, row). table: 'status' | 'detail'
+        self._queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue(maxsize=max_size)
+        self._task: asyncio.Task = None
+        self._batch: list[tuple[str, dict]] = []  # Batch being collected/flushed by _run
+        self.written: int = 0
+        self.flushes: int = 0
+        self.flush_errors: int = 0
+        self.dropped: int = 0
+        self.spilled: int = 0
+        self.reloaded: int = 0
+        self._spill_pending: bool = spill_file is not None     # Rows on disk (from a previous process, maybe)
+        self.flush_latency: Histogram = Histogram()
+
+    def put_status(self, query_id: str, status: str, timestamp: datetime = None):
+        self._put('status', {
+            'query_id': query_id,
+            'status': status,
+            'timestamp': timestamp.isoformat() if timestamp else None,
+        })
+
+    def put_detail(self, row: dict):
+        """ row: DETAIL_COLUMNS, timestamp as datetime, latencies in seconds """
+        row = dict(row)
+        if isinstance(row.get('timestamp'), datetime):
+            row['timestamp'] = row['timestamp'].isoformat()
+        self._put('detail', row)
+
+    def _put(self, table: str, row: dict):
+        try:
+            self._queue.put_nowait((table, row))
+        except asyncio.QueueFull:
+            self._spill([(table, row)])
+
+    def _spill(self, items: list[tuple[str, dict]]):
+        """ Back-pressure: save rows to disk, if configured, drop otherwise """
+        if self.spill_file is None:
+            self.dropped += len(items)
+            return
+        try:
+            with open(self.spill_file, 'a', encoding='utf-8') as f:
+                for table, row in items:
+                    f.write(json.dumps([table, row], ensure_ascii=False, default=str) + '\n')
+            self.spilled += len(items)
+            self._spill_pending = True
+        except OSError as e:
+            logger.error(f"Telemetry spill failed: {repr(e)}")
+            self.dropped += len(items)
+
+    def _load_spilled(self):
+        """ Put spilled rows back into the buffer. Rows that don't fit stay on disk """
+        self._spill_pending = False
+        if self.spill_file is None or not os.path.exists(self.spill_file):
+            return
+        items: list = []
+        with open(self.spill_file, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    if line.strip():
+                        items.append(json.loads(line))
+                except ValueError:
+                    logger.error(f"Telemetry spill line dropped: {line[:200]}")
+                    self.dropped += 1
+        os.remove(self.spill_file)
+        rest: list = []
+        for table, row in items:
+            if self._queue.full():
+                rest.append((table, row))
+            else:
+                self._queue.put_nowait((table, row))
+        if rest:
+            self._spill(rest)
+        self.reloaded += len(items) - len(rest)
+        logger.info(f"Telemetry rows loaded from spill file: {len(items) - len(rest)}")
+
+    def _records(self, items: list[tuple[str, dict]]) -> tuple[list[tuple[str, dict]], list[tuple], list[tuple]]:
+        """
+        asyncpg records of the rows. Malformed rows (missing column, bad type) are dropped
+
+        Returns:
+            (valid items, status records, detail records)
+        """
+        valid: list[tuple[str, dict]] = []
+        statuses: list[tuple] = []
+        details: list[tuple] = []
+        for table, row in items:
+            try:
+                if table == 'status':
+                    statuses.append(to_record(row, STATUS_COLUMNS))
+                else:
+                    details.append(to_record(row, DETAIL_COLUMNS))
+            except Exception as e:
+                logger.error(f"Telemetry row dropped: {table}: {str(row)[:200]}: {repr(e)}")
+                self.dropped += 1
+                continue
+            valid.append((table, row))
+        return valid, statuses, details
+
+    async def flush(self, items: list[tuple[str, dict]]) -> bool:
+        """ Write rows in one transaction. Failed: rows are spilled """
+        statuses: list[tuple]
+        details: list[tuple]
+        items, statuses, details = self._records(items)
+        if not items:
+            return True
+        start: float = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    if statuses:
+                        await conn.executemany(STATUS_SQL, statuses)
+                    if details:
+                        await conn.executemany(DETAIL_SQL, details)
+        except Exception as e:
+            logger.error(f"Telemetry flush failed: {len(items)} rows: {repr(e)}")
+            self.flush_errors += 1
+            self._spill(items)
+            return False
+        self.flush_latency.observe(time.perf_counter() - start)
+        self.flushes += 1
+        self.written += len(items)
+        logger.debug(f"Telemetry flushed: {len(statuses)} statuses, {len(details)} details")
+        return True
+
+    async def _run(self):
+        while True:
+            self._batch = items = [await self._queue.get()]
+            deadline: float = time.monotonic() + self.flush_interval
+            while len(items) < self.batch_size:
+                timeout: float = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                flushed: bool = await self.flush(items)
+                self._batch = []
+                # DB is back and the buffer has room: spilled rows are retried (a long-running worker never restarts)
+                if flushed and self._spill_pending and self._queue.qsize() < self._queue.maxsize // 2:
+                    self._load_spilled()
+            except Exception as e:
+                # The writer must survive: rows buffered after this would never be written
+                logger.exception(f"Telemetry writer error: {repr(e)}")
+                self._batch = []
+
+    def start(self):
+        self._load_spilled()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """ Stop background writer and flush everything buffered """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        items: list[tuple[str, dict]] = self._batch
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        for i in range(0, len(items), self.batch_size):
+            await self.flush(items[i:i + self.batch_size])
+
+    def stats(self) -> dict:
+        return {
+            'buffered': self._queue.qsize(),
+            'max_size': self._queue.maxsize,
+            'written': self.written,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'reloaded': self.reloaded,
+            'flush_latency': self.flush_latency.stats(),
+        }
+
+
+def init_telemetry(pool: asyncpg.Pool) -> TelemetryWriter:
+    writer: TelemetryWriter = TelemetryWriter(
+        pool=pool,
+        max_size=settings.telemetry_max_size,
+        batch_size=settings.telemetry_batch_size,
+        flush_interval=settings.telemetry_flush_interval,
+        spill_file=settings.telemetry_spill_file,
+    )
+    writer.start()
+    return writer
@@ -0,0 +1,234 @@
+"""
+Tracing: spans of the query pipeline (OpenTelemetry-like, no SDK needed)
+
+- trace id = query_id (uuid hex), spans are kept in a context variable
+- sampling: settings.trace_sample_ratio, decided by trace id (same decision in every worker)
+- propagation: W3C `traceparent` header on outbound httpx requests (ollama, embeddings)
+- exporters: console (log), file (JSON lines, settings.trace_file), or any object with export(spans)
+
+Not sampled queries cost one context variable lookup per span
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from functools import wraps
+from typing import Callable, Iterator
+from uuid import UUID
+
+from src.core.log import logger
+from src.core.settings import settings
+
+
+@dataclass
+class Span:
+    trace_id:       str
+    span_id:        str
+    parent_span_id: str | None
+    name:           str
+    start_time:     int             # unix ns
+    end_time:       int = None      # unix ns
+    duration_ms:    float = None
+    status:         str = 'ok'      # ok | error
+    attributes:     dict = field(default_factory=dict)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+@dataclass
+class Trace:
+    root:       Span
+    spans:      list[Span] = field(default_factory=list)     # Finished, not exported yet
+    exported:   bool = False
+
+
+class ConsoleExporter:
+    def export(self, spans: list[dict]):
+        for span in spans:
+            logger.info(f"span: {json.dumps(span, ensure_ascii=False, default=str)}")
+
+    def close(self):
+        pass
+
+
+class FileExporter:
+    """ JSON lines, one span per line. One write per trace """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock: threading.Lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def export(self, spans: list[dict]):
+        lines: str = ''.join(json.dumps(span, ensure_ascii=False, default=str) + '\n' for span in spans)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_ratio: float = 1.0):
+        self.current: ContextVar[tuple[Trace, Span] | None] = ContextVar('cat_span', default=None)
+        self.exported: int = 0
+        self.export_errors: int = 0
+        self.configure(exporter, sample_ratio)
+
+    def configure(self, exporter=None, sample_ratio: float = 1.0):
+        """ exporter: object with export(spans: list[dict]) and close(). None: tracing off """
+        self.exporter = exporter
+        self.sample_ratio: float = sample_ratio if exporter is not None else 0.0
+
+    def sampled(self, trace_id: str) -> bool:
+        return int(trace_id[-8:], 16) < self.sample_ratio * 0x100000000
+
+    def start_trace(self, query_id: str, name: str, **attributes) -> Trace | None:
+        """ Root span of the query, made current. None if not sampled """
+        trace_id: str = UUID(query_id).hex
+        if not self.sampled(trace_id):
+            return None
+        root: Span = Span(trace_id, os.urandom(8).hex(), None, name, time.time_ns(), attributes=attributes)
+        trace: Trace = Trace(root)
+        self.current.set((trace, root))
+        return trace
+
+    def end_trace(self, trace: Trace = None, error: str = None):
+        """ End root span and export the trace. Default: trace of the current span """
+        if trace is None and (current := self.current.get()) is not None:
+            trace = current[0]
+        if trace is None or trace.root.end_time is not None:
+            return
+        if error is not None:
+            trace.root.status = 'error'
+            trace.root.set(error=error)
+        self.finish(trace, trace.root)
+
+    def finish(self, trace: Trace, span: Span):
+        span.end_time = time.time_ns()
+        span.duration_ms = (span.end_time - span.start_time) / 1e6
+        trace.spans.append(span)
+        if span is trace.root or trace.exported:       # Late spans (background work) go out one by one
+            self.export(trace.spans)
+            trace.spans = []
+            trace.exported = True
+
+    def export(self, spans: list[Span]):
+        try:
+            self.exporter.export([asdict(span) for span in spans])
+            self.exported += len(spans)
+        except Exception as e:
+            self.export_errors += 1
+            logger.warning(f"Trace export failed: {repr(e)}")
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span | None]:
+        """ Child of the current span. Yields None if the query is not traced """
+        current: tuple[Trace, Span] | None = self.current.get()
+        if current is None:
+            yield None
+            return
+        trace, parent = current
+        span: Span = Span(
+            trace.root.trace_id, os.urandom(8).hex(), parent.span_id, name, time.time_ns(), attributes=attributes,
+        )
+        token = self.current.set((trace, span))
+        try:
+            yield span
+        except BaseException as e:
+            span.status = 'error'
+            span.set(error=repr(e))
+            raise
+        finally:
+            try:
+                self.current.reset(token)
+            except ValueError:      # Generator closed in another context (client disconnected)
+                pass
+            self.finish(trace, span)
+
+    def current_span(self) -> Span | None:
+        current: tuple[Trace, Span] | None = self.current.get()
+        return None if current is None else current[1]
+
+    def activate(self, trace: Trace | None):
+        """ Make the root span current in another context (e.g. response streaming) """
+        if trace is not None:
+            self.current.set((trace, trace.root))
+
+    def traceparent(self) -> str | None:
+        span: Span | None = self.current_span()
+        return None if span is None else f"00-{span.trace_id}-{span.span_id}-01"
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def stats(self) -> dict:
+        return {
+            'exporter': type(self.exporter).__name__ if self.exporter is not None else None,
+            'sample_ratio': self.sample_ratio,
+            'exported': self.exported,
+            'export_errors': self.export_errors,
+        }
+
+
+tracer: Tracer = Tracer()      # Off until init_tracer()
+
+
+def init_tracer() -> Tracer:
+    """ Exporter by settings.trace_exporter: none | console | file """
+    exporter = None
+    if settings.trace_exporter == 'console':
+        exporter = ConsoleExporter()
+    elif settings.trace_exporter == 'file':
+        exporter = FileExporter(settings.trace_file)
+    elif settings.trace_exporter != 'none':
+        raise ValueError(f"Unknown trace_exporter: {settings.trace_exporter}")
+    tracer.configure(exporter, settings.trace_sample_ratio)
+    return tracer
+
+
+def span(name: str, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def current_span() -> Span | None:
+    return tracer.current_span()
+
+
+def traced(name: str) -> Callable:
+    """ Decorator: function call in a child span of the current one """
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _Done:
+    """ Awaitable that does nothing: lets one hook serve both sync and async httpx clients """
+    def __await__(self):
+        return iter(())
+
+
+def inject_traceparent(request) -> _Done:
+    """ httpx request hook (sync and async clients): W3C traceparent of the current span """
+    if (traceparent := tracer.traceparent()) is not None:
+        request.headers['traceparent'] = traceparent
+    return _Done()
@@ -1,12 +1,27 @@
-import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from functools import wraps
-from typing import Any
+from functools import partial
+from typing import Any, Callable
 
 import httpx
 from asyncpg.pool import Pool
-from langchain_ollama.llms import OllamaLLM
-from weaviate import WeaviateClient
+from weaviate import WeaviateClient, WeaviateAsyncClient
+
+from src.core.cache import AnswerCache, RetrievalCache
+from src.core.metrics import observe_call
+from src.core.singleflight import SingleFlight
+from src.core.telemetry import TelemetryWriter
+from src.llm.backends import LLMBackends
+from src.llm.context import TokenCounter
+from src.llm.residency import ModelResidency
+from src.llm.scheduler import LLMScheduler
+from src.rerank.base import Reranker
+from src.vectordb.alias import CollectionAliases
+from src.vectordb.base import Retriever
+from src.vectordb.content import ContentStore
+from src.vectordb.embedder import Embedder
 
 
 # Shared application variables class
@@ -14,30 +29,54 @@ from weaviate import WeaviateClient
 class CatState:
     db_pool:   Pool = None                 # DB connection pool
     ht_client: httpx.AsyncClient = None    # Http client
-    # wc:        WeaviateAsyncClient = None  # Weaviate DB client
+    wca:       WeaviateAsyncClient = None  # Weaviate DB async client
     wc:        WeaviateClient = None  # Weaviate DB client
-    llm_client: OllamaLLM = None
+    llm_backends: LLMBackends = None       # Ollama hosts: routing, balancing, health
+    llm_residency: ModelResidency = None   # Hot models kept loaded, cold starts
+    executor:  ThreadPoolExecutor = None   # Bounded pool for blocking (sync) calls
+    answer_cache: AnswerCache = None       # /front/query answers
+    retrieval_cache: RetrievalCache = None  # Retrieved docs by collection version. None: off
+    content_store: ContentStore = None     # Doc contents by uuid (lazy content)
+    cluster:   Any = None                  # Runtime settings and invalidations shared by workers
+    startup:   Any = None                  # Warm-up steps, startup-to-ready time (src.core.startup.Startup)
+    health:    Any = None                  # Dependency probes and breakers (src.core.health.DependencyHealth)
+    single_flight: SingleFlight = None     # Coalescing of identical concurrent queries
+    llm_scheduler: LLMScheduler = None     # Admission control for LLM calls
+    telemetry: TelemetryWriter = None      # Batched writer of query statuses/details
+    retriever: Retriever = None            # Vector store: weaviate, local
+    reranker:  Reranker = None             # None: no reranking
+    token_counter: TokenCounter = None     # LLM prompt token budgeting
+    embedder:  Embedder = None             # Batched, cached query embeddings
+    ingestor:  Any = None                  # Running or last ingestion run (src.ingest.ingest.Ingestor)
+    aliases:   CollectionAliases = None    # Collection aliases (blue/green reindexing)
+    reindexer: Any = None                  # Running or last reindex (src.ingest.reindex.Reindexer)
+    jobs:      Any = None                  # Job mode worker pool (src.front.jobs.JobPool)
+
 
+async def run_in_pool(cat_state: CatState, func: Callable, *args, **kwargs) -> Any:
+    """
+    Run blocking func in the bounded thread pool, so event loop is not blocked.
+    Context variables (current trace span) are passed to the thread
+    """
+    loop = asyncio.get_running_loop()
+    context: contextvars.Context = contextvars.copy_context()
+    return await loop.run_in_executor(cat_state.executor, partial(context.run, func, *args, **kwargs))
 
-def measure_latency_async(func):
-    @wraps(func)
-    async def wrapper(*args, **kwargs):
-        start = time.perf_counter()
-        result = await func(*args, **kwargs)
-        end = time.perf_counter()
-        latency = end - start
-        return result, latency
 
-    return wrapper
+def measure_latency_async(func: Callable = None, *, stage: str = None):
+    """
+    Returns (result, latency). With stage: latency and errors go into metrics too
 
+        @measure_latency_async
+        @measure_latency_async(stage='vdb')
+    """
+    if func is None:
+        return partial(measure_latency_async, stage=stage)
+    return observe_call(stage, func, lambda result, latency: (result, latency))
 
-def measure_latency(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs) -> tuple[Any, float]:
-        start = time.perf_counter()
-        result = func(*args, **kwargs)
-        end = time.perf_counter()
-        latency: float = end - start
-        return result, latency
 
-    return wrapper
+def measure_latency(func: Callable = None, *, stage: str = None):
+    """ Same as measure_latency_async, for sync functions """
+    if func is None:
+        return partial(measure_latency, stage=stage)
+    return observe_call(stage, func, lambda result, latency: (result, latency))
@@ -0,0 +1,198 @@
+"""
+Job mode of /front/query: the query is answered by a worker pool, the client polls or subscribes
+
+- POST /front/jobs registers the query (status `new`) and returns query_id at once
+- settings.job_workers workers run the pipeline (answer_query): status goes through vdb_start ... llm_done,
+  then done or error. Workers wait for an LLM slot up to settings.job_llm_timeout, not llm_queue_timeout
+- Live status is kept in memory, finished jobs for settings.job_ttl seconds. Later: /front/query/{query_id} (DB)
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.util import CatState
+from src.front.pipeline import answer_query
+from src.llm.scheduler import PRIORITY_ORDER, Priority
+from src.models.cat_public import Status
+
+FINAL: set[Status] = {Status.done, Status.error}
+
+
+class JobQueueFull(Exception):
+    """ Job is rejected: settings.job_queue_size jobs are waiting """
+
+
+@dataclass
+class Job:
+    result:       dict                  # query_id, query_text, timestamp, ... Updated with the answer
+    priority:     Priority
+    filters:      dict | None           # Vector DB filters (make_filters)
+    context:      contextvars.Context   # Context of the submitting request: trace span
+    status:       Status = Status.new
+    error:        str = None
+    submitted:    float = field(default_factory=time.monotonic)
+    started:      float = None
+    finished:     float = None
+    changed:      asyncio.Event = field(default_factory=asyncio.Event)    # Set and replaced on status change
+
+    @property
+    def query_id(self) -> str:
+        return self.result["query_id"]
+
+    def set_status(self, status: Status):
+        self.status = status
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """ Wait for the next status change. False on timeout """
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def view(self) -> dict:
+        """ Response of the job endpoints """
+        view: dict = {
+            "query_id": self.query_id,
+            "query_text": self.result["query_text"],
+            "timestamp": self.result["timestamp"],
+            "status": self.status,
+            "queue_wait": round((self.started or time.monotonic()) - self.submitted, 4),
+        }
+        if self.status == Status.done:
+            view["result"] = self.result
+        if self.error is not None:
+            view["error"] = self.error
+        return view
+
+
+class JobPool:
+    """ Queue of submitted jobs (priority, then FIFO) and the workers running them """
+
+    def __init__(self, cat_state: CatState, workers: int, max_queue: int, ttl: float, llm_timeout: float):
+        self.cat_state: CatState = cat_state
+        self.workers: int = workers
+        self.max_queue: int = max_queue
+        self.ttl: float = ttl
+        self.llm_timeout: float = llm_timeout
+        self.jobs: dict[str, Job] = {}                  # Queued, running, and finished within ttl
+        self._queue: list[tuple[int, int, Job]] = []    # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._ready: asyncio.Semaphore = asyncio.Semaphore(0)
+        self._tasks: list[asyncio.Task] = []
+        self.running: int = 0
+        self.submitted: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.rejected: int = 0
+
+    def admit(self):
+        """
+        Raises:
+            JobQueueFull: settings.job_queue_size jobs are waiting
+        """
+        if len(self._queue) >= self.max_queue:
+            self.rejected += 1
+            raise JobQueueFull(f"Job queue is full: {self.max_queue}")
+
+    def submit(self, result: dict, priority: Priority = Priority.normal, filters: dict = None) -> Job:
+        """
+        Queue a registered query. Called in the request context: the job runs in a copy of it
+
+        Raises:
+            JobQueueFull: settings.job_queue_size jobs are waiting
+        """
+        self.admit()
+        self._expire()
+        job: Job = Job(result, priority, filters, contextvars.copy_context())
+        self.jobs[job.query_id] = job
+        heapq.heappush(self._queue, (PRIORITY_ORDER[priority], next(self._seq), job))
+        self._ready.release()
+        self.submitted += 1
+        return job
+
+    def get(self, query_id: str) -> Job | None:
+        return self.jobs.get(query_id)
+
+    def on_status(self, query_id: str, status: Status):
+        """ Status transition of a query (update_query_status) """
+        if (job := self.jobs.get(query_id)) is not None and job.status not in FINAL:
+            job.set_status(status)
+
+    async def run(self, job: Job):
+        job.started = time.monotonic()
+        self.running += 1
+        try:
+            await answer_query(job.result, self.cat_state, job.priority, job.filters, self.llm_timeout)
+            failed: bool = job.result["response_text"].startswith("error:")
+            job.error = job.result["response_text"] if failed else None
+        except Exception as e:
+            logger.error(f"Job failed: {job.query_id}: {repr(e)}")
+            failed = True
+            job.error = repr(e)
+        finally:
+            self.running -= 1
+        job.finished = time.monotonic()
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+        job.set_status(Status.error if failed else Status.done)
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            job: Job = heapq.heappop(self._queue)[2]
+            # Own task in the submitting request context: the trace continues, nothing leaks between jobs
+            await asyncio.create_task(self.run(job), context=job.context)
+            self._expire()
+
+    def _expire(self):
+        """ Forget jobs finished more than ttl seconds ago """
+        deadline: float = time.monotonic() - self.ttl
+        for query_id in [q for q, job in self.jobs.items() if job.finished is not None and job.finished < deadline]:
+            del self.jobs[query_id]
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        """ Stop workers. Queued jobs are dropped, running ones cancelled """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._queue:
+            logger.warning(f"Jobs dropped on shutdown: {len(self._queue)}")
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'queued': len(self._queue),
+            'running': self.running,
+            'kept': len(self.jobs),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+
+def init_jobs(cat_state: CatState) -> JobPool:
+    jobs: JobPool = JobPool(
+        cat_state,
+        workers=settings.job_workers,
+        max_queue=settings.job_queue_size,
+        ttl=settings.job_ttl,
+        llm_timeout=settings.job_llm_timeout,
+    )
+    jobs.start()
+    logger.info(f"Job workers: {settings.job_workers}")
+    return jobs
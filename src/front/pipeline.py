@@ -0,0 +1,372 @@
+from datetime import datetime, timedelta, UTC
+
+from src.core.cache import AnswerCache, answer_key, config_key
+from src.core.db import update_query_status, update_query_detail
+from src.core.log import logger
+from src.core.metrics import CONTEXT_DOCS, PROMPT_TOKENS, STAGE_LATENCY
+from src.core.settings import settings
+from src.core.tracing import tracer
+from src.core.util import CatState
+from src.models.cat_public import Status
+from src.llm.context import Context, TokenCounter, context_budget, make_llm_prompt, prompt_base_tokens
+from src.llm.ollama_util import query_llm
+from src.llm.scheduler import Priority
+from src.rerank.base import Reranker
+from src.rerank.reranker import rerank_docs
+from src.vectordb.base import Doc
+from src.vectordb.retriever import fetch_content, query_docs
+
+
+def docs_sources(docs: list[Doc]) -> list[dict]:
+    """ Short description of retrieved docs (no content) """
+    return [
+        {
+            "uuid":      doc.uuid,
+            "distance":  doc.distance,
+            "name":      doc.properties.get('name'),
+            "site_name": doc.properties.get('site_name'),
+            "link":      doc.properties.get('link'),
+            "size":      doc.properties.get('size'),
+        }
+        for doc in docs
+    ]
+
+
+def query_collection(result: dict, cat_state: CatState) -> str:
+    """
+    Collection the alias (settings.weaviate_collection) resolves to now. The whole query uses it:
+    answer cache keys, search, telemetry (result["vdb_index"])
+    """
+    result["vdb_index"] = cat_state.aliases.resolve(settings.weaviate_collection)
+    return result["vdb_index"]
+
+
+def answer_keys(query_text: str, collection: str, filters: dict) -> tuple[str, str]:
+    """ (exact key, config key) of the answer """
+    return answer_key(query_text, collection, filters), config_key(collection, filters)
+
+
+async def answer_cache_get(
+        query_id: str, query_text: str, keys: tuple[str, str], cat_state: CatState,
+) -> tuple[dict | None, list[float] | None]:
+    """
+    Cached answer for the query: exact, then semantic (if enabled)
+
+    Returns:
+        (answer or None, query embedding if it was computed for the semantic tier)
+    """
+    if not settings.cache_enabled:
+        return None, None
+    cache: AnswerCache = cat_state.answer_cache
+    key, ckey = keys
+    if (answer := cache.get(key)) is not None:
+        logger.info(f"Answer cache hit: {query_id}")
+        return {**answer, "cache": "exact"}, None
+    if cache.semantic_distance is None:
+        return None, None
+
+    try:
+        vector: list[float] = await cat_state.embedder.embed_query(query_text)
+    except Exception as e:
+        logger.warning(f"Query embedding failed, semantic cache skipped: {query_id}: {repr(e)}")
+        return None, None
+    if (answer := cache.get_similar(ckey, vector)) is not None:
+        logger.info(f"Answer cache semantic hit: {query_id}")
+        return {**answer, "cache": "semantic"}, vector
+    return None, vector
+
+
+def answer_cache_set(
+        answer: dict, keys: tuple[str, str], vector: list[float] | None, cat_state: CatState,
+):
+    """ Save answer. LLM errors are not cached """
+    if not settings.cache_enabled or answer["response_text"].startswith("error:"):
+        return
+    key, ckey = keys
+    cat_state.answer_cache.set(key, answer, ckey, vector)
+
+
+async def fetch_context_content(
+        query_id: str, query_text: str, docs: list[Doc], cat_state: CatState,
+) -> tuple[list[Doc], float]:
+    """
+    Lazy content of the docs for the prompt: in rank order, settings.rnk_top_k docs per call,
+    until their content fills the context budget. Lower ranked docs are not used:
+    they would only take budget share from better ones
+
+    Returns:
+        (docs with content, latency)
+    """
+    counter: TokenCounter = cat_state.token_counter
+    budget: int = context_budget(prompt_base_tokens(query_text, counter))
+    tokens: int = 0
+    latency: float = 0.0
+    n: int = 0
+    while n < len(docs) and tokens < budget:
+        batch: list[Doc] = docs[n:n + settings.rnk_top_k]
+        batch_latency: float
+        batch, batch_latency = await fetch_content(query_id, batch, cat_state)
+        latency += batch_latency
+        tokens += sum(counter.count(doc.properties.get('content') or "") for doc in batch)
+        n += len(batch)
+    return docs[:n], latency
+
+
+async def retrieve(
+        query_id: str, query_text: str, cat_state: CatState, filters: dict = None, collection_name: str = None,
+) -> tuple[list[Doc], dict]:
+    """
+    Retrieval part of the pipeline
+
+    - 4. Query vectordb (settings.vdb_search_mode, property filters). With reranker: settings.rnk_candidates docs.
+         Reranker scores content (Reranker.needs_content) or settings.vdb_lazy_content is off: one search with
+         all properties. Else light properties, content is fetched after reranking for the prompt docs only
+    - 5. Rerank documents, keep settings.rnk_top_k
+
+    Returns:
+        (docs for the prompt, stats: vectordb_doc_count, vdb_latency, rnk_latency)
+    """
+    # Embed query (Inside weaviate. No need to implement)
+    # 4. Query vectordb
+    update_query_status(query_id, Status.vdb_start, cat_state)
+    reranker: Reranker | None = cat_state.reranker
+    lazy: bool = settings.vdb_lazy_content and (reranker is None or not reranker.needs_content)
+    docs: list[Doc]
+    vdb_latency: float
+    k: int = settings.rnk_candidates if reranker is not None else None
+    docs, vdb_latency = await query_docs(
+        query_id, query_text, cat_state, collection_name, k=k, filters=filters, content=not lazy,
+    )
+    update_query_status(query_id, Status.vdb_done, cat_state)
+    stats: dict = {"vectordb_doc_count": len(docs), "vdb_latency": vdb_latency, "rnk_latency": None}
+
+    # 5. Rerank documents
+    if reranker is not None:
+        update_query_status(query_id, Status.rnk_start, cat_state)
+        docs, stats["rnk_latency"] = await rerank_docs(query_id, query_text, docs, cat_state)
+        update_query_status(query_id, Status.rnk_done, cat_state)
+
+    if lazy:
+        content_latency: float
+        docs, content_latency = await fetch_context_content(query_id, query_text, docs, cat_state)
+        stats["vdb_latency"] += content_latency
+    return docs, stats
+
+
+async def run_query(
+        query_id: str,
+        query_text: str,
+        keys: tuple[str, str],
+        vector: list[float] | None,
+        cat_state: CatState,
+        priority: Priority = Priority.normal,
+        filters: dict = None,
+        llm_timeout: float = None,
+        collection_name: str = None,
+) -> dict:
+    """
+    RAG pipeline. Result is saved into answer cache
+
+    - Wait for LLM slot (admission control), at most llm_timeout seconds (default settings.llm_queue_timeout).
+      Rejected queries don't load vector DB. Nor do queries while the LLM circuit breaker is open
+    - 4. Query vectordb
+    - 5. Rerank documents
+    - 6. Query llm: prompt within the token budget
+
+    Returns:
+        answer: vectordb_doc_count, context_doc_count, prompt_tokens, sources, response_text,
+                vdb_latency, rnk_latency, llm_latency, llm_wait
+    Raises:
+        LLMOverloaded: no LLM slot
+        DependencyUnavailable: LLM or vector store circuit breaker is open
+    """
+    cat_state.health.check('llm')      # LLM down: fail fast, before waiting for a slot and loading vector DB
+    try:
+        async with cat_state.llm_scheduler.slot(priority, llm_timeout) as llm_wait:
+            # 4-5. Query vectordb, rerank
+            docs: list[Doc]
+            stats: dict
+            docs, stats = await retrieve(query_id, query_text, cat_state, filters, collection_name)
+
+            # 6. Query llm
+            llm_prompt: str
+            context: Context
+            llm_prompt, context = make_llm_prompt(query_text, docs, cat_state.token_counter)
+            update_query_status(query_id, Status.llm_start, cat_state)
+            llm_response: str
+            llm_latency: float
+            llm_response, llm_latency = await query_llm(query_id, llm_prompt, cat_state)
+            update_query_status(query_id, Status.llm_done, cat_state)
+            logger.info(f"LLM latency: {llm_latency}")
+    except BaseException:
+        cat_state.health.release('llm')     # LLM not reached (no slot, vector DB failed, cancelled): no outcome
+        raise
+
+    answer: dict = {
+        "vectordb_doc_count" : stats["vectordb_doc_count"],
+        "context_doc_count"  : len(context.docs),
+        "prompt_tokens"      : context.prompt_tokens,
+        "sources"            : docs_sources(context.docs),
+        "response_text"      : llm_response,
+    }
+    answer_cache_set(answer, keys, vector, cat_state)
+    return {
+        **answer,
+        "vdb_latency": stats["vdb_latency"],
+        "rnk_latency": stats["rnk_latency"],
+        "llm_latency": llm_latency,
+        "llm_wait": llm_wait,
+    }
+
+
+async def run_query_coalesced(
+        query_id: str,
+        query_text: str,
+        keys: tuple[str, str],
+        vector: list[float] | None,
+        cat_state: CatState,
+        priority: Priority = Priority.normal,
+        filters: dict = None,
+        llm_timeout: float = None,
+        collection_name: str = None,
+) -> tuple[dict, bool]:
+    """
+    run_query, shared by identical concurrent queries (same answer cache key)
+
+    Returns:
+        (answer, coalesced): coalesced is True if answer came from another query's run
+    """
+    def run():
+        return run_query(
+            query_id, query_text, keys, vector, cat_state, priority, filters, llm_timeout, collection_name,
+        )
+
+    if not settings.coalesce_enabled:
+        return await run(), False
+    answer, coalesced = await cat_state.single_flight.do(keys[0], run)
+    if coalesced:
+        logger.info(f"Query coalesced with in-flight identical query: {query_id}")
+    return answer, coalesced
+
+
+async def answer_query(
+        result: dict,
+        cat_state: CatState,
+        priority: Priority = Priority.normal,
+        filters: dict = None,
+        llm_timeout: float = None,
+) -> dict:
+    """
+    Answer of a registered query. Used by /front/query and job workers
+
+    - 3. Answer cache. Keys are taken before the pipeline: config may change meanwhile
+    - 4-6. RAG pipeline: vectordb, rerank, llm. Identical concurrent queries share one run
+    - 7. Result is saved (telemetry)
+
+    Args:
+        result:     query_id, query_text, timestamp, filters (as given), trace_id. Updated with the answer
+        filters:    Vector DB filters (make_filters)
+    Returns:
+        result
+    Raises:
+        LLMOverloaded: no LLM slot
+        DependencyUnavailable: LLM or vector store circuit breaker is open (cached answers are served anyway)
+    """
+    query_id: str = result["query_id"]
+    query_text: str = result["query_text"]
+
+    # 3. Answer cache
+    collection: str = query_collection(result, cat_state)
+    keys: tuple[str, str] = answer_keys(query_text, collection, filters)
+    cached, vector = await answer_cache_get(query_id, query_text, keys, cat_state)
+    if cached is not None:
+        latency: timedelta = datetime.now(UTC) - result["timestamp"]
+        result.update(
+            {
+                "vectordb_doc_count" : cached["vectordb_doc_count"],
+                "vdb_latency"        : 0.0,
+                "llm_latency"        : 0.0,
+                "latency"            : latency.total_seconds(),
+                "response_text"      : cached["response_text"],
+                "cache"              : cached["cache"],
+            }
+        )
+        save_query_result(result, cat_state, cached["sources"])
+        return result
+
+    # 4-6. RAG pipeline
+    answer: dict
+    coalesced: bool
+    try:
+        answer, coalesced = await run_query_coalesced(
+            query_id, query_text, keys, vector, cat_state, priority, filters, llm_timeout, collection,
+        )
+    except Exception as e:
+        save_query_result({**result, "error": repr(e)}, cat_state)
+        raise
+
+    # 7. Result
+    latency: timedelta = datetime.now(UTC) - result["timestamp"]
+    result.update(
+        {
+            "vectordb_doc_count" : answer["vectordb_doc_count"],
+            "context_doc_count"  : answer["context_doc_count"],
+            "prompt_tokens"      : answer["prompt_tokens"],
+            "vdb_latency"        : answer["vdb_latency"],
+            "rnk_latency"        : answer["rnk_latency"],
+            "llm_latency"        : answer["llm_latency"],
+            "llm_wait"           : answer["llm_wait"],
+            "latency"            : latency.total_seconds(),
+            "response_text"      : answer["response_text"],
+            "coalesced"          : coalesced,
+        }
+    )
+    save_query_result(result, cat_state, answer["sources"])
+    return result
+
+
+def save_query_result(result: dict, cat_state: CatState, sources: list[dict] = None):
+    """
+    Final status and details of the query: answer, context docs, latencies (telemetry)
+
+    Args:
+        result:     user_query response: query_id, query_text, timestamp, latencies, response_text, ...
+        cat_state:  Shared vars
+        sources:    LLM context docs (docs_sources)
+    """
+    failed: bool = "error" in result or result.get("response_text", "").startswith("error:")
+    tracer.end_trace(error=result.get("error") or (result.get("response_text") if failed else None))
+    if result.get("latency") is not None:
+        STAGE_LATENCY.labels('total').observe(result["latency"])
+    if "cache" not in result and not result.get("coalesced"):     # Prompts actually sent to LLM
+        if result.get("prompt_tokens") is not None:
+            PROMPT_TOKENS.labels().observe(result["prompt_tokens"])
+        if result.get("context_doc_count") is not None:
+            CONTEXT_DOCS.labels().observe(result["context_doc_count"])
+    update_query_status(result["query_id"], Status.error if failed else Status.done, cat_state)
+    update_query_detail(
+        {
+            'query_id':      result["query_id"],
+            'query_text':    result["query_text"],
+            'timestamp':     result["timestamp"],
+            'vdb_index':     result.get("vdb_index"),
+            'total_latency': result.get("latency"),
+            'vdb_latency':   result.get("vdb_latency"),
+            'rnk_latency':   result.get("rnk_latency"),
+            'llm_latency':   result.get("llm_latency"),
+            'response_text': result.get("response_text"),
+            'prompt_tokens': result.get("prompt_tokens"),
+            'docs': None if sources is None else [
+                {'uuid': s["uuid"], 'link': s["link"], 'distance': s["distance"]} for s in sources
+            ],
+            'info': {
+                k: result[k]
+                for k in (
+                    "vectordb_doc_count", "context_doc_count", "filters",
+                    "llm_wait", "coalesced", "cache", "error", "trace_id",
+                )
+                if k in result
+            },
+        },
+        cat_state,
+    )
@@ -1,17 +1,34 @@
+import hmac
+import json
+import time
 from datetime import datetime, UTC, timedelta
-from uuid import uuid4
+from typing import AsyncIterator
+from uuid import UUID, uuid4
 
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from starlette.requests import Request
-from weaviate.collections.classes.internal import QueryReturn
 
 from src.core.db import (
+    get_query,
+    query_history,
     register_query,
+    update_query_status,
 )
 from src.core.log import logger
+from src.core.settings import settings
+from src.core.tracing import Trace, tracer
 from src.core.util import CatState
-from src.llm.ollama_util import llm_make_query
-from src.vectordb.weaviate_vdb import retrieve_docs
+from src.front.jobs import FINAL, Job, JobQueueFull
+from src.front.pipeline import (
+    answer_cache_get, answer_cache_set, answer_keys, answer_query, docs_sources, query_collection, retrieve,
+    save_query_result,
+)
+from src.llm.context import Context, make_llm_prompt
+from src.llm.ollama_util import llm_stream_query
+from src.llm.scheduler import Priority
+from src.models.cat_public import Status
+from src.vectordb.base import Doc, make_filters
 
 router = APIRouter()
 
@@ -25,8 +42,12 @@ router = APIRouter()
 )
 async def user_query(
         request: Request,
-        background_tasks: BackgroundTasks,
         query_text: str,
+        priority: Priority = Priority.normal,
+        site_name: str = None,
+        doc_type: str = Query(None, alias="type"),
+        updated_from: datetime = None,
+        updated_to: datetime = None,
 ):
     """
     Response for user query:
@@ -41,12 +62,18 @@ async def user_query(
 
     Args:
         request:            Received request object
-        background_tasks:   Background tasks fixture object
         query_text:         Text query
+        priority:           LLM queue priority. high: trusted callers only (check_priority)
+        site_name:          Filter: documents of the site
+        doc_type:           Filter: document type (`type` property)
+        updated_from:       Filter: documents updated at or after
+        updated_to:         Filter: documents updated at or before
 
     Returns:
         Search response to user query (query_text)
     """
+    check_priority(request, priority)
+
     # 1. Log
     query_timestamp: datetime = datetime.now(UTC)     # Time request received
     query_id: str = str(uuid4())                        # Request (query) unique id
@@ -58,42 +85,459 @@ async def user_query(
     }
     # cat_state: Our shared vars
     cat_state: CatState = request.app.state.cat
+    trace: Trace | None = tracer.start_trace(query_id, 'front.query', priority=priority.value)
+    if trace is not None:
+        result["trace_id"] = trace.root.trace_id
+
+    filters: dict | None = make_filters(site_name, doc_type, updated_from, updated_to)
+    if filters:
+        result["filters"] = query_filters(site_name, doc_type, updated_from, updated_to)
 
     # 2. Save query into db
-    background_tasks.add_task(register_query, params=result, cat_state=cat_state)
-
-    # 3. Embed query (Inside weaviate. No need to implement)
-    # 4. Query vectordb
-    # docs, vdb_latency = await retrieve_docs_async(query_id, query_text, cat_state)
-    docs: QueryReturn
-    vdb_latency: float
-    docs, vdb_latency = retrieve_docs(query_id, query_text, cat_state)
-    result.update({"vectordb_doc_count": len(docs.objects)})
-    # result.update({"docs": docs})
-    # params = {'query_id': query_id, 'status': Status.vdb_done, 'vdb_latency': vdb_latency}
-    # background_tasks.add_task(
-    #     update_query_detail, params=params, cat_state=cat_state,
-    # )
-    ...
-
-    # 5. Rerank documents
-    ...
-
-    # 6. Query llm
-    llm_response: str
-    llm_latency: float
-    llm_response, llm_latency = llm_make_query(query_id, query_text, docs, cat_state)
-    logger.info(f"LLM latency: {llm_latency}")
-
-    # 7. Response to user
-    response_timestamp: datetime = datetime.now(UTC)
-    latency: timedelta = response_timestamp - query_timestamp
-    result.update(
-        {
-            "vdb_latency"        : vdb_latency,
+    await register_query(params=result, cat_state=cat_state)
+
+    # 3-7. Answer cache, RAG pipeline: vectordb, rerank, llm. Response to user
+    return await answer_query(result, cat_state, priority, filters)
+
+
+def check_priority(request: Request, priority: Priority):
+    """
+    priority=high jumps the LLM queue: trusted callers only (X-Priority-Key: settings.llm_priority_key)
+
+    Raises:
+        HTTPException: 403, high priority without the key
+    """
+    if priority != Priority.high:
+        return
+    key: str | None = request.headers.get('X-Priority-Key')
+    if settings.llm_priority_key is None or key is None \
+            or not hmac.compare_digest(key.encode(), settings.llm_priority_key.encode()):
+        raise HTTPException(status_code=403, detail="priority=high requires a valid X-Priority-Key header")
+
+
+def query_filters(site_name: str, doc_type: str, updated_from: datetime, updated_to: datetime) -> dict:
+    """ Filters given in the query, for the response and telemetry """
+    given: dict = {"site_name": site_name, "type": doc_type, "updated_from": updated_from, "updated_to": updated_to}
+    return {k: v for k, v in given.items() if v is not None}
+
+
+def sse_event(event: str, data) -> str:
+    """ Server-sent event message """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def prepend(first: str, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield first
+    async for item in rest:
+        yield item
+
+
+@logger.catch
+@router.get(
+    "/front/query/stream",
+    tags=['front'],
+    summary="Пользовательский запрос (streaming)",
+    description="""
+        Направить поисковый запрос. Ответ: server-sent events
+
+        - `query`:   query_id, query_text, timestamp
+        - `sources`: документы контекста LLM, сразу после vector DB и reranker
+        - `token`:   очередной фрагмент ответа LLM
+        - `done`:    prompt_tokens, vdb_latency, rnk_latency, llm_latency, latency
+        - `error`:   описание ошибки
+    """,
+)
+async def user_query_stream(
+        request: Request,
+        query_text: str,
+        priority: Priority = Priority.normal,
+        site_name: str = None,
+        doc_type: str = Query(None, alias="type"),
+        updated_from: datetime = None,
+        updated_to: datetime = None,
+):
+    """
+    Same as user_query, but LLM response is streamed as server-sent events.
+    Time to first byte is the vector DB latency, not the full LLM latency.
+    """
+    check_priority(request, priority)
+
+    # 1. Log
+    query_timestamp: datetime = datetime.now(UTC)
+    query_id: str = str(uuid4())
+    logger.info(f"User query (stream): {query_id}: {query_text}, {query_timestamp}")
+    result: dict = {
+        "query_id": query_id,
+        "query_text": query_text,
+        "timestamp": query_timestamp,
+    }
+    cat_state: CatState = request.app.state.cat
+    trace: Trace | None = tracer.start_trace(query_id, 'front.query.stream', priority=priority.value)
+    if trace is not None:
+        result["trace_id"] = trace.root.trace_id
+    filters: dict | None = make_filters(site_name, doc_type, updated_from, updated_to)
+    if filters:
+        result["filters"] = query_filters(site_name, doc_type, updated_from, updated_to)
+
+    # 2. Save query into db
+    await register_query(params=result, cat_state=cat_state)
+
+    # 3. Answer cache
+    collection: str = query_collection(result, cat_state)
+    keys: tuple[str, str] = answer_keys(query_text, collection, filters)
+    cached, vector = await answer_cache_get(query_id, query_text, keys, cat_state)
+
+    async def cached_events() -> AsyncIterator[str]:
+        tracer.activate(trace)      # Response is streamed in another task
+        yield sse_event("query", result)
+        yield sse_event("sources", cached["sources"])
+        yield sse_event("token", cached["response_text"])
+        done: dict = {
+            "query_id"           : query_id,
+            "vectordb_doc_count" : cached["vectordb_doc_count"],
+            "vdb_latency"        : 0.0,
+            "llm_latency"        : 0.0,
+            "latency"            : (datetime.now(UTC) - query_timestamp).total_seconds(),
+            "cache"              : cached["cache"],
+        }
+        save_query_result({**result, **done, "response_text": cached["response_text"]}, cat_state, cached["sources"])
+        yield sse_event("done", done)
+
+    async def events() -> AsyncIterator[str]:
+        tracer.activate(trace)
+        try:
+            yield sse_event("query", result)
+
+            # 4-5. Query vectordb, rerank
+            docs: list[Doc]
+            stats: dict
+            docs, stats = await retrieve(query_id, query_text, cat_state, filters, collection)
+            llm_prompt: str
+            context: Context
+            llm_prompt, context = make_llm_prompt(query_text, docs, cat_state.token_counter)
+            sources: list[dict] = docs_sources(context.docs)
+            yield sse_event("sources", sources)
+
+            # 6. Query llm
+            update_query_status(query_id, Status.llm_start, cat_state)
+            llm_start: float = time.perf_counter()
+            chunks: list[str] = []
+            async for chunk in llm_stream_query(query_id, llm_prompt, cat_state):
+                chunks.append(chunk)
+                yield sse_event("token", chunk)
+            llm_latency: float = time.perf_counter() - llm_start
+            update_query_status(query_id, Status.llm_done, cat_state)
+        except Exception as e:
+            logger.error(f"Streaming query failed: {query_id}: {repr(e)}")
+            save_query_result({**result, "error": repr(e)}, cat_state)
+            yield sse_event("error", {"query_id": query_id, "error": repr(e)})
+            return
+        finally:
+            cat_state.llm_scheduler.release()
+            cat_state.health.release('llm')     # No-op if the LLM call recorded an outcome
+
+        # 7. Response to user
+        answer_cache_set(
+            {
+                "vectordb_doc_count" : stats["vectordb_doc_count"],
+                "context_doc_count"  : len(context.docs),
+                "prompt_tokens"      : context.prompt_tokens,
+                "sources"            : sources,
+                "response_text"      : "".join(chunks),
+            },
+            keys, vector, cat_state,
+        )
+        latency: timedelta = datetime.now(UTC) - query_timestamp
+        done: dict = {
+            "query_id"           : query_id,
+            "vectordb_doc_count" : stats["vectordb_doc_count"],
+            "context_doc_count"  : len(context.docs),
+            "prompt_tokens"      : context.prompt_tokens,
+            "vdb_latency"        : stats["vdb_latency"],
+            "rnk_latency"        : stats["rnk_latency"],
             "llm_latency"        : llm_latency,
+            "llm_wait"           : llm_wait,
             "latency"            : latency.total_seconds(),
-            "response_text"      : llm_response,
         }
+        save_query_result({**result, **done, "response_text": "".join(chunks)}, cat_state, sources)
+        yield sse_event("done", done)
+
+    if cached is not None:
+        stream = cached_events()
+    else:
+        # Admission control and LLM circuit breaker before the response starts: rejection is a proper 429/503.
+        # The slot is released by events(). It's started here, so its `finally` runs
+        # even if the client disconnects before the response is sent
+        try:
+            cat_state.health.check('llm')
+            llm_wait: float = await cat_state.llm_scheduler.acquire(priority)
+        except Exception as e:
+            cat_state.health.release('llm')     # Rejected before the LLM call: no breaker outcome
+            save_query_result({**result, "error": repr(e)}, cat_state)
+            raise
+        stream = events()
+        stream = prepend(await anext(stream), stream)
+
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@logger.catch
+@router.get(
+    "/front/cache",
+    tags=['front'],
+    summary="Answer cache stats",
+    description="Answer cache: size, hits, misses, evictions",
+)
+async def get_cache(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.answer_cache.stats()
+
+
+@logger.catch
+@router.get(
+    "/front/coalescing",
+    tags=['front'],
+    summary="Query coalescing stats",
+    description="Identical concurrent queries sharing one pipeline run: calls, coalesced, ratio",
+)
+async def get_coalescing(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.single_flight.stats()
+
+
+@logger.catch
+@router.delete(
+    "/front/cache",
+    tags=['front'],
+    summary="Clear answer cache",
+    description="Drop all cached answers",
+)
+async def clear_cache(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    cat_state.answer_cache.clear()
+    return {'result': 'success'}
+
+
+@logger.catch
+@router.get(
+    "/front/telemetry",
+    tags=['front'],
+    summary="Query telemetry writer stats",
+    description="Buffered rows, written, flushes, dropped/spilled rows, flush latency histogram",
+)
+async def get_telemetry(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.telemetry.stats()
+
+
+@logger.catch
+@router.get(
+    "/front/history",
+    tags=['front'],
+    summary="История запросов",
+    description="""
+        Завершённые запросы, новые первыми: текст запроса, ответ, модели, латентности, размер промпта.
+        Keyset pagination: `cursor` из ответа - следующая страница, `null` - последняя.
+        Запросы попадают в историю с задержкой telemetry writer (TELEMETRY_FLUSH_INTERVAL)
+    """,
+)
+async def get_history(
+        request: Request,
+        limit: int = Query(20, ge=1, le=100),
+        cursor: str = None,
+        docs: bool = False,
+):
+    cat_state: CatState = request.app.state.cat
+    try:
+        queries, next_cursor = await query_history(cat_state.db_pool, limit, cursor, with_docs=docs)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {'queries': queries, 'cursor': next_cursor}
+
+
+@logger.catch
+@router.get(
+    "/front/query/{query_id}",
+    tags=['front'],
+    summary="Результат запроса",
+    description="""
+        Статус запроса; для завершённых - ответ, документы контекста (uuid, link, distance), латентности.
+        Запрос доступен с задержкой telemetry writer (TELEMETRY_FLUSH_INTERVAL)
+    """,
+)
+async def get_query_result(
+        request: Request,
+        query_id: UUID,
+):
+    cat_state: CatState = request.app.state.cat
+    query: dict | None = await get_query(cat_state.db_pool, str(query_id))
+    if query is None:
+        raise HTTPException(status_code=404, detail=f"Query not found: {query_id}")
+    return query
+
+
+@logger.catch
+@router.post(
+    "/front/jobs",
+    tags=['front'],
+    summary="Пользовательский запрос (job)",
+    description="""
+        Поставить поисковый запрос в очередь. Ответ сразу: query_id, статус `new`.
+        Запрос выполняет пул воркеров (JOB_WORKERS); статус и результат: `/front/jobs/{query_id}`
+        (long-poll: `wait`), `/front/jobs/{query_id}/events` (server-sent events)
+    """,
+    status_code=202,
+)
+async def submit_job(
+        request: Request,
+        query_text: str,
+        priority: Priority = Priority.normal,
+        site_name: str = None,
+        doc_type: str = Query(None, alias="type"),
+        updated_from: datetime = None,
+        updated_to: datetime = None,
+):
+    """
+    Same as user_query, the pipeline runs in a job worker
+
+    - 1. Log
+    - 2. Save query into db
+    - 3. Queue the job. Full queue: 429
+    """
+    check_priority(request, priority)
+
+    # 1. Log
+    query_timestamp: datetime = datetime.now(UTC)
+    query_id: str = str(uuid4())
+    logger.info(f"User query (job): {query_id}: {query_text}, {query_timestamp}")
+    result: dict = {
+        "query_id": query_id,
+        "query_text": query_text,
+        "timestamp": query_timestamp,
+    }
+    cat_state: CatState = request.app.state.cat
+    try:
+        cat_state.jobs.admit()      # Rejected before it's registered
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': '1'})
+    trace: Trace | None = tracer.start_trace(query_id, 'front.job', priority=priority.value)
+    if trace is not None:
+        result["trace_id"] = trace.root.trace_id
+    filters: dict | None = make_filters(site_name, doc_type, updated_from, updated_to)
+    if filters:
+        result["filters"] = query_filters(site_name, doc_type, updated_from, updated_to)
+
+    # 2. Save query into db
+    await register_query(params=result, cat_state=cat_state)
+
+    # 3. Queue the job
+    job: Job = cat_state.jobs.submit(result, priority, filters)
+    return job.view()
+
+
+@logger.catch
+@router.get(
+    "/front/jobs",
+    tags=['front'],
+    summary="Job workers stats",
+    description="Workers, queued and running jobs, completed, failed, rejected",
+)
+async def get_jobs(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.jobs.stats()
+
+
+async def find_job(cat_state: CatState, query_id: UUID) -> Job | dict:
+    """ Live job, or the query outcome from DB (job expired or submitted to another worker process) """
+    job: Job | None = cat_state.jobs.get(str(query_id))
+    if job is not None:
+        return job
+    query: dict | None = await get_query(cat_state.db_pool, str(query_id))
+    if query is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {query_id}")
+    return query
+
+
+@logger.catch
+@router.get(
+    "/front/jobs/{query_id}",
+    tags=['front'],
+    summary="Статус и результат job",
+    description="""
+        Статус запроса (new, vdb_start ... llm_done, done, error), для `done` - результат как у `/front/query`.
+        `wait` > 0: long-poll, ответ при смене статуса или через `wait` секунд (не больше JOB_POLL_TIMEOUT).
+        `until_done`: ждать завершения, а не смены статуса
+    """,
+)
+async def get_job(
+        request: Request,
+        query_id: UUID,
+        wait: float = Query(0.0, ge=0.0),
+        until_done: bool = False,
+):
+    cat_state: CatState = request.app.state.cat
+    job: Job | dict = await find_job(cat_state, query_id)
+    if isinstance(job, dict):
+        return job
+    deadline: float = time.monotonic() + min(wait, settings.job_poll_timeout)
+    while job.status not in FINAL and (timeout := deadline - time.monotonic()) > 0:
+        if not await job.wait(timeout) or not until_done:
+            break
+    return job.view()
+
+
+@logger.catch
+@router.get(
+    "/front/jobs/{query_id}/events",
+    tags=['front'],
+    summary="Статус job (streaming)",
+    description="""
+        Server-sent events:
+
+        - `status`: статус запроса при каждой смене
+        - `done`:   результат как у `/front/query`
+        - `error`:  описание ошибки
+    """,
+)
+async def get_job_events(
+        request: Request,
+        query_id: UUID,
+):
+    cat_state: CatState = request.app.state.cat
+    job: Job | dict = await find_job(cat_state, query_id)
+
+    async def events() -> AsyncIterator[str]:
+        if isinstance(job, dict):      # Finished long ago
+            yield sse_event("done" if job['status'] == Status.done else "error", job)
+            return
+        status: Status | None = None
+        while True:
+            if job.status != status:
+                status = job.status
+                yield sse_event("status", {"query_id": job.query_id, "status": status})
+            if status in FINAL:
+                view: dict = job.view()
+                yield sse_event("done" if status == Status.done else "error", view.get("result") or view)
+                return
+            if not await job.wait(settings.job_poll_timeout):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return result
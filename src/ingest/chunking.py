@@ -0,0 +1,62 @@
+"""
+File reading and chunking. Runs in worker processes: module level functions, picklable arguments
+"""
+import hashlib
+import os
+from typing import Iterator
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+BLOCK_SIZE: int = 1 << 20       # bytes read at once
+
+
+def list_files(root: str, extensions: list[str]) -> list[str]:
+    """ Files under root (or root itself) with given extensions, sorted """
+    if os.path.isfile(root):
+        return [root]
+    paths: list[str] = [
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(root)
+        for name in names
+        if os.path.splitext(name)[1].lower() in extensions
+    ]
+    return sorted(paths)
+
+
+def hash_file(path: str) -> str:
+    """ sha256 of file content, read in blocks """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_blocks(path: str) -> Iterator[str]:
+    """ File text in blocks, the whole file is never in memory """
+    with open(path, encoding='utf-8', errors='replace') as f:
+        while block := f.read(BLOCK_SIZE):
+            yield block
+
+
+def chunk_file(path: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    """
+    Split file text into chunks, block by block.
+    The last chunk of a block is carried over into the next block, so chunks don't break at block edges
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    chunks: list[str] = []
+    carry: str = ""
+    for block in iter_blocks(path):
+        parts: list[str] = splitter.split_text(carry + block)
+        if not parts:
+            continue
+        chunks.extend(parts[:-1])
+        carry = parts[-1]
+    if carry.strip():
+        chunks.append(carry)
+    return chunks
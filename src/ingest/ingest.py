@@ -0,0 +1,449 @@
+"""
+Bulk document ingestion into settings.weaviate_collection
+
+- files are hashed and chunked in a process pool (settings.ingest_workers)
+- chunks are embedded in large batches with bounded concurrency (settings.embed_model)
+- objects are written with weaviate v4 dynamic batching, in a writer thread
+
+Idempotent and resumable: chunk uuids are derived from (link, chunk index), every chunk keeps
+the document content hash and chunk count. Documents with all chunks of the same hash are skipped.
+
+Incremental sync (--sync): documents are checked against the manifest table (DocManifest) instead
+of weaviate: files with the same mtime and size are not even hashed, documents removed from
+the root are deleted from the collection.
+
+Usage:
+    python -m src.ingest.ingest /data/docs --site-name Музеи --base-url https://example.org/docs
+    python -m src.ingest.ingest /data/docs --site-name Музеи --base-url https://example.org/docs --sync
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime, UTC
+
+import httpx
+from weaviate import WeaviateClient
+from weaviate.classes.config import Configure, DataType, Property
+from weaviate.classes.query import Filter
+from weaviate.util import generate_uuid5
+
+from src.core.cache import init_cache_backend, init_retrieval_cache
+from src.core.cluster import Cluster
+from src.core.db import init_pool
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.util import CatState
+from src.ingest.chunking import chunk_file, hash_file, list_files
+from src.ingest.manifest import ManifestEntry, delete_manifest, load_manifest, save_manifest
+from src.vectordb.alias import init_aliases
+from src.vectordb.embed import embed_texts
+from src.vectordb.embedder import Embedder, EmbeddingCache
+from src.vectordb.retriever import invalidate_retrieval
+from src.vectordb.weaviate_vdb import init_weaviate
+
+PROPERTIES: dict[str, DataType] = {
+    'type':         DataType.TEXT,
+    'name':         DataType.TEXT,
+    'site_name':    DataType.TEXT,
+    'size':         DataType.INT,
+    'link':         DataType.TEXT,
+    'updated_at':   DataType.DATE,
+    'content':      DataType.TEXT,
+    'content_hash': DataType.TEXT,
+    'chunk_count':  DataType.INT,
+    'chunk_index':  DataType.INT,
+}
+
+
+@dataclass
+class IngestStats:
+    root:           str = None
+    collection:     str = None
+    running:        bool = False
+    sync:           bool = False
+    docs_total:     int = 0
+    docs_done:      int = 0         # Written
+    docs_skipped:   int = 0         # Unchanged
+    docs_failed:    int = 0
+    docs_new:       int = 0         # sync: not in manifest
+    docs_changed:   int = 0         # sync: other content hash
+    docs_removed:   int = 0         # sync: in manifest, not in root any more
+    chunks:         int = 0         # Chunks written
+    failed_objects: int = 0         # Rejected by weaviate
+    started_at:     datetime = None
+    elapsed:        float = 0.0     # seconds
+    docs_per_sec:   float = 0.0     # docs processed (written + skipped)
+    chunks_per_sec: float = 0.0
+    error:          str = None
+
+
+def mtime(file_stat: os.stat_result) -> datetime:
+    """ Manifest updated_at: naive UTC (column is TIMESTAMP without tz) """
+    return datetime.fromtimestamp(file_stat.st_mtime, UTC).replace(tzinfo=None)
+
+
+def vectorizer_config():
+    """
+    Vectorizer of new collections (settings.ingest_vectorizer). Objects are written with our vectors either way,
+    weaviate's vectorizer embeds near_text and hybrid queries: same model as the query embedder
+    """
+    if settings.ingest_vectorizer == 'none':
+        return Configure.Vectorizer.none()
+    if settings.ingest_vectorizer == 'text2vec-ollama':
+        return Configure.Vectorizer.text2vec_ollama(
+            api_endpoint=settings.weaviate_api_endpoint, model=settings.embed_model, vectorize_collection_name=False,
+        )
+    raise ValueError(f"Unknown ingest_vectorizer: {settings.ingest_vectorizer}")
+
+
+class Ingestor:
+    """
+    One ingestion run over a directory (or a file)
+
+    - 1. Hash file, skip if already ingested with the same hash
+    - 2. Chunk file
+    - 3. Embed chunks
+    - 4. Write new chunks, delete chunks of the previous document version once the writer has flushed
+
+    sync: the manifest decides what is unchanged (mtime and size, then content hash),
+    stale objects are deleted by id, documents missing in the root are removed.
+    Manifest is saved after the writer has flushed all objects: documents of an interrupted run
+    are found complete in weaviate on the next one and adopted without re-embedding
+    """
+
+    def __init__(
+            self,
+            cat_state: CatState,
+            root: str,
+            site_name: str = None,
+            base_url: str = None,
+            collection_name: str = None,
+            sync: bool = False,
+    ):
+        self.cat_state: CatState = cat_state
+        self.root: str = root
+        self.site_name: str | None = site_name
+        self.base_url: str | None = base_url
+        self.collection_name: str = settings.weaviate_collection if collection_name is None else collection_name
+        if cat_state.aliases is not None:
+            self.collection_name = cat_state.aliases.resolve(self.collection_name)
+        self.sync: bool = sync
+        self.stats: IngestStats = IngestStats(root=root, collection=self.collection_name, sync=sync)
+        self.manifest: dict[str, ManifestEntry] = {}    # sync: link -> entry, before the run
+        self.indexed: list[ManifestEntry] = []          # sync: entries to save after the run
+        self.queued: set[str] = set()                   # sync: links of the entries with objects to write
+        self.replaced: dict[str, str] = {}              # Not sync: link -> new content hash, older versions to delete
+        self.stale: dict[str, list[str]] = {}           # sync: link -> object ids of the previous version to delete
+        self.writer_error: str | None = None
+        self.embedder: Embedder = Embedder(
+            lambda texts: embed_texts(texts, cat_state),
+            EmbeddingCache(max_size=0, ttl=0),      # Chunks are embedded once: no cache
+            batch_size=settings.ingest_embed_batch,
+            batch_wait=0.01,
+            max_concurrency=settings.ingest_embed_concurrency,
+        )
+        self.queue: queue.Queue = queue.Queue(maxsize=settings.ingest_files_in_flight)
+        self.task: asyncio.Task | None = None
+        self._start: float = 0.0
+
+    def ensure_schema(self):
+        """ Collection and ingestion properties """
+        wc: WeaviateClient = self.cat_state.wc
+        if not wc.collections.exists(self.collection_name):
+            wc.collections.create(
+                self.collection_name,
+                vectorizer_config=vectorizer_config(),
+                properties=[Property(name=name, data_type=data_type) for name, data_type in PROPERTIES.items()],
+            )
+            return
+        coll = wc.collections.get(self.collection_name)
+        existing: set[str] = {p.name for p in coll.config.get().properties}
+        for name, data_type in PROPERTIES.items():
+            if name not in existing:
+                coll.config.add_property(Property(name=name, data_type=data_type))
+
+    def link(self, path: str) -> str:
+        if self.base_url is None:
+            return os.path.abspath(path)
+        relative: str = os.path.relpath(path, self.root) if os.path.isdir(self.root) else os.path.basename(path)
+        return f"{self.base_url.rstrip('/')}/{relative.replace(os.sep, '/')}"
+
+    def scope(self) -> str:
+        """ Link prefix of all documents under the root """
+        if not os.path.isdir(self.root):
+            return self.link(self.root)
+        if self.base_url is None:
+            return os.path.join(os.path.abspath(self.root), '')
+        return f"{self.base_url.rstrip('/')}/"
+
+    def is_ingested(self, link: str, content_hash: str) -> bool:
+        """ All chunks of the document version are in the collection """
+        coll = self.cat_state.wc.collections.get(self.collection_name)
+        same: Filter = Filter.all_of([
+            Filter.by_property('link').equal(link),
+            Filter.by_property('content_hash').equal(content_hash),
+        ])
+        first = coll.query.fetch_objects(filters=same, limit=1, return_properties=['chunk_count'])
+        if not first.objects:
+            return False
+        count: int = coll.aggregate.over_all(filters=same, total_count=True).total_count
+        return count == first.objects[0].properties.get('chunk_count')
+
+    def delete_previous(self, link: str, content_hash: str):
+        """ Chunks of other versions of the document """
+        coll = self.cat_state.wc.collections.get(self.collection_name)
+        coll.data.delete_many(where=Filter.all_of([
+            Filter.by_property('link').equal(link),
+            Filter.by_property('content_hash').not_equal(content_hash),
+        ]))
+
+    def delete_objects(self, object_ids: list[str], batch_size: int = 1000):
+        """ Objects by uuid (sync: stale chunks, removed documents) """
+        coll = self.cat_state.wc.collections.get(self.collection_name)
+        for i in range(0, len(object_ids), batch_size):
+            coll.data.delete_many(where=Filter.by_id().contains_any(object_ids[i:i + batch_size]))
+
+    def write(self):
+        """ Writer thread: objects from the queue into weaviate with dynamic batching """
+        wc: WeaviateClient = self.cat_state.wc
+        coll = wc.collections.get(self.collection_name)
+        try:
+            with coll.batch.dynamic() as batch:
+                while (objects := self.queue.get()) is not None:
+                    for uuid, properties, vector in objects:
+                        batch.add_object(properties=properties, uuid=uuid, vector=vector)
+        except Exception as e:
+            logger.error(f"Ingestion writer failed: {repr(e)}")
+            self.stats.error = self.writer_error = repr(e)
+            while self.queue.get() is not None:     # Don't block producers
+                pass
+        self.stats.failed_objects += len(coll.batch.failed_objects)
+        for failed in coll.batch.failed_objects[:10]:
+            logger.error(f"Ingestion: object not written: {failed.message}")
+        if coll.batch.failed_objects:       # Not in manifest: written again by the next sync
+            failed_ids: set[str] = {str(failed.object_.uuid) for failed in coll.batch.failed_objects}
+            self.indexed = [e for e in self.indexed if failed_ids.isdisjoint(e.object_ids)]
+            for failed in coll.batch.failed_objects:       # Previous version is kept
+                link: str | None = (failed.object_.properties or {}).get('link')
+                self.replaced.pop(link, None)
+                self.stale.pop(link, None)
+
+    def delete_replaced(self):
+        """
+        Chunks of previous versions of the written documents, after the writer has flushed:
+        searches never see a partly written document
+        """
+        for link, content_hash in self.replaced.items():
+            self.delete_previous(link, content_hash)
+        if self.stale:
+            self.delete_objects([u for object_ids in self.stale.values() for u in object_ids])
+
+    def entry(self, link: str, content_hash: str, file_stat: os.stat_result, chunk_count: int) -> ManifestEntry:
+        return ManifestEntry(
+            collection=self.collection_name,
+            link=link,
+            content_hash=content_hash,
+            updated_at=mtime(file_stat),
+            size=file_stat.st_size,
+            chunk_count=chunk_count,
+            object_ids=[generate_uuid5(f"{link}|{i}") for i in range(chunk_count)],
+            indexed_at=datetime.now(UTC).replace(tzinfo=None),
+        )
+
+    async def ingest_file(self, path: str, pool: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        link: str = self.link(path)
+        file_stat: os.stat_result = os.stat(path)
+        previous: ManifestEntry | None = self.manifest.get(link)
+        if self.sync and previous is not None \
+                and previous.updated_at == mtime(file_stat) and previous.size == file_stat.st_size:
+            self.stats.docs_skipped += 1        # Not touched since the last sync
+            return
+
+        # 1. Hash, skip unchanged
+        content_hash: str = await loop.run_in_executor(pool, hash_file, path)
+        if self.sync and previous is not None and previous.content_hash == content_hash:
+            self.indexed.append(self.entry(link, content_hash, file_stat, previous.chunk_count))    # New mtime
+            self.stats.docs_skipped += 1
+            return
+        if (not self.sync or previous is None) and await asyncio.to_thread(self.is_ingested, link, content_hash):
+            if self.sync:           # Written by an interrupted or non-sync run: adopt
+                count: int = await asyncio.to_thread(self.chunk_count, link)
+                self.indexed.append(self.entry(link, content_hash, file_stat, count))
+            self.stats.docs_skipped += 1
+            return
+
+        # 2. Chunk
+        chunks: list[str] = await loop.run_in_executor(
+            pool, chunk_file, path, settings.ingest_chunk_size, settings.ingest_chunk_overlap,
+        )
+
+        # 3. Embed
+        vectors: list[list[float]] = await self.embedder.embed(chunks)
+
+        # 4. Write
+        if self.sync:
+            entry: ManifestEntry = self.entry(link, content_hash, file_stat, len(chunks))
+            self.indexed.append(entry)
+            self.queued.add(link)
+            if previous is not None:        # Same ids are overwritten, the rest are stale: deleted once written
+                current: set[str] = set(entry.object_ids)
+                self.stale[link] = [u for u in previous.object_ids if u not in current]
+        else:
+            self.replaced[link] = content_hash      # Deleted once the new version is written
+        if not chunks:
+            self.stats.docs_skipped += 1        # Empty document: nothing to write
+            return
+        properties: dict = {
+            'type':         'file',
+            'name':         os.path.basename(path),
+            'site_name':    self.site_name,
+            'size':         file_stat.st_size,
+            'link':         link,
+            'updated_at':   datetime.fromtimestamp(file_stat.st_mtime, UTC),
+            'content_hash': content_hash,
+            'chunk_count':  len(chunks),
+        }
+        objects: list[tuple] = [
+            (generate_uuid5(f"{link}|{i}"), {**properties, 'chunk_index': i, 'content': chunk}, vector)
+            for i, (chunk, vector) in enumerate(zip(chunks, vectors))
+        ]
+        await asyncio.to_thread(self.queue.put, objects)      # Blocks while writer is behind
+        self.stats.docs_done += 1
+        self.stats.chunks += len(chunks)
+        if self.sync:
+            if previous is None:
+                self.stats.docs_new += 1
+            else:
+                self.stats.docs_changed += 1
+
+    def chunk_count(self, link: str) -> int:
+        coll = self.cat_state.wc.collections.get(self.collection_name)
+        first = coll.query.fetch_objects(
+            filters=Filter.by_property('link').equal(link), limit=1, return_properties=['chunk_count'],
+        )
+        return first.objects[0].properties.get('chunk_count')
+
+    async def remove_missing(self, paths: list[str]):
+        """ sync: documents in the manifest, but not in the root any more """
+        present: set[str] = {self.link(path) for path in paths}
+        removed: list[ManifestEntry] = [e for link, e in self.manifest.items() if link not in present]
+        if not removed:
+            return
+        if not os.path.exists(self.root):
+            raise FileNotFoundError(f"Ingestion root not found: {self.root}")   # Not "all removed"
+        logger.info(msg := f"Ingestion: removing {len(removed)} documents ...")
+        await asyncio.to_thread(self.delete_objects, [u for e in removed for u in e.object_ids])
+        await delete_manifest(self.cat_state.db_pool, self.collection_name, [e.link for e in removed])
+        self.stats.docs_removed += len(removed)
+        logger.info(f"{msg} done")
+
+    def update_rates(self):
+        self.stats.elapsed = time.perf_counter() - self._start
+        if self.stats.elapsed > 0:
+            self.stats.docs_per_sec = (self.stats.docs_done + self.stats.docs_skipped) / self.stats.elapsed
+            self.stats.chunks_per_sec = self.stats.chunks / self.stats.elapsed
+
+    async def run(self) -> IngestStats:
+        logger.info(msg := f"Ingesting: {self.root} -> {self.collection_name} ...")
+        self._start = time.perf_counter()
+        self.stats.started_at = datetime.now(UTC)
+        self.stats.running = True
+        extensions: list[str] = [e.strip().lower() for e in settings.ingest_extensions.split(',')]
+        paths: list[str] = list_files(self.root, extensions)
+        self.stats.docs_total = len(paths)
+        writer: threading.Thread = threading.Thread(target=self.write, name='cat-ingest-writer', daemon=True)
+        pending = iter(paths)
+
+        async def worker(pool: ProcessPoolExecutor):
+            for path in pending:
+                try:
+                    await self.ingest_file(path, pool)
+                except Exception as e:
+                    logger.error(f"Ingestion failed: {path}: {repr(e)}")
+                    self.stats.docs_failed += 1
+                self.update_rates()
+
+        try:
+            await asyncio.to_thread(self.ensure_schema)
+            if self.sync:
+                self.manifest = await load_manifest(self.cat_state.db_pool, self.collection_name, self.scope())
+                await self.remove_missing(paths)
+            writer.start()
+            with ProcessPoolExecutor(
+                    max_workers=settings.ingest_workers or os.cpu_count(),
+                    mp_context=multiprocessing.get_context('spawn'),
+            ) as pool:
+                await asyncio.gather(*(worker(pool) for _ in range(settings.ingest_files_in_flight)))
+        except Exception as e:
+            self.stats.error = repr(e)
+            raise
+        finally:
+            if writer.is_alive():
+                await asyncio.to_thread(self.queue.put, None)
+                await asyncio.to_thread(writer.join)
+            if self.writer_error is not None:     # Objects of these may be unwritten: written again by the next sync
+                self.indexed = [e for e in self.indexed if e.link not in self.queued]
+            elif self.replaced or self.stale:
+                await asyncio.to_thread(self.delete_replaced)
+            if self.sync:
+                await save_manifest(self.cat_state.db_pool, self.indexed)
+            if self.cat_state.answer_cache is not None and (self.stats.docs_done or self.stats.docs_removed):
+                self.cat_state.answer_cache.clear()     # Answers may change with new documents
+            if self.stats.docs_done or self.stats.docs_removed:
+                await invalidate_retrieval(self.cat_state, self.collection_name)
+            self.update_rates()
+            self.stats.running = False
+            logger.info(f"{msg} done: {asdict(self.stats)}")
+        return self.stats
+
+    def start(self) -> asyncio.Task:
+        """ Run in background (admin endpoint) """
+        self.stats.running = True
+        self.task = asyncio.create_task(self.run())
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())   # Logged in run
+        return self.task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('root', help='Directory or file')
+    parser.add_argument('--site-name', default=None)
+    parser.add_argument('--base-url', default=None, help='Link prefix. Default: absolute file path')
+    parser.add_argument('--collection', default=None, help=f'Default: {settings.weaviate_collection}')
+    parser.add_argument('--sync', action='store_true', help='Incremental: new, changed and removed documents')
+    args = parser.parse_args()
+
+    async def run() -> IngestStats:
+        cat_state: CatState = CatState()
+        cat_state.ht_client = httpx.AsyncClient(timeout=settings.request_timeout)
+        cat_state.wc = init_weaviate()
+        cat_state.db_pool = await init_pool()
+        cat_state.aliases = await init_aliases(cat_state.db_pool)      # Collection name may be an alias
+        if settings.cache_backend != 'memory':      # Shared with the app: its cached docs are invalidated
+            cat_state.retrieval_cache = init_retrieval_cache(init_cache_backend())
+        cat_state.cluster = Cluster(cat_state)      # Not listening: announces the ingestion to app workers
+        try:
+            return await Ingestor(
+                cat_state, args.root, args.site_name, args.base_url, args.collection, sync=args.sync,
+            ).run()
+        finally:
+            await cat_state.ht_client.aclose()
+            cat_state.wc.close()
+            await cat_state.db_pool.close()
+
+    stats: IngestStats = asyncio.run(run())
+    print(f"docs: {stats.docs_done} written, {stats.docs_skipped} skipped, {stats.docs_failed} failed; "
+          f"chunks: {stats.chunks}; {stats.docs_per_sec:.1f} docs/sec, {stats.chunks_per_sec:.1f} chunks/sec")
+    if stats.sync:
+        print(f"sync: {stats.docs_new} new, {stats.docs_changed} changed, {stats.docs_removed} removed")
+
+
+if __name__ == '__main__':
+    main()
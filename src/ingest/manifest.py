@@ -0,0 +1,54 @@
+"""
+Manifest of ingested documents (DocManifest): link -> content hash, mtime, size, object ids.
+Used by incremental sync to find new, changed and removed documents without querying weaviate
+"""
+from dataclasses import dataclass, astuple, field
+from datetime import datetime
+
+import asyncpg
+
+from src.core.telemetry import upsert_sql
+from src.models.cat_public import DocManifest
+
+MANIFEST_COLUMNS: list[str] = [
+    'collection', 'link', 'content_hash', 'updated_at', 'size', 'chunk_count', 'object_ids', 'indexed_at',
+]
+MANIFEST_SQL: str = upsert_sql(DocManifest, MANIFEST_COLUMNS, keys=['collection', 'link'])
+
+
+@dataclass
+class ManifestEntry:
+    collection:   str
+    link:         str
+    content_hash: str
+    updated_at:   datetime          # File mtime, naive UTC
+    size:         int
+    chunk_count:  int
+    object_ids:   list[str] = field(default_factory=list)
+    indexed_at:   datetime = None   # naive UTC
+
+
+async def load_manifest(pool: asyncpg.Pool, collection: str, prefix: str) -> dict[str, ManifestEntry]:
+    """ Entries of the collection with links starting with `prefix` (one ingestion root) """
+    rows: list[asyncpg.Record] = await pool.fetch(
+        f"SELECT {', '.join(MANIFEST_COLUMNS)} FROM {DocManifest.__table__.fullname} "
+        f"WHERE collection = $1 AND starts_with(link, $2)",
+        collection, prefix,
+    )
+    return {
+        row['link']: ManifestEntry(**{**row, 'object_ids': [str(u) for u in row['object_ids'] or []]})
+        for row in rows
+    }
+
+
+async def save_manifest(pool: asyncpg.Pool, entries: list[ManifestEntry]):
+    if entries:
+        await pool.executemany(MANIFEST_SQL, [astuple(entry) for entry in entries])
+
+
+async def delete_manifest(pool: asyncpg.Pool, collection: str, links: list[str]):
+    if links:
+        await pool.execute(
+            f"DELETE FROM {DocManifest.__table__.fullname} WHERE collection = $1 AND link = ANY($2::text[])",
+            collection, links,
+        )
@@ -0,0 +1,219 @@
+"""
+Blue/green reindexing behind a collection alias (src.vectordb.alias)
+
+- 1. Build a new collection (Ingestor), or take an existing one
+- 2. Warm it up: replay recent queries (backend_query_detail) on the new and the current collection,
+     until the new one is as fast as the current one (settings.reindex_latency_ratio)
+- 3. Validate recall: top-k documents of the current collection found by the new one
+- 4. Flip the alias. The current collection is kept for rollback
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, UTC
+
+import asyncpg
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.util import CatState
+from src.ingest.ingest import Ingestor
+from src.models.cat_public import QueryDetail
+from src.vectordb.base import Doc
+from src.vectordb.retriever import invalidate_retrieval
+
+
+@dataclass
+class WarmupRound:
+    round:      int
+    old_p50:    float       # seconds
+    old_p95:    float
+    new_p50:    float
+    new_p95:    float
+    errors:     int = 0
+
+
+@dataclass
+class ReindexStats:
+    alias:          str = None
+    old_collection: str = None
+    new_collection: str = None
+    state:          str = None      # building, warming, flipped, rejected, failed
+    running:        bool = False
+    queries:        int = 0         # Replayed queries
+    rounds:         list[WarmupRound] = field(default_factory=list)
+    hot:            bool = False    # New collection latency within reindex_latency_ratio of the old one
+    recall:         float = None
+    reason:         str = None      # Why not flipped
+    started_at:     datetime = None
+    elapsed:        float = 0.0     # seconds
+    error:          str = None
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))], 4) if values else 0.0
+
+
+def doc_key(doc: Doc) -> str:
+    """ Documents are compared by link: chunking of the new collection may differ """
+    return doc.properties.get('link') or doc.uuid
+
+
+async def recent_queries(pool: asyncpg.Pool, limit: int) -> list[str]:
+    rows: list[asyncpg.Record] = await pool.fetch(
+        f"SELECT query_text FROM {QueryDetail.__table__.fullname} WHERE query_text IS NOT NULL "
+        f"GROUP BY query_text ORDER BY max(timestamp) DESC LIMIT $1",
+        limit,
+    )
+    return [row['query_text'] for row in rows]
+
+
+class Reindexer:
+    """ One blue/green reindex run of an alias (settings.weaviate_collection by default) """
+
+    def __init__(
+            self,
+            cat_state: CatState,
+            root: str = None,
+            site_name: str = None,
+            base_url: str = None,
+            collection_name: str = None,
+            alias: str = None,
+            flip: bool = True,
+    ):
+        self.cat_state: CatState = cat_state
+        self.alias: str = settings.weaviate_collection if alias is None else alias
+        self.flip: bool = flip
+        self.ingestor: Ingestor | None = None
+        if root is not None:
+            collection_name = collection_name or f"{self.alias}_{datetime.now(UTC):%Y%m%d%H%M%S}"
+            self.ingestor = Ingestor(cat_state, root, site_name, base_url, collection_name)
+        if collection_name is None:
+            raise ValueError("Reindex needs a root to build a collection from, or a built collection_name")
+        self.stats: ReindexStats = ReindexStats(
+            alias=self.alias,
+            old_collection=cat_state.aliases.resolve(self.alias),
+            new_collection=collection_name,
+        )
+        if self.stats.new_collection.lower() == self.stats.old_collection.lower():
+            raise ValueError(f"Collection is already active for alias {self.alias}: {collection_name}")
+        self.task: asyncio.Task | None = None
+        self._results: dict[str, dict[str, list[Doc]]] = {}    # collection -> query -> docs, last round
+
+    async def search(self, collection: str, query_text: str, latencies: list[float]):
+        start: float = time.perf_counter()
+        docs: list[Doc] = await self.cat_state.retriever.search(
+            query_text, k=settings.weaviate_doc_limit, collection_name=collection,
+        )
+        latencies.append(time.perf_counter() - start)
+        self._results.setdefault(collection, {})[query_text] = docs
+
+    async def replay(self, collection: str, queries: list[str]) -> tuple[list[float], int]:
+        """ All queries on the collection with settings.reindex_concurrency. Returns (latencies, errors) """
+        semaphore: asyncio.Semaphore = asyncio.Semaphore(settings.reindex_concurrency)
+        latencies: list[float] = []
+
+        async def one(query_text: str):
+            async with semaphore:
+                await self.search(collection, query_text, latencies)
+
+        results: list = await asyncio.gather(*(one(q) for q in queries), return_exceptions=True)
+        return latencies, sum(isinstance(r, Exception) for r in results)
+
+    async def warm_up(self, queries: list[str], compare: bool = True):
+        """ Replay rounds until the new collection is hot. compare: old collection exists """
+        for i in range(settings.reindex_warmup_rounds):
+            new, new_errors = await self.replay(self.stats.new_collection, queries)
+            old, old_errors = await self.replay(self.stats.old_collection, queries) if compare else ([], 0)
+            rnd: WarmupRound = WarmupRound(
+                round=i + 1,
+                old_p50=percentile(old, 0.5), old_p95=percentile(old, 0.95),
+                new_p50=percentile(new, 0.5), new_p95=percentile(new, 0.95),
+                errors=new_errors + old_errors,
+            )
+            self.stats.rounds.append(rnd)
+            logger.info(f"Reindex warm-up: {asdict(rnd)}")
+            if new_errors:
+                raise RuntimeError(f"Reindex warm-up: {new_errors} queries failed on {self.stats.new_collection}")
+            self.stats.hot = not compare or rnd.new_p95 <= rnd.old_p95 * settings.reindex_latency_ratio
+            if self.stats.hot:
+                break
+
+    def recall(self) -> float | None:
+        """ Mean share of the old collection top-k documents found by the new one """
+        old: dict[str, list[Doc]] = self._results.get(self.stats.old_collection, {})
+        new: dict[str, list[Doc]] = self._results.get(self.stats.new_collection, {})
+        shares: list[float] = []
+        for query_text, old_docs in old.items():
+            expected: set[str] = {doc_key(doc) for doc in old_docs}
+            if expected and query_text in new:
+                shares.append(len(expected & {doc_key(doc) for doc in new[query_text]}) / len(expected))
+        return round(sum(shares) / len(shares), 4) if shares else None
+
+    async def run(self) -> ReindexStats:
+        logger.info(msg := f"Reindex: {self.alias}: {self.stats.old_collection} -> {self.stats.new_collection} ...")
+        start: float = time.perf_counter()
+        self.stats.started_at = datetime.now(UTC)
+        self.stats.running = True
+        try:
+            # 1. Build
+            if self.ingestor is not None:
+                self.stats.state = 'building'
+                ingest = await self.ingestor.run()
+                if ingest.error or ingest.docs_failed:
+                    raise RuntimeError(f"Ingestion failed: {ingest.docs_failed} docs, {ingest.error}")
+
+            # 2. Warm up
+            self.stats.state = 'warming'
+            collections: set[str] = {c.lower() for c in await self.cat_state.retriever.list_collections()}
+            if self.stats.new_collection.lower() not in collections:
+                raise ValueError(f"Collection not found: {self.stats.new_collection}")
+            first: bool = self.stats.old_collection.lower() not in collections     # Nothing to compare with
+            queries: list[str] = await recent_queries(self.cat_state.db_pool, settings.reindex_warmup_queries)
+            self.stats.queries = len(queries)
+            if queries:
+                await self.warm_up(queries, compare=not first)
+
+            # 3. Validate
+            self.stats.recall = self.recall()
+            if not queries and not first:
+                self.stats.reason = "No recent queries to replay"
+            elif queries and not self.stats.hot:
+                self.stats.reason = f"Not hot after {len(self.stats.rounds)} warm-up rounds"
+            elif self.stats.recall is not None and self.stats.recall < settings.reindex_min_recall:
+                self.stats.reason = f"Recall {self.stats.recall} < {settings.reindex_min_recall}"
+            elif not self.flip:
+                self.stats.reason = "Flip not requested"
+
+            # 4. Flip
+            if self.stats.reason is None:
+                await self.cat_state.aliases.flip(self.alias, self.stats.new_collection)
+                if self.cat_state.answer_cache is not None:
+                    self.cat_state.answer_cache.clear()     # Cached answers are for old collection
+                await invalidate_retrieval(self.cat_state, self.stats.new_collection)
+                self.stats.state = 'flipped'
+            else:
+                self.stats.state = 'rejected'
+        except Exception as e:
+            self.stats.state = 'failed'
+            self.stats.error = repr(e)
+            raise
+        finally:
+            self.stats.running = False
+            self.stats.elapsed = time.perf_counter() - start
+            logger.info(f"{msg} {self.stats.state}: {self.stats.reason or self.stats.error or ''}")
+        return self.stats
+
+    def status(self) -> dict:
+        result: dict = asdict(self.stats)
+        if self.ingestor is not None:
+            result['ingest'] = asdict(self.ingestor.stats)
+        return result
+
+    def start(self) -> asyncio.Task:
+        """ Run in background (admin endpoint) """
+        self.stats.running = True
+        self.task = asyncio.create_task(self.run())
+        self.task.add_done_callback(lambda task: task.cancelled() or task.exception())   # Logged in run
+        return self.task
@@ -0,0 +1,112 @@
+from dataclasses import asdict
+
+from fastapi import APIRouter, HTTPException
+from starlette.requests import Request
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.util import CatState
+from src.ingest.ingest import Ingestor
+from src.ingest.reindex import Reindexer
+
+router = APIRouter()
+
+
+@logger.catch
+@router.post(
+    "/admin/ingest",
+    tags=['admin'],
+    summary="Ingest documents",
+    description=f"""
+        Ingest text files from a server directory (or file) into vector DB, in background.
+        Unchanged documents (same content hash) are skipped
+
+        - sync: incremental, by the manifest of ingested documents. Files with the same mtime and size
+          are not re-read, documents removed from the root are deleted from the collection
+        - Default collection: {settings.weaviate_collection}
+        - Progress: GET /admin/ingest
+    """,
+)
+async def start_ingest(
+        request: Request,
+        root: str,
+        site_name: str = None,
+        base_url: str = None,
+        collection_name: str = None,
+        sync: bool = False,
+):
+    cat_state: CatState = request.app.state.cat
+    if cat_state.ingestor is not None and cat_state.ingestor.stats.running:
+        raise HTTPException(status_code=409, detail=f"Ingestion is running: {cat_state.ingestor.root}")
+    cat_state.ingestor = Ingestor(cat_state, root, site_name, base_url, collection_name, sync=sync)
+    cat_state.ingestor.start()
+    return asdict(cat_state.ingestor.stats)
+
+
+@logger.catch
+@router.get(
+    "/admin/ingest",
+    tags=['admin'],
+    summary="Ingestion progress",
+    description="Running or last ingestion: documents written/skipped/failed, chunks, docs/sec, chunks/sec",
+)
+async def get_ingest(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    if cat_state.ingestor is None:
+        return None
+    return asdict(cat_state.ingestor.stats)
+
+
+@logger.catch
+@router.post(
+    "/admin/reindex",
+    tags=['admin'],
+    summary="Blue/green reindex",
+    description=f"""
+        Build a new collection from a server directory (root), or take a built one (collection_name), in background:
+        warm it up with recent queries, validate recall against the current collection, flip the alias.
+        The current collection is kept: POST /vdb/aliases/{{alias}}/rollback
+
+        - Default alias: {settings.weaviate_collection}
+        - Hot: new collection p95 <= current p95 * {settings.reindex_latency_ratio}
+        - Min recall: {settings.reindex_min_recall}
+        - flip=false: build, warm up and validate only
+        - Progress, per-collection warm-up latency: GET /admin/reindex
+    """,
+)
+async def start_reindex(
+        request: Request,
+        root: str = None,
+        site_name: str = None,
+        base_url: str = None,
+        collection_name: str = None,
+        alias: str = None,
+        flip: bool = True,
+):
+    cat_state: CatState = request.app.state.cat
+    if cat_state.reindexer is not None and cat_state.reindexer.stats.running:
+        raise HTTPException(status_code=409, detail=f"Reindex is running: {cat_state.reindexer.stats.new_collection}")
+    try:
+        cat_state.reindexer = Reindexer(cat_state, root, site_name, base_url, collection_name, alias, flip)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    cat_state.reindexer.start()
+    return cat_state.reindexer.status()
+
+
+@logger.catch
+@router.get(
+    "/admin/reindex",
+    tags=['admin'],
+    summary="Reindex progress",
+    description="Running or last reindex: state, ingestion, warm-up rounds (p50/p95 per collection), recall",
+)
+async def get_reindex(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    if cat_state.reindexer is None:
+        return None
+    return cat_state.reindexer.status()
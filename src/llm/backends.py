@@ -0,0 +1,223 @@
+"""
+LLM backends: a pool of ollama hosts (settings.llm_urls)
+
+- health: /api/ps every settings.llm_health_interval (also gives the loaded models);
+  settings.llm_unhealthy_errors consecutive errors take a backend out until the next good check
+- model affinity: a model is served by settings.llm_affinity_hosts hosts picked by rendezvous hashing
+  (same hosts in every worker process, few moves when hosts come and go), or settings.llm_model_hosts.
+  The model stays loaded on these hosts instead of being reloaded everywhere
+- balancing within the model hosts: least outstanding requests, or latency-aware (in-flight x latency EWMA)
+- per-backend concurrency cap (settings.llm_backend_concurrency): requests wait for a free backend
+- failover: a failed generation is retried on the next backend (settings.llm_failover_attempts)
+"""
+import asyncio
+import hashlib
+import time
+from typing import Callable
+
+import httpx
+from langchain_ollama import OllamaLLM
+
+from src.core.log import logger
+from src.core.metrics import Histogram
+from src.core.settings import settings
+from src.llm.scheduler import LLMOverloaded
+
+
+class Backend:
+    """ One ollama host: clients per model, in-flight requests, latency, health """
+
+    def __init__(self, url: str, max_concurrency: int, client_factory: Callable[[str, str], OllamaLLM]):
+        self.url: str = url.rstrip('/')
+        self.max_concurrency: int = max_concurrency
+        self.client_factory: Callable[[str, str], OllamaLLM] = client_factory    # (base_url, model) -> client
+        self.clients: dict[str, OllamaLLM] = {}
+        self.in_flight: int = 0
+        self.requests: int = 0
+        self.errors: int = 0
+        self.failed_in_row: int = 0
+        self.healthy: bool = True
+        self.checked_at: float = None       # monotonic
+        self.check_error: str = None
+        self.loaded: list[str] = []         # Models loaded in memory (/api/ps)
+        self.latency_ewma: float = None     # seconds
+        self.latency: Histogram = Histogram()
+
+    def client(self, model: str) -> OllamaLLM:
+        if (client := self.clients.get(model)) is None:
+            client = self.clients[model] = self.client_factory(self.url, model)
+        return client
+
+    def available(self) -> bool:
+        return self.in_flight < self.max_concurrency
+
+    def cost(self) -> float:
+        """ Latency-aware balancing: expected wait behind in-flight requests """
+        return (self.in_flight + 1) * (self.latency_ewma or 1.0)
+
+    def release(self, latency: float = None, failed: bool = False):
+        """ latency: None if the request was cancelled (not counted) """
+        self.in_flight -= 1
+        if latency is None:
+            return
+        self.requests += 1
+        if failed:
+            self.errors += 1
+            self.failed_in_row += 1
+            if self.healthy and self.failed_in_row >= settings.llm_unhealthy_errors:
+                self.healthy = False
+                logger.warning(f"LLM backend unhealthy: {self.url}: {self.failed_in_row} errors in a row")
+            return
+        self.failed_in_row = 0
+        self.latency.observe(latency)
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+
+    async def check(self, client: httpx.AsyncClient):
+        """ Health check: running models list """
+        try:
+            response: httpx.Response = await client.get(f"{self.url}/api/ps", timeout=settings.llm_health_timeout)
+            response.raise_for_status()
+            self.loaded = [m.get('name') or m.get('model') for m in response.json().get('models', [])]
+            self.check_error = None
+            if not self.healthy:
+                logger.info(f"LLM backend healthy: {self.url}")
+            self.healthy = True
+            self.failed_in_row = 0
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"LLM backend health check failed: {self.url}: {repr(e)}")
+            self.check_error = repr(e)
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_ewma': self.latency_ewma,
+            'latency': self.latency.stats(),
+            'loaded': self.loaded,
+            'checked_ago': None if self.checked_at is None else round(time.monotonic() - self.checked_at, 1),
+            'check_error': self.check_error,
+        }
+
+
+def rendezvous(model: str, url: str) -> int:
+    """ Rendezvous (highest random weight) hash of the model on the host """
+    return int.from_bytes(hashlib.sha1(f"{model}|{url}".encode()).digest()[:8], 'big')
+
+
+class LLMBackends:
+    """ Pool of ollama backends: routing by model affinity, balancing, concurrency caps """
+
+    def __init__(
+            self,
+            urls: list[str],
+            max_concurrency: int,
+            client_factory: Callable[[str, str], OllamaLLM],
+            balance: str = 'least_outstanding',
+            affinity_hosts: int = 0,
+            model_hosts: dict[str, list[str]] = None,
+    ):
+        if balance not in ('least_outstanding', 'latency'):
+            raise ValueError(f"Unknown llm_balance: {balance}")
+        self.backends: list[Backend] = [Backend(url, max_concurrency, client_factory) for url in urls]
+        self.balance: str = balance
+        self.affinity_hosts: int = affinity_hosts
+        self.model_hosts: dict[str, list[str]] = {
+            model: [url.rstrip('/') for url in hosts] for model, hosts in (model_hosts or {}).items()
+        }
+        self._waiters: set[asyncio.Future] = set()     # acquire() calls waiting for a free backend
+        self._task: asyncio.Task = None
+        self.waits: int = 0             # Requests that waited for a backend slot
+        self.failovers: int = 0
+
+    def hosts(self, model: str, exclude: list[Backend] = ()) -> list[Backend]:
+        """
+        Backends of the model, in affinity order: settings.llm_model_hosts, else rendezvous ranking.
+        The next ranked hosts replace unhealthy and excluded (failed over) ones. All unhealthy: all of them
+        """
+        if model in self.model_hosts:
+            ranked: list[Backend] = [b for b in self.backends if b.url in self.model_hosts[model]]
+        else:
+            ranked = sorted(self.backends, key=lambda b: rendezvous(model, b.url), reverse=True)
+        ranked = [b for b in ranked if b not in exclude]
+        healthy: list[Backend] = [b for b in ranked if b.healthy]
+        if not healthy:
+            return ranked
+        if model in self.model_hosts or not self.affinity_hosts:
+            return healthy
+        return healthy[:self.affinity_hosts]
+
+    def pick(self, model: str, exclude: list[Backend] = ()) -> Backend | None:
+        """ Least loaded available backend of the model, None if all are at their concurrency cap """
+        candidates: list[Backend] = [b for b in self.hosts(model, exclude) if b.available()]
+        if not candidates:
+            return None
+        if self.balance == 'latency':
+            return min(candidates, key=Backend.cost)
+        return min(candidates, key=lambda b: b.in_flight)     # Ties: affinity order
+
+    async def acquire(self, model: str, exclude: list[Backend] = ()) -> Backend:
+        """
+        Backend slot for a generation, to be given back with release()
+
+        Raises:
+            LLMOverloaded: no backend slot within settings.llm_queue_timeout, or no backend left after exclude
+        """
+        if not self.hosts(model, exclude):
+            raise LLMOverloaded(f"No LLM backend left for {model}", 503, 1)
+        deadline: float = time.monotonic() + settings.llm_queue_timeout
+        if (backend := self.pick(model, exclude)) is None:
+            self.waits += 1
+        while backend is None:      # Woken up by every release, the pick is redone
+            released: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._waiters.add(released)
+            try:
+                await asyncio.wait_for(released, timeout=deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                raise LLMOverloaded(f"LLM backends are busy: {model}", 503, 1)
+            finally:
+                self._waiters.discard(released)
+            backend = self.pick(model, exclude)
+        backend.in_flight += 1
+        return backend
+
+    def release(self, backend: Backend, latency: float = None, failed: bool = False):
+        """ latency: None if the request was cancelled. failed: generation error """
+        backend.release(latency, failed)
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def check(self, client: httpx.AsyncClient):
+        await asyncio.gather(*(backend.check(client) for backend in self.backends))
+
+    async def _run_checks(self, client: httpx.AsyncClient):
+        while True:
+            await self.check(client)
+            await asyncio.sleep(settings.llm_health_interval)
+
+    def start(self, client: httpx.AsyncClient):
+        self._task = asyncio.create_task(self._run_checks(client))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'balance': self.balance,
+            'affinity_hosts': self.affinity_hosts,
+            'model': settings.llm_model,
+            'model_hosts': [b.url for b in self.hosts(settings.llm_model)],
+            'waits': self.waits,
+            'failovers': self.failovers,
+            'backends': [backend.stats() for backend in self.backends],
+        }
+
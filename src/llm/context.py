@@ -0,0 +1,252 @@
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from src.core.log import logger
+from src.core.metrics import timed
+from src.core.tracing import current_span, traced
+from src.core.settings import settings
+from src.vectordb.base import Doc
+
+WORD_RE = re.compile(r'\w+|[^\w\s]')
+MIN_OVERLAP: int = 32       # chars. Shorter common prefix/suffix of chunks is not an overlap
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Fast approximate token count: words and punctuation, long words count as several tokens
+    (~4 chars per token, BPE splits cyrillic words into more pieces than latin ones)
+    """
+    return sum(1 + (len(w) - 1) // 4 for w in WORD_RE.findall(text))
+
+
+class TokenCounter:
+    """
+    Token counter for prompt budgeting
+
+    - exact: HF tokenizer of the LLM (optional `tokenizers` package), counts cached by text
+    - approximate: approx_tokens
+    """
+
+    def __init__(self, tokenizer=None, cache_size: int = 4096):
+        self.tokenizer = tokenizer
+        self.exact: bool = tokenizer is not None
+        self._count = lru_cache(maxsize=cache_size)(self._encode) if self.exact else approx_tokens
+
+    def _encode(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count(self, text: str) -> int:
+        return self._count(text)
+
+    def stats(self) -> dict:
+        if not self.exact:
+            return {"exact": False}
+        info = self._count.cache_info()
+        return {"exact": True, "hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+
+def init_token_counter() -> TokenCounter:
+    """
+    Token counter by settings.llm_tokenizer: HF tokenizer name, or None for approximate counts.
+    Falls back to approximate counts if the tokenizer can't be loaded
+    """
+    if not settings.llm_tokenizer:
+        return TokenCounter()
+    try:
+        from tokenizers import Tokenizer   # Optional dependency
+        return TokenCounter(Tokenizer.from_pretrained(settings.llm_tokenizer))
+    except Exception as e:
+        logger.warning(f"Tokenizer {settings.llm_tokenizer} is not available, using approximate counts: {repr(e)}")
+        return TokenCounter()
+
+
+@dataclass
+class Context:
+    """ LLM prompt context built from docs within the token budget """
+    text:       str = ""
+    docs:       list[Doc] = field(default_factory=list)     # Docs in the context, by rank
+    tokens:     int = 0             # Context tokens
+    budget:     int = 0             # Context token budget
+    prompt_tokens: int = 0          # Whole prompt: template, question and context
+    dropped:    int = 0             # Docs dropped: duplicates, no budget left
+    trimmed:    int = 0             # Docs cut to fit their share of the budget
+
+
+def doc_header(doc: Doc) -> str:
+    # 'type':       'file',
+    # 'updated_at': datetime.datetime(2025, 3, 28, 11, 7, 48, 983443, tzinfo=datetime.timezone.utc),
+    # 'name':       '02_Великие_музеи_мира_Прадо_Мадрид_2011.pdf',
+    # 'site_name':  'Музеи',
+    # 'size':       173441090,
+    # 'link':       'https://hackaton.hb.ru-msk.vkcloud-storage...
+    return (
+        f"{{site_name}}: {doc.properties.get('site_name')}, "
+        f"{{doc_type}}: {doc.properties.get('type')}, "
+        f"{{doc_name}}: {doc.properties.get('name')}, "
+        f"{{doc_size}}: {doc.properties.get('size')}, "
+        f"{{doc_url}}: ({doc.properties.get('link')}), "
+        f"\n"
+    )
+
+
+def overlap(a: str, b: str) -> int:
+    """ Length of the longest suffix of `a` that is a prefix of `b` (at least MIN_OVERLAP chars) """
+    if len(a) < MIN_OVERLAP or len(b) < MIN_OVERLAP:
+        return 0
+    head: str = b[:MIN_OVERLAP]
+    pos: int = a.find(head, max(0, len(a) - len(b)))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(head, pos + 1)
+    return 0
+
+
+def dedup_chunks(docs: list[Doc]) -> tuple[list[Doc], list[str]]:
+    """
+    Drop/cut overlapping chunks of the same document (same `link`).
+    Higher ranked chunks are kept as is, lower ranked ones lose the overlapping part
+
+    Returns:
+        (docs, their contents)
+    """
+    seen: dict[str, list[str]] = {}      # link -> contents already in the context
+    result: list[Doc] = []
+    contents: list[str] = []
+    for doc in docs:
+        content: str = doc.properties.get('content') or ""
+        link: str | None = doc.properties.get('link')
+        previous: list[str] = seen.setdefault(link, []) if link else []
+        if any(content in p for p in previous):
+            continue
+        for p in previous:
+            if n := overlap(p, content):            # p ends with the start of content
+                content = content[n:]
+            elif n := overlap(content, p):          # content ends with the start of p
+                content = content[:-n]
+        previous.append(content)
+        result.append(doc)
+        contents.append(content)
+    return result, contents
+
+
+def allocate(needs: list[int], weights: list[float], budget: int) -> list[int]:
+    """
+    Split token budget between docs by weights.
+    Docs that need less than their share get what they need, the rest is split again
+    """
+    alloc: list[int] = [0] * len(needs)
+    active: list[int] = list(range(len(needs)))
+    left: int = budget
+    while active and left > 0:
+        total: float = sum(weights[i] for i in active)
+        share: dict[int, int] = {i: int(left * weights[i] / total) for i in active}
+        satisfied: list[int] = [i for i in active if needs[i] <= share[i]]
+        if not satisfied:
+            for i in active:
+                alloc[i] = share[i]
+            break
+        for i in satisfied:
+            alloc[i] = needs[i]
+            left -= needs[i]
+        active = [i for i in active if i not in satisfied]
+    return alloc
+
+
+def trim(text: str, tokens: int, counter: TokenCounter) -> str:
+    """ Cut text to `tokens` tokens, preferably at a sentence or word boundary """
+    n: int = counter.count(text)
+    while n > tokens and text:
+        cut: int = int(len(text) * tokens / n * 0.95)
+        boundary: int = max(text.rfind('. ', 0, cut), text.rfind('\n', 0, cut))
+        if boundary < cut * 0.8:
+            boundary = text.rfind(' ', 0, cut)
+        text = text[:boundary + 1 if boundary > 0 else cut].rstrip()
+        n = counter.count(text)
+    return text
+
+
+def build_context(docs: list[Doc], budget: int, counter: TokenCounter) -> Context:
+    """
+    Context within the token budget
+
+    - 1. Drop/cut overlapping chunks of the same document
+    - 2. Split budget by rank (docs come ordered by reranker score or distance): weight 1 / (rank + 1)
+    - 3. Drop docs that get less than settings.llm_doc_min_tokens of content, split again
+    - 4. Trim docs to their share
+    """
+    # 1. Dedup
+    chunks: list[Doc]
+    contents: list[str]
+    chunks, contents = dedup_chunks(docs)
+    context: Context = Context(budget=budget, dropped=len(docs) - len(chunks))
+
+    headers: list[str] = [doc_header(doc) for doc in chunks]
+    separator: int = counter.count("\n\n")
+    overheads: list[int] = [counter.count(header) + separator for header in headers]
+    needs: list[int] = [o + counter.count(content) for o, content in zip(overheads, contents)]
+
+    # 2-3. Allocate budget, drop docs with too small share (lowest ranked first)
+    keep: list[int] = list(range(len(chunks)))
+    while True:
+        alloc: list[int] = allocate([needs[i] for i in keep], [1 / (i + 1) for i in keep], budget)
+        starved: list[int] = [
+            i for i, a in zip(keep, alloc)
+            if a < needs[i] and a - overheads[i] < settings.llm_doc_min_tokens
+        ]
+        if not starved:
+            break
+        keep.remove(starved[-1])
+        context.dropped += 1
+
+    # 4. Trim
+    parts: list[str] = []
+    for i, a in zip(keep, alloc):
+        content: str = contents[i]
+        if a < needs[i]:
+            content = trim(content, a - overheads[i], counter)
+            context.trimmed += 1
+        parts.append(headers[i] + content)
+        context.docs.append(chunks[i])
+
+    context.text = "\n\n".join(parts)
+    context.tokens = counter.count(context.text)
+    return context
+
+
+def prompt_base_tokens(query_text: str, counter: TokenCounter) -> int:
+    """ Prompt tokens without context: template and question """
+    return counter.count(settings.llm_prompt_template.format(context="", question=query_text))
+
+
+def context_budget(base_tokens: int) -> int:
+    """ Context token budget: llm_num_ctx - llm_answer_tokens - template and question tokens """
+    return max(0, int(settings.llm_num_ctx) - settings.llm_answer_tokens - base_tokens)
+
+
+@timed('prompt')
+@traced('prompt')
+def make_llm_prompt(query_text: str, docs: list[Doc], counter: TokenCounter) -> tuple[str, Context]:
+    """
+    Prepare LLM prompt: context from docs + user query.
+    Context budget: llm_num_ctx - llm_answer_tokens - template and question tokens
+
+    Returns:
+        (llm_prompt, context)
+    """
+    base_tokens: int = prompt_base_tokens(query_text, counter)
+    context: Context = build_context(docs, context_budget(base_tokens), counter)
+    context.prompt_tokens = base_tokens + context.tokens
+    logger.info(
+        f"Context: {context.tokens}/{context.budget} tokens, {len(context.docs)} docs "
+        f"(dropped {context.dropped}, trimmed {context.trimmed}), prompt: {context.prompt_tokens} tokens"
+    )
+    if (span := current_span()) is not None:
+        span.set(tokens=context.prompt_tokens, budget=context.budget, docs=len(context.docs),
+                 dropped=context.dropped, trimmed=context.trimmed)
+    llm_prompt: str = settings.llm_prompt_template.format(
+        context=context.text,
+        question=query_text,
+    )
+    return llm_prompt, context
@@ -1,77 +1,229 @@
+import asyncio
+import time
+from typing import AsyncIterator
+
+import httpx
+from langchain_core.outputs import Generation, LLMResult
 from langchain_ollama import OllamaLLM
-from weaviate.collections.classes.internal import QueryReturn, Object
 
 from src.core.log import logger
-from src.core.util import CatState, measure_latency
+from src.core.metrics import STAGE_ERRORS, STAGE_LATENCY
+from src.core.tracing import Span, current_span, inject_traceparent, span, traced
+from src.core.util import CatState, measure_latency, measure_latency_async, run_in_pool
 from src.core.settings import settings
+from src.llm.backends import Backend, LLMBackends
+from src.llm.residency import keep_alive, record_generation
 
 
-def init_ollama_llm() -> OllamaLLM:
+def init_ollama_llm(base_url: str = None, model: str = None) -> OllamaLLM:
+    """ Ollama client. Default: settings.llm_url, settings.llm_model """
     llm_client: OllamaLLM = OllamaLLM(
-        base_url=settings.llm_url,
-        model=settings.llm_model,
+        base_url=base_url or settings.llm_url,
+        model=model or settings.llm_model,
         temperature=settings.llm_temperature,
         top_p=settings.llm_top_p,
         top_k=settings.llm_top_k,
         num_ctx=settings.llm_num_ctx,
         repeat_penalty=settings.llm_repeat_penalty,
+        keep_alive=keep_alive(model or settings.llm_model),     # Model stays loaded that long after a generation
         # If we'll need more arguments, add arguments into settings. See line above.
+        client_kwargs={'event_hooks': {'request': [inject_traceparent]}},     # Trace context to ollama
     )
     return llm_client
 
 
-@measure_latency
+def init_llm_backends(client: httpx.AsyncClient) -> LLMBackends:
+    """ Ollama hosts: settings.llm_urls, or settings.llm_url. Health checked with `client` """
+    backends: LLMBackends = LLMBackends(
+        urls=settings.llm_urls or [settings.llm_url],
+        max_concurrency=settings.llm_backend_concurrency,
+        client_factory=init_ollama_llm,
+        balance=settings.llm_balance,
+        affinity_hosts=settings.llm_affinity_hosts,
+        model_hosts=settings.llm_model_hosts,
+    )
+    backends.start(client)
+    logger.info(f"LLM backends: {[backend.url for backend in backends.backends]}")
+    return backends
+
+
+def llm_span_result(generation: Generation | None = None, error: Exception = None):
+    """
+    LLM trace span attributes: ollama durations (prefill = prompt eval, generation = eval), seconds
+    """
+    llm_span: Span | None = current_span()
+    if llm_span is None:
+        return
+    if error is not None:
+        llm_span.status = 'error'
+        llm_span.set(error=repr(error))
+        return
+    info: dict = generation.generation_info or {}
+    for key, name in (
+            ('load_duration', 'load_seconds'),
+            ('prompt_eval_duration', 'prefill_seconds'),
+            ('eval_duration', 'generation_seconds'),
+    ):
+        if info.get(key) is not None:
+            llm_span.set(**{name: info[key] / 1e9})
+    llm_span.set(prompt_tokens=info.get('prompt_eval_count'), generated_tokens=info.get('eval_count'))
+
+
+def span_backend(llm_client: OllamaLLM):
+    """ Ollama host of the current LLM span """
+    if (llm_span := current_span()) is not None:
+        llm_span.set(backend=llm_client.base_url)
+
+
+@measure_latency(stage='llm')
+@traced('llm')
 def llm_make_query(
-        query_id: str, query_text: str, docs: QueryReturn, cat_state: CatState,
+        query_id: str, llm_prompt: str, llm_client: OllamaLLM,
 ) -> str:
     """
-    Makes query to Ollama LLM
-
-    - 1. Prepare context
-    - 2. Query ollama
+    Makes query to Ollama LLM. Prompt: see src.llm.context.make_llm_prompt
     """
-    logger.info(msg := f"Querying LLM: {query_id} ...")
-
-    # 1. Подготовка контекста для LLM
-    doc: Object
-    # 'type':       'file',
-    # 'updated_at': datetime.datetime(2025, 3, 28, 11, 7, 48, 983443, tzinfo=datetime.timezone.utc),
-    # 'name':       '02_Великие_музеи_мира_Прадо_Мадрид_2011.pdf',
-    # 'site_name':  'Музеи',
-    # 'size':       173441090,
-    # 'link':       'https://hackaton.hb.ru-msk.vkcloud-storage...
-    # context = "\n\n".join(
-    #     doc.properties.get('content')
-    #     for doc in docs.objects
-    # )
-    context = "\n\n".join(
-        f"{{site_name}}: {doc.properties.get('site_name')}, "
-        f"{{doc_type}}: {doc.properties.get('type')}, "
-        f"{{doc_name}}: {doc.properties.get('name')}, "
-        f"{{doc_size}}: {doc.properties.get('size')}, "
-        f"{{doc_url}}: ({doc.properties.get('link')}), "
-        f"\n{doc.properties.get('content')}"
-        for doc in docs.objects
-    )
-    logger.info(f"Context size: {len(context)}, from {len(docs.objects)} docs")
-    llm_prompt: str = settings.llm_prompt_template.format(
-        context=context,
-        question=query_text,
-    )
-    logger.info(f"LLM prompt size: {len(llm_prompt)}")
-
-    # 2. Запрос к LLM
+    logger.info(msg := f"Querying LLM: {query_id}: {llm_client.base_url} ...")
+    span_backend(llm_client)
     try:
-        llm_client: OllamaLLM = cat_state.llm_client
-        llm_response: str = llm_client.invoke(llm_prompt)
+        llm_result: LLMResult = llm_client.generate([llm_prompt])    # invoke() + generation info
+        llm_response: str = llm_result.generations[0][0].text
+        llm_span_result(llm_result.generations[0][0])
+        record_generation(llm_client.model, llm_result.generations[0][0].generation_info or {})
     except Exception as e:
         logger.error(f"LLM query failed: {str(e)}")
+        STAGE_ERRORS.labels('llm').inc()
+        llm_span_result(error=e)
         llm_response = f"error: LLM query failed: {e}"
 
     logger.info(f"{msg} done")
-    # llm_response = await asyncio.wait_for(
-    #     cat_state.llm_client.generate(llm_prompt),
-    #     timeout=30.0
-    # )
-    # llm_response: LLMResult = cat_state.llm_client.generate([llm_prompt])
     return llm_response
+
+
+@measure_latency_async(stage='llm')
+@traced('llm')
+async def llm_make_query_async(
+        query_id: str, llm_prompt: str, llm_client: OllamaLLM,
+) -> str:
+    """
+    Same as llm_make_query, but with async ollama client. Doesn't block event loop
+    """
+    logger.info(msg := f"Querying LLM: {query_id}: {llm_client.base_url} ...")
+    span_backend(llm_client)
+    try:
+        llm_result: LLMResult = await asyncio.wait_for(
+            llm_client.agenerate([llm_prompt]),
+            timeout=settings.request_timeout,
+        )
+        llm_response: str = llm_result.generations[0][0].text
+        llm_span_result(llm_result.generations[0][0])
+        record_generation(llm_client.model, llm_result.generations[0][0].generation_info or {})
+    except Exception as e:
+        logger.error(f"LLM query failed: {repr(e)}")
+        STAGE_ERRORS.labels('llm').inc()
+        llm_span_result(error=e)
+        llm_response = f"error: LLM query failed: {repr(e)}"
+
+    logger.info(f"{msg} done")
+    return llm_response
+
+
+async def query_llm(
+        query_id: str, llm_prompt: str, cat_state: CatState,
+) -> tuple[str, float]:
+    """
+    Query LLM according to settings.exec_mode, on a backend picked by cat_state.llm_backends
+
+    - async: async ollama client
+    - sync:  sync ollama client in the bounded thread pool
+    - failed generation: next backend, settings.llm_failover_attempts backends at most
+    - outcome after failover counts for the LLM circuit breaker (cat_state.health)
+
+    Returns:
+        (llm_response, llm_latency)
+    Raises:
+        LLMOverloaded: no free backend within settings.llm_queue_timeout
+    """
+    backends: LLMBackends = cat_state.llm_backends
+    tried: list[Backend] = []
+    while True:
+        backend: Backend = await backends.acquire(settings.llm_model, tried)
+        latency: float | None = None
+        failed: bool = False
+        try:
+            llm_client: OllamaLLM = backend.client(settings.llm_model)
+            if settings.exec_mode == 'sync':
+                llm_response, latency = await run_in_pool(cat_state, llm_make_query, query_id, llm_prompt, llm_client)
+            else:
+                llm_response, latency = await llm_make_query_async(query_id, llm_prompt, llm_client)
+            failed = llm_response.startswith("error:")
+        finally:
+            backends.release(backend, latency, failed)
+        tried.append(backend)
+        if not failed or len(tried) >= settings.llm_failover_attempts or not backends.hosts(settings.llm_model, tried):
+            cat_state.health.record('llm', not failed)
+            return llm_response, latency
+        backends.failovers += 1
+        logger.warning(f"LLM failover: {query_id}: {backend.url} failed")
+
+
+async def llm_stream_query(
+        query_id: str, llm_prompt: str, cat_state: CatState,
+) -> AsyncIterator[str]:
+    """
+    Streams LLM response chunks (tokens) as they are generated
+
+    - async: OllamaLLM.astream
+    - sync:  OllamaLLM.stream, every chunk is fetched in the bounded thread pool
+    - backend fails before the first chunk: next backend (settings.llm_failover_attempts)
+
+    Trace span: time to the first chunk (~ prefill) and chunk count
+    """
+    logger.info(msg := f"Streaming LLM: {query_id} ...")
+    backends: LLMBackends = cat_state.llm_backends
+    tried: list[Backend] = []
+    start: float = time.perf_counter()
+    count: int = 0
+
+    with span('llm.stream') as llm_span:
+        while True:
+            backend: Backend = await backends.acquire(settings.llm_model, tried)
+            llm_client: OllamaLLM = backend.client(settings.llm_model)
+            span_backend(llm_client)
+            attempt_start: float = time.perf_counter()
+            latency: float | None = None
+            failed: bool = False
+            try:
+                if settings.exec_mode == 'sync':
+                    chunks = llm_client.stream(llm_prompt)
+                    while (chunk := await run_in_pool(cat_state, next, chunks, None)) is not None:
+                        count += 1
+                        if count == 1 and llm_span is not None:
+                            llm_span.set(first_chunk_seconds=round(time.perf_counter() - start, 4))
+                        yield chunk
+                else:
+                    async for chunk in llm_client.astream(llm_prompt):
+                        count += 1
+                        if count == 1 and llm_span is not None:
+                            llm_span.set(first_chunk_seconds=round(time.perf_counter() - start, 4))
+                        yield chunk
+                latency = time.perf_counter() - attempt_start
+                cat_state.health.record('llm', True)
+                break
+            except Exception as e:
+                STAGE_ERRORS.labels('llm').inc()
+                latency, failed = time.perf_counter() - attempt_start, True
+                tried.append(backend)
+                if count or len(tried) >= settings.llm_failover_attempts or \
+                        not backends.hosts(settings.llm_model, tried):
+                    cat_state.health.record('llm', False)
+                    raise
+                backends.failovers += 1
+                logger.warning(f"LLM failover: {query_id}: {backend.url} failed: {repr(e)}")
+            finally:
+                backends.release(backend, latency, failed)
+                if llm_span is not None:
+                    llm_span.set(chunks=count)
+
+    STAGE_LATENCY.labels('llm').observe(time.perf_counter() - start)
+    logger.info(f"{msg} done")
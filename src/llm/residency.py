@@ -0,0 +1,164 @@
+"""
+LLM model residency: models stay loaded on their ollama hosts, queries don't pay the model load
+
+- keep_alive per model (settings.llm_model_keep_alive, else settings.llm_keep_alive): sent with every generation
+  and load, ollama unloads the model after that much idle time
+- hot models (settings.llm_model and settings.llm_hot_models) are loaded (ollama /api/generate without prompt)
+  at startup and pinged every settings.llm_hot_interval, which renews their keep_alive
+- model switch (PUT /llm/model): the new model is loaded on its hosts before it is set
+- load latencies of all loads, by source: cat_llm_load_seconds
+    request: paid by a query (ollama load_duration of the generation)
+    startup, switch, ping: paid by the warm-up
+- cold starts: loads longer than settings.llm_cold_load_seconds, by source: cat_llm_cold_starts_total.
+  Pings: keep_alive expired or host restarted
+"""
+import asyncio
+import time
+
+import httpx
+
+from src.core.log import logger
+from src.core.metrics import REGISTRY, Family
+from src.core.settings import settings
+from src.llm.backends import Backend, LLMBackends
+
+LOAD_LATENCY: Family = REGISTRY.histogram(
+    'cat_llm_load_seconds', 'LLM model load time, warm and cold: request, startup, switch, ping', ('model', 'source'),
+)
+COLD_STARTS: Family = REGISTRY.counter(
+    'cat_llm_cold_starts_total', 'LLM model loads: request, startup, switch, ping', ('model', 'source'),
+)
+
+
+def keep_alive(model: str) -> str | int:
+    return settings.llm_model_keep_alive.get(model, settings.llm_keep_alive)
+
+
+def tagged(model: str) -> str:
+    """ Model name as listed by ollama /api/ps """
+    return model if ':' in model else f"{model}:latest"
+
+
+def record_load(model: str, seconds: float, source: str) -> bool:
+    """ Load latency. Cold start if the load took settings.llm_cold_load_seconds or more """
+    LOAD_LATENCY.labels(model, source).observe(seconds)
+    if seconds < settings.llm_cold_load_seconds:
+        return False
+    COLD_STARTS.labels(model, source).inc()
+    if source == 'request':
+        logger.warning(f"LLM cold start paid by a query: {model}: {seconds:.1f} s")
+    return True
+
+
+def record_generation(model: str, info: dict):
+    """ Generation info of a query: ollama load_duration, nanoseconds """
+    if info.get('load_duration') is not None:
+        record_load(model, info['load_duration'] / 1e9, 'request')
+
+
+class ModelResidency:
+    """ Loads and keeps loaded the LLM models on their hosts """
+
+    def __init__(self, backends: LLMBackends, client: httpx.AsyncClient):
+        self.backends: LLMBackends = backends
+        self.client: httpx.AsyncClient = client
+        self._task: asyncio.Task = None
+        self.pings: int = 0
+        self.errors: int = 0
+
+    @staticmethod
+    def hot_models() -> list[str]:
+        return list(dict.fromkeys([settings.llm_model, *settings.llm_hot_models]))
+
+    async def _load(self, backend: Backend, model: str, source: str) -> float:
+        start: float = time.perf_counter()
+        response: httpx.Response = await self.client.post(
+            f"{backend.url}/api/generate", json={'model': model, 'keep_alive': keep_alive(model)},
+            timeout=settings.llm_load_timeout,
+        )
+        response.raise_for_status()
+        seconds: float = time.perf_counter() - start
+        if record_load(model, seconds, source):
+            logger.info(f"LLM model loaded: {model}: {backend.url}: {seconds:.1f} s ({source})")
+        if tagged(model) not in backend.loaded:
+            backend.loaded.append(tagged(model))
+        return seconds
+
+    async def load(self, model: str, source: str) -> dict[str, float]:
+        """
+        Load the model on its hosts, or renew its keep_alive if loaded
+
+        Returns:
+            host url -> load seconds, of the hosts that loaded it
+        Raises:
+            Exception: no host loaded the model
+        """
+        hosts: list[Backend] = self.backends.hosts(model)
+        results: list = await asyncio.gather(*(self._load(b, model, source) for b in hosts), return_exceptions=True)
+        loaded: dict[str, float] = {}
+        for backend, result in zip(hosts, results):
+            if isinstance(result, Exception):
+                self.errors += 1
+                logger.warning(f"LLM model load failed: {model}: {backend.url}: {repr(result)}")
+            else:
+                loaded[backend.url] = round(result, 3)
+        if not loaded:
+            raise results[0] if results else RuntimeError(f"No LLM host for {model}")
+        return loaded
+
+    async def warm_up(self, source: str = 'startup'):
+        """ Load all hot models """
+        results: list = await asyncio.gather(
+            *(self.load(model, source) for model in self.hot_models()), return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def _run_pings(self):
+        while True:
+            await asyncio.sleep(settings.llm_hot_interval)
+            try:
+                await self.warm_up('ping')
+                self.pings += 1
+            except Exception as e:
+                logger.warning(f"LLM hot models ping failed: {repr(e)}")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run_pings())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        models: list[str] = list(dict.fromkeys([*self.hot_models(), *(model for model, _ in LOAD_LATENCY.children)]))
+        return {
+            'hot_models': self.hot_models(),
+            'hot_interval': settings.llm_hot_interval,
+            'pings': self.pings,
+            'errors': self.errors,
+            'models': {
+                model: {
+                    'keep_alive': keep_alive(model),
+                    'loaded_on': [b.url for b in self.backends.backends if tagged(model) in b.loaded],
+                    'cold_starts': {
+                        source: counter.value for (name, source), counter in COLD_STARTS.children.items()
+                        if name == model
+                    },
+                    'load_seconds': {
+                        source: histogram.stats() for (name, source), histogram in LOAD_LATENCY.children.items()
+                        if name == model
+                    },
+                }
+                for model in models
+            },
+        }
+
+
+def init_model_residency(backends: LLMBackends, client: httpx.AsyncClient) -> ModelResidency:
+    """ Hot models are pinged in background. First load: startup warm-up (src.core.startup) """
+    residency: ModelResidency = ModelResidency(backends, client)
+    residency.start()
+    return residency
@@ -1,10 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from starlette.requests import Request
 
 from src.core.log import logger
 from src.core.settings import settings
 from src.core.util import CatState
-from src.llm.ollama_util import init_ollama_llm
 
 router = APIRouter()
 
@@ -19,9 +18,10 @@ router = APIRouter()
 async def get_model(
         request: Request,
 ):
+    cat_state: CatState = request.app.state.cat
     result: dict = {
         'settings.llm_model': settings.llm_model,
-        'settings.llm_url': settings.llm_url,
+        'llm_urls': [backend.url for backend in cat_state.llm_backends.hosts(settings.llm_model)],
     }
     return result
 
@@ -31,7 +31,7 @@ async def get_model(
     "/llm/model",
     tags=['llm'],
     summary="Change llm model",
-    description="Ollama. Change model",
+    description="Ollama. Change model. The model is loaded on its hosts first: queries don't pay its cold start",
 )
 async def set_model(
         request: Request,
@@ -39,15 +39,20 @@ async def set_model(
 ):
     logger.info(msg := f"Setting  llm model: {llm_model} ...")
     previous_model: str = settings.llm_model
-    settings.llm_model = llm_model
     cat_state: CatState = request.app.state.cat
-    cat_state.llm_client = init_ollama_llm()
+    # Queries keep the previous model until the new one is loaded. Not loaded: model is not changed
+    try:
+        loaded: dict[str, float] = await cat_state.llm_residency.load(llm_model, 'switch')
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Model not loaded: {llm_model}: {repr(e)}")
+    # Stored and announced to all workers. Answer cache is cleared, backends make clients on first use
+    await cat_state.cluster.set_settings(llm_model=llm_model)
 
     result: dict = {
-        'llm_client.model': cat_state.llm_client.model,
         'settings.llm_model': settings.llm_model,
-        'settings.llm_url': settings.llm_url,
+        'llm_urls': [backend.url for backend in cat_state.llm_backends.hosts(settings.llm_model)],
         'previous_llm_model': previous_model,
+        'load_seconds': loaded,
     }
     logger.info(f"{msg} done")
     return result
@@ -79,7 +84,7 @@ async def set_prompt(
 ):
     logger.info(msg := f"Setting prompt template: {prompt_template} ...")
     previous_prompt: str = settings.llm_prompt_template
-    settings.llm_prompt_template = prompt_template
+    await request.app.state.cat.cluster.set_settings(llm_prompt_template=prompt_template)   # All workers
 
     result: dict = {
         'settings.llm_prompt_template': settings.llm_prompt_template,
@@ -88,3 +93,50 @@ async def set_prompt(
     logger.info(f"{msg} done")
     return result
 
+
+@logger.catch
+@router.get(
+    "/llm/scheduler",
+    tags=['llm'],
+    summary="LLM admission control stats",
+    description="LLM slots in use, queue depth, rejections, wait time and queue depth histograms",
+)
+async def get_scheduler(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.llm_scheduler.stats()
+
+
+@logger.catch
+@router.get(
+    "/llm/backends",
+    tags=['llm'],
+    summary="LLM backends",
+    description="""
+        Ollama hosts: health, loaded models, in-flight requests and concurrency cap, requests, errors,
+        latency (EWMA, histogram). Hosts of the current model in affinity order, waits for a free host, failovers
+    """,
+)
+async def get_backends(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.llm_backends.stats()
+
+
+@logger.catch
+@router.get(
+    "/llm/residency",
+    tags=['llm'],
+    summary="LLM model residency",
+    description="""
+        Hot models (kept loaded), keep_alive and hosts per model, cold starts by source
+        (request, startup, switch, ping), model load time histogram
+    """,
+)
+async def get_residency(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.llm_residency.stats()
@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import AsyncIterator
+
+from src.core.log import logger
+from src.core.metrics import Histogram, COUNT_BUCKETS
+from src.core.settings import settings
+
+
+class Priority(str, Enum):
+    """ LLM request priority classes. Higher priority waiters get a free slot first """
+    high   = 'high'
+    normal = 'normal'
+    low    = 'low'
+
+
+PRIORITY_ORDER: dict[Priority, int] = {Priority.high: 0, Priority.normal: 1, Priority.low: 2}
+
+
+class LLMOverloaded(Exception):
+    """ LLM request is rejected by admission control """
+
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(reason)
+        self.reason: str = reason
+        self.status_code: int = status_code
+        self.retry_after: int = retry_after
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM generations
+
+    - at most max_concurrency requests hold an LLM slot
+    - at most max_queue requests wait for a slot, ordered by priority, then FIFO
+    - queue full: rejected at once (429); no slot within queue_timeout: rejected (503)
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency: int = max_concurrency
+        self.max_queue: int = max_queue
+        self.queue_timeout: float = queue_timeout
+        self._in_flight: int = 0
+        self._queue: list[list] = []              # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self._hold_avg: float = 1.0               # Average slot hold time (EWMA), seconds
+        self.admitted: int = 0
+        self.rejected_full: int = 0
+        self.rejected_timeout: int = 0
+        self.wait_time: Histogram = Histogram()
+        self.queue_depth: Histogram = Histogram(COUNT_BUCKETS)
+
+    def retry_after(self) -> int:
+        """ Estimated seconds until a queued request would get a slot """
+        waves: float = (len(self._queue) + 1) / self.max_concurrency
+        return max(1, math.ceil(waves * self._hold_avg))
+
+    async def acquire(self, priority: Priority = Priority.normal, timeout: float = None) -> float:
+        """
+        Wait for a free LLM slot, at most `timeout` seconds (default: queue_timeout)
+
+        Returns:
+            Wait time, seconds
+        Raises:
+            LLMOverloaded: queue is full or no slot within queue_timeout
+        """
+        start: float = time.perf_counter()
+        self.queue_depth.observe(len(self._queue))
+        if self._in_flight < self.max_concurrency and not self._queue:
+            self._in_flight += 1
+        else:
+            if len(self._queue) >= self.max_queue:
+                self.rejected_full += 1
+                raise LLMOverloaded("LLM queue is full", 429, self.retry_after())
+
+            future: asyncio.Future = asyncio.get_running_loop().create_future()
+            entry: list = [PRIORITY_ORDER[priority], next(self._seq), future]
+            heapq.heappush(self._queue, entry)
+            try:
+                await asyncio.wait({future}, timeout=self.queue_timeout if timeout is None else timeout)
+            except asyncio.CancelledError:
+                self._leave_queue(entry)
+                raise
+            if not future.done():
+                self._leave_queue(entry)
+                self.rejected_timeout += 1
+                raise LLMOverloaded("LLM queue timeout", 503, self.retry_after())
+
+        wait: float = time.perf_counter() - start
+        self.wait_time.observe(wait)
+        self.admitted += 1
+        return wait
+
+    def _leave_queue(self, entry: list):
+        """ Remove waiter from queue. If slot was already handed to it, pass it on """
+        future: asyncio.Future = entry[2]
+        if future.done():
+            self.release()
+            return
+        future.cancel()
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+
+    def release(self):
+        """ Free the slot: hand it to the next waiter, if any """
+        while self._queue:
+            future: asyncio.Future = heapq.heappop(self._queue)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.normal, timeout: float = None) -> AsyncIterator[float]:
+        wait: float = await self.acquire(priority, timeout)
+        if wait > 0.1:
+            logger.info(f"LLM slot wait: {wait:.3f}s")
+        start: float = time.perf_counter()
+        try:
+            yield wait
+        finally:
+            self._hold_avg = 0.9 * self._hold_avg + 0.1 * (time.perf_counter() - start)
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'queue_timeout': self.queue_timeout,
+            'in_flight': self._in_flight,
+            'queued': len(self._queue),
+            'admitted': self.admitted,
+            'rejected_full': self.rejected_full,
+            'rejected_timeout': self.rejected_timeout,
+            'hold_avg': self._hold_avg,
+            'wait_time': self.wait_time.stats(),
+            'queue_depth': self.queue_depth.stats(),
+        }
+
+
+def init_llm_scheduler() -> LLMScheduler:
+    return LLMScheduler(
+        max_concurrency=settings.llm_max_concurrency,
+        max_queue=settings.llm_max_queue,
+        queue_timeout=settings.llm_queue_timeout,
+    )
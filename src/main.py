@@ -1,19 +1,38 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 import httpx
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
+from starlette.requests import Request
 
+from src.core.cache import init_answer_cache, init_cache_backend, init_retrieval_cache
+from src.core.cluster import init_cluster
 from src.core.db import init_pool
+from src.core.health import DependencyUnavailable, init_health
+from src.core.metrics import REGISTRY, init_pool_metrics
 from src.core.settings import settings
+from src.core.singleflight import SingleFlight
+from src.core.startup import init_startup
+from src.core.telemetry import init_telemetry
+from src.core.tracing import init_tracer, inject_traceparent
 from src.core.util import CatState
+from src.front.jobs import init_jobs
 from src.front.router import router as front_router
-from src.llm.ollama_util import init_ollama_llm
+from src.llm.ollama_util import init_llm_backends
+from src.llm.residency import init_model_residency
+from src.llm.scheduler import LLMOverloaded, init_llm_scheduler
 from src.vectordb.router import router as vdb_router
-from src.vectordb.weaviate_vdb import init_weaviate
+from src.vectordb.retriever import init_retriever
+from src.vectordb.alias import init_aliases
+from src.vectordb.content import init_content_store
+from src.vectordb.embed import init_embedder
 from src.llm.router import router as llm_router
+from src.ingest.router import router as ingest_router
+from src.rerank.reranker import init_reranker
+from src.llm.context import init_token_counter
 
 
 tags_metadata = [
@@ -25,6 +44,10 @@ tags_metadata = [
         "name": "vdb",
         "description": "Vector DB",
     },
+    {
+        "name": "admin",
+        "description": "Administration: document ingestion, blue/green reindexing",
+    },
 ]
 
 
@@ -36,21 +59,55 @@ async def lifespan(app: FastAPI):
     # Shared application variables
     app.state.cat        = CatState()
     cat_state: CatState  = app.state.cat
-    cat_state.ht_client  = httpx.AsyncClient(timeout=settings.request_timeout)
+    tracer               = init_tracer()
+    cat_state.ht_client  = httpx.AsyncClient(
+        timeout=settings.request_timeout, event_hooks={'request': [inject_traceparent]},
+    )
     cat_state.db_pool    = await init_pool()
-    # cat_state.wc         = await init_weaviate_async()
-    cat_state.wc         = init_weaviate()
-    cat_state.llm_client = init_ollama_llm()
-
-    FastAPICache.init(InMemoryBackend())
+    cat_state.telemetry  = init_telemetry(cat_state.db_pool)
+    cat_state.aliases    = await init_aliases(cat_state.db_pool)
+    cat_state.llm_backends = init_llm_backends(cat_state.ht_client)
+    cat_state.llm_residency = init_model_residency(cat_state.llm_backends, cat_state.ht_client)
+    cat_state.executor   = ThreadPoolExecutor(
+        max_workers=settings.sync_pool_size, thread_name_prefix='cat-sync',
+    )
+    cat_state.embedder   = init_embedder(cat_state)
+    cat_state.retriever  = await init_retriever(cat_state)
+    cat_state.reranker   = init_reranker()
+    cat_state.token_counter = init_token_counter()
+    cat_state.answer_cache = init_answer_cache()
+    FastAPICache.init(init_cache_backend())
+    cat_state.retrieval_cache = init_retrieval_cache(FastAPICache.get_backend())
+    cat_state.content_store = init_content_store()
+    cat_state.single_flight = SingleFlight()
+    cat_state.llm_scheduler = init_llm_scheduler()
+    cat_state.jobs       = init_jobs(cat_state)
+    cat_state.cluster    = await init_cluster(cat_state)
+    cat_state.health     = init_health(cat_state)
+    init_pool_metrics(cat_state.db_pool)
+    REGISTRY.register('cat_llm_wait_seconds', 'Wait for an LLM slot', cat_state.llm_scheduler.wait_time)
+    cat_state.startup, warmup = init_startup(cat_state)
 
     yield
 
     # Application shutdown
+    warmup.cancel()
+    await cat_state.health.close()
+    await cat_state.cluster.close()
+    await cat_state.jobs.close()
+    for background in (cat_state.reindexer, cat_state.ingestor):
+        if background is not None and background.task is not None:
+            background.task.cancel()
+            await asyncio.gather(background.task, return_exceptions=True)
+    await cat_state.llm_residency.close()
+    await cat_state.llm_backends.close()
     await cat_state.ht_client.aclose()
+    await cat_state.telemetry.close()
     await cat_state.db_pool.close()
-    # await cat_state.wc.close()
-    cat_state.wc.close()
+    await cat_state.retriever.close()
+    cat_state.embedder.close()
+    cat_state.executor.shutdown(wait=False, cancel_futures=True)
+    tracer.close()
     await FastAPICache.clear()
 
 
@@ -63,11 +120,64 @@ app = FastAPI(
 app.include_router(front_router)     # Front UI methods
 app.include_router(vdb_router)       # Vector DB methods
 app.include_router(llm_router)       # Vector DB methods
+app.include_router(ingest_router)    # Admin: document ingestion
+
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    """ LLM admission control rejection: 429 (queue full) / 503 (queue timeout) """
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={'detail': exc.reason, 'retry_after': exc.retry_after},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DependencyUnavailable)
+async def dependency_unavailable_handler(request: Request, exc: DependencyUnavailable):
+    """ Circuit breaker of a dependency is open: 503 until it is probed again """
+    return JSONResponse(
+        status_code=503,
+        content={'detail': str(exc), 'dependency': exc.dependency, 'retry_after': exc.retry_after},
+        headers={'Retry-After': str(exc.retry_after)},
+    )
 
 
 @app.get('/health', include_in_schema=False)
-def health_check():
-    return HTMLResponse()
+def health_check(request: Request):
+    """ 503 until the worker is warmed up (src.core.startup) """
+    startup = request.app.state.cat.startup
+    if startup is None:
+        return JSONResponse(status_code=503, content={'status': 'starting'})
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.stats())
+
+
+@app.get('/ready', include_in_schema=False)
+def ready_check(request: Request):
+    """ Readiness: warmed up and dependencies up (src.core.health). 503 takes the worker out of the balancer """
+    cat_state: CatState = request.app.state.cat
+    if cat_state.startup is None or cat_state.health is None:
+        return JSONResponse(status_code=503, content={'status': 'starting'})
+    ready: bool = cat_state.startup.ready and cat_state.health.ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            'status': 'ready' if ready else 'starting' if not cat_state.startup.ready else 'degraded',
+            'dependencies': cat_state.health.stats(),
+        },
+    )
+
+
+@app.get('/cluster', include_in_schema=False)
+def cluster_view(request: Request):
+    """ Multi-worker mode: this worker, runtime settings, events published/received """
+    return request.app.state.cat.cluster.stats()
+
+
+@app.get('/metrics', include_in_schema=False)
+def metrics_view():
+    """ Prometheus metrics: stage latencies, status transitions, prompt sizes, errors, db pool """
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
 
 
 @app.get('/info', include_in_schema=False)
@@ -5,7 +5,7 @@ from sqlalchemy import (
     Index,
 )
 from sqlalchemy.dialects.postgresql import (
-    UUID, TIMESTAMP, TEXT, JSONB, INTERVAL,
+    UUID, TIMESTAMP, TEXT, JSONB, INTERVAL, BIGINT, INTEGER, ARRAY,
 )
 from sqlalchemy.orm import declarative_base
 
@@ -50,12 +50,64 @@ class QueryDetail(Base):
     llm_latency    = Column(INTERVAL, comment='Длительность ответа LLM')
     rnk_model      = Column(TEXT, comment='Reranker model name')
     rnk_latency    = Column(INTERVAL, comment='Длительность ответа reranker')
+    response_text  = Column(TEXT, comment='Ответ LLM')
+    prompt_tokens  = Column(INTEGER, comment='Размер промпта LLM, токены')
+    docs           = Column(JSONB, comment='Документы контекста LLM: uuid, link, distance')
     info           = Column(JSONB, comment='Прочая информация')
 
 
 Index(None, QueryDetail.timestamp.desc(), unique=False)
 
 
+class DocManifest(Base):
+    """ Проиндексированные документы (incremental ingestion) """
+    __tablename__ = 'backend_doc_manifest'
+    __table_args__ = (
+        {
+            'schema': 'public',
+            'comment': 'Проиндексированные документы',
+        },
+    )
+    collection     = Column(TEXT, primary_key=True, comment='Vector DB index/collection name')
+    link           = Column(TEXT, primary_key=True, comment='Ссылка на документ')
+    content_hash   = Column(TEXT, comment='sha256 содержимого')
+    updated_at     = Column(TIMESTAMP, comment='mtime файла, UTC')
+    size           = Column(BIGINT, comment='Размер файла, bytes')
+    chunk_count    = Column(INTEGER, comment='Количество чанков')
+    object_ids     = Column(ARRAY(UUID), comment='UUID объектов в vector DB')
+    indexed_at     = Column(TIMESTAMP, comment='Timestamp индексации')
+
+
+class CollectionAlias(Base):
+    """ Алиасы коллекций vector DB (blue/green reindexing) """
+    __tablename__ = 'backend_collection_alias'
+    __table_args__ = (
+        {
+            'schema': 'public',
+            'comment': 'Алиасы коллекций',
+        },
+    )
+    alias          = Column(TEXT, primary_key=True, comment='Алиас, по которому обращаются запросы')
+    collection     = Column(TEXT, comment='Активная коллекция')
+    previous       = Column(TEXT, comment='Предыдущая коллекция, для rollback')
+    updated_at     = Column(TIMESTAMP, comment='Timestamp переключения')
+
+
+class RuntimeSetting(Base):
+    """ Настройки, измененные через API (модель LLM, промпт). Общие для всех воркеров """
+    __tablename__ = 'backend_runtime_setting'
+    __table_args__ = (
+        {
+            'schema': 'public',
+            'comment': 'Настройки, измененные во время работы',
+        },
+    )
+    name           = Column(TEXT, primary_key=True, comment='Имя настройки (settings)')
+    value          = Column(JSONB, comment='Значение')
+    worker         = Column(TEXT, comment='Воркер, изменивший настройку')
+    updated_at     = Column(TIMESTAMP, comment='Timestamp изменения')
+
+
 class Status(str, Enum):
     """
     Статусы запроса
@@ -0,0 +1,18 @@
+from abc import ABC, abstractmethod
+
+from src.vectordb.base import Doc
+
+
+def doc_text(doc: Doc) -> str:
+    """ Text the reranker scores: document name and content """
+    return f"{doc.properties.get('name') or ''}\n{doc.properties.get('content') or ''}"
+
+
+class Reranker(ABC):
+    """ Scores (query, document) pairs. One batched call per query """
+    name: str = None
+    needs_content: bool = True      # Scores doc content: docs are retrieved with it (no lazy content)
+
+    @abstractmethod
+    def score(self, query_text: str, docs: list[Doc]) -> list[float]:
+        """ Relevance scores, higher is better. CPU bound: called in the thread pool """
@@ -0,0 +1,108 @@
+import math
+import re
+from collections import Counter
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.tracing import traced
+from src.core.util import CatState, measure_latency_async, run_in_pool
+from src.rerank.base import Reranker, doc_text
+from src.vectordb.base import Doc
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+class BM25Reranker(Reranker):
+    """
+    Lexical fallback: BM25 over the candidates, fused with vector distance
+    by reciprocal rank fusion (candidates come ordered by distance)
+    """
+    name: str = 'bm25'
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, rrf_k: int = 60):
+        self.k1: float = k1
+        self.b: float = b
+        self.rrf_k: int = rrf_k
+
+    def bm25(self, query_text: str, docs: list[Doc]) -> list[float]:
+        terms: set[str] = set(TOKEN_RE.findall(query_text.lower()))
+        tfs: list[Counter] = [Counter(TOKEN_RE.findall(doc_text(doc).lower())) for doc in docs]
+        lengths: list[int] = [sum(tf.values()) for tf in tfs]
+        avg_length: float = sum(lengths) / len(lengths) or 1.0
+        n: int = len(docs)
+        scores: list[float] = [0.0] * n
+        for term in terms:
+            df: int = sum(1 for tf in tfs if term in tf)
+            if df == 0:
+                continue
+            idf: float = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i, tf in enumerate(tfs):
+                f: int = tf.get(term, 0)
+                if f:
+                    norm: float = self.k1 * (1 - self.b + self.b * lengths[i] / avg_length)
+                    scores[i] += idf * f * (self.k1 + 1) / (f + norm)
+        return scores
+
+    def score(self, query_text: str, docs: list[Doc]) -> list[float]:
+        bm25: list[float] = self.bm25(query_text, docs)
+        bm25_rank: dict[int, int] = {i: r for r, i in enumerate(sorted(range(len(docs)), key=lambda i: -bm25[i]))}
+        return [
+            1 / (self.rrf_k + vector_rank + 1) + 1 / (self.rrf_k + bm25_rank[vector_rank] + 1)
+            for vector_rank in range(len(docs))
+        ]
+
+
+class CrossEncoderReranker(Reranker):
+    """ Local CPU cross-encoder (sentence-transformers). Scores all pairs in one batch """
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder   # Optional dependency
+        self.name: str = model_name
+        self.model = CrossEncoder(model_name, device='cpu')
+
+    def score(self, query_text: str, docs: list[Doc]) -> list[float]:
+        pairs: list[tuple[str, str]] = [(query_text, doc_text(doc)) for doc in docs]
+        return [float(s) for s in self.model.predict(pairs, batch_size=len(pairs))]
+
+
+def init_reranker() -> Reranker | None:
+    """
+    Reranker by settings.rnk_model
+
+    - none: no reranking
+    - bm25: lexical fallback
+    - other: cross-encoder model name. Falls back to bm25 if sentence-transformers is missing
+    """
+    if settings.rnk_model == 'none':
+        return None
+    if settings.rnk_model == 'bm25':
+        return BM25Reranker()
+    try:
+        return CrossEncoderReranker(settings.rnk_model)
+    except ImportError as e:
+        logger.warning(f"Cross-encoder reranker is not available, using bm25: {repr(e)}")
+        return BM25Reranker()
+
+
+@measure_latency_async(stage='rerank')
+@traced('rerank')
+async def rerank_docs(
+        query_id: str, query_text: str, docs: list[Doc], cat_state: CatState, top_k: int = None,
+) -> list[Doc]:
+    """
+    Rerank candidates, keep top_k best for the prompt
+
+    Returns:
+        (docs, rnk_latency)
+    """
+    top_k = settings.rnk_top_k if top_k is None else top_k
+    reranker: Reranker = cat_state.reranker
+    if reranker is None or len(docs) == 0:
+        return docs[:top_k]
+    logger.info(msg := f"Reranking: {query_id}: {len(docs)} docs ...")
+    scores: list[float] = await run_in_pool(cat_state, reranker.score, query_text, docs)
+    for doc, score in zip(docs, scores):
+        doc.score = score
+    result: list[Doc] = sorted(docs, key=lambda doc: -doc.score)[:top_k]
+    logger.info(f"{msg} done")
+    return result
@@ -0,0 +1,73 @@
+"""
+Collection aliases: requests address a collection by alias (settings.weaviate_collection),
+the alias is resolved to a physical collection on every query.
+Flipping an alias is one dict assignment: requests in flight finish on the old collection,
+new ones go to the new collection. The previous collection is kept for rollback
+"""
+from dataclasses import dataclass, astuple
+from datetime import datetime, UTC
+
+import asyncpg
+
+from src.core.log import logger
+from src.core.telemetry import upsert_sql
+from src.models.cat_public import CollectionAlias
+
+ALIAS_COLUMNS: list[str] = ['alias', 'collection', 'previous', 'updated_at']
+ALIAS_SQL: str = upsert_sql(CollectionAlias, ALIAS_COLUMNS, keys=['alias'])
+
+
+@dataclass
+class AliasEntry:
+    alias:      str
+    collection: str
+    previous:   str = None
+    updated_at: datetime = None     # naive UTC
+
+
+class CollectionAliases:
+    """
+    alias -> collection, persisted in backend_collection_alias.
+    A name without alias is a collection name itself
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool: asyncpg.Pool = pool
+        self.aliases: dict[str, AliasEntry] = {}
+
+    async def load(self):
+        rows: list[asyncpg.Record] = await self.pool.fetch(
+            f"SELECT {', '.join(ALIAS_COLUMNS)} FROM {CollectionAlias.__table__.fullname}"
+        )
+        self.aliases = {row['alias']: AliasEntry(**row) for row in rows}
+
+    def resolve(self, name: str) -> str:
+        entry: AliasEntry | None = self.aliases.get(name)
+        return name if entry is None else entry.collection
+
+    async def flip(self, alias: str, collection: str) -> AliasEntry:
+        """ Point alias to collection. Current target becomes `previous` """
+        logger.info(msg := f"Alias flip: {alias} -> {collection} ...")
+        entry: AliasEntry = AliasEntry(
+            alias=alias,
+            collection=collection,
+            previous=self.resolve(alias),
+            updated_at=datetime.now(UTC).replace(tzinfo=None),
+        )
+        await self.pool.execute(ALIAS_SQL, *astuple(entry))     # Persisted first: no flip if DB is down
+        self.aliases[alias] = entry
+        logger.info(f"{msg} done, previous: {entry.previous}")
+        return entry
+
+    async def rollback(self, alias: str) -> AliasEntry:
+        """ Point alias back to the previous collection """
+        entry: AliasEntry | None = self.aliases.get(alias)
+        if entry is None or entry.previous is None or entry.previous == entry.collection:
+            raise ValueError(f"No previous collection for alias: {alias}")
+        return await self.flip(alias, entry.previous)
+
+
+async def init_aliases(pool: asyncpg.Pool) -> CollectionAliases:
+    aliases: CollectionAliases = CollectionAliases(pool)
+    await aliases.load()
+    return aliases
@@ -0,0 +1,124 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+from enum import Enum
+from typing import Any
+
+
+@dataclass
+class Doc:
+    """ Retrieved document: object id, distance to the query, properties """
+    uuid:       str
+    distance:   float | None = None
+    properties: dict = field(default_factory=dict)
+    score:      float | None = None     # Reranker score
+    collection: str | None = None       # Collection it was retrieved from: content is fetched from it
+
+
+class SearchMode(str, Enum):
+    """ Retrieval mode """
+    near_text   = 'near_text'       # Query embedded by the vector store
+    near_vector = 'near_vector'     # Query embedded with settings.embed_model
+    bm25        = 'bm25'            # Keyword search
+    hybrid      = 'hybrid'          # bm25 + vector, weighted by settings.vdb_hybrid_alpha
+
+
+@dataclass
+class Range:
+    """ Property filter: gte <= value <= lte. None: unbounded """
+    gte: Any = None
+    lte: Any = None
+
+
+def make_filters(
+        site_name: str = None,
+        doc_type: str = None,
+        updated_from: datetime = None,
+        updated_to: datetime = None,
+) -> dict | None:
+    """ Query params -> retriever filters. None: no filters. Dates without timezone are UTC """
+    def utc(d: datetime | None) -> datetime | None:
+        return d.replace(tzinfo=UTC) if d is not None and d.tzinfo is None else d
+
+    filters: dict = {}
+    if site_name is not None:
+        filters['site_name'] = site_name
+    if doc_type is not None:
+        filters['type'] = doc_type
+    if updated_from is not None or updated_to is not None:
+        filters['updated_at'] = Range(gte=utc(updated_from), lte=utc(updated_to))
+    return filters or None
+
+
+def match_value(value: Any, expected: Any) -> bool:
+    if isinstance(expected, Range):
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return (expected.gte is None or value >= expected.gte) and (expected.lte is None or value <= expected.lte)
+    if isinstance(expected, (list, tuple)):
+        return value in expected
+    return value == expected
+
+
+def match_filters(properties: dict, filters: dict) -> bool:
+    """ Filters on a client side (local vector store): all must match """
+    return all(match_value(properties.get(p), v) for p, v in filters.items())
+
+
+class Retriever(ABC):
+    """
+    Vector store interface. Implementations: weaviate, local (in-process numpy index).
+    Selected by settings.vdb_type
+    """
+    vdb_type: str = None
+
+    @abstractmethod
+    async def search(
+            self,
+            query_text: str,
+            k: int,
+            filters: dict = None,
+            collection_name: str = None,
+            mode: str = None,
+            properties: list[str] = None,
+    ) -> list[Doc]:
+        """
+        Documents closest to query_text
+
+        Args:
+            query_text:         Text query
+            k:                  Max number of documents
+            filters:            Property filters: {property: value | [values] | Range}, all must match
+            collection_name:    Collection. Default: settings.weaviate_collection
+            mode:               SearchMode. Default: settings.vdb_search_mode
+            properties:         Properties to return. Default: all
+        """
+
+    @abstractmethod
+    async def fetch(self, collection_name: str, uuids: list[str], properties: list[str] = None) -> dict[str, dict]:
+        """ Properties of objects by uuid, in one call. Objects not found are left out """
+
+    @abstractmethod
+    async def list_collections(self) -> list[str]:
+        ...
+
+    @abstractmethod
+    async def get_collection(self, name: str) -> Any:
+        """ Collection config """
+
+    @abstractmethod
+    async def count(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    async def delete_collection(self, name: str):
+        ...
+
+    async def is_ready(self) -> bool:
+        """ Health probe """
+        return True
+
+    async def close(self):
+        pass
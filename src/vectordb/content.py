@@ -0,0 +1,77 @@
+"""
+Lazy document content
+
+Search returns light properties (settings.vdb_light_properties). Content of the docs that are used
+(reranking, LLM context) is fetched afterwards by uuid: one batched call per collection,
+through the LRU content store (settings.content_cache_size) shared by all queries of the worker
+"""
+from src.core.cache import TTLCache
+from src.core.settings import settings
+from src.vectordb.base import Doc, Retriever
+
+CONTENT: str = 'content'
+
+
+class ContentStore:
+    """ Doc contents by collection and uuid (LRU with TTL), fetched from the vector store on miss """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.cache: TTLCache = TTLCache(max_size, ttl)
+        self.fetches: int = 0           # Vector store calls
+        self.fetched_docs: int = 0
+        self.fetched_chars: int = 0
+        self.not_found: int = 0         # Deleted since the search: content stays empty
+        self.invalidations: int = 0
+
+    @staticmethod
+    def key(collection: str, uuid: str) -> str:
+        return f"{collection.lower()}:{uuid}"
+
+    async def fill(self, docs: list[Doc], retriever: Retriever) -> list[Doc]:
+        """
+        Set content of docs without it, in place. Properties dicts are replaced, not changed:
+        they may be shared (local vector store, retrieval cache)
+        """
+        missing: dict[str, list[Doc]] = {}     # collection -> docs
+        for doc in docs:
+            if CONTENT in doc.properties or doc.collection is None:
+                continue
+            if (content := self.cache.get(self.key(doc.collection, doc.uuid))) is not None:
+                doc.properties = {**doc.properties, CONTENT: content}
+            else:
+                missing.setdefault(doc.collection, []).append(doc)
+
+        for collection, batch in missing.items():
+            objects: dict[str, dict] = await retriever.fetch(
+                collection, list(dict.fromkeys(doc.uuid for doc in batch)), [CONTENT],
+            )
+            self.fetches += 1
+            for doc in batch:
+                if (content := objects.get(doc.uuid, {}).get(CONTENT)) is None:
+                    self.not_found += 1
+                    continue
+                self.cache.set(self.key(collection, doc.uuid), content)
+                self.fetched_docs += 1
+                self.fetched_chars += len(content)
+                doc.properties = {**doc.properties, CONTENT: content}
+        return docs
+
+    def invalidate(self):
+        """ A collection was written: chunks keep their uuids, not their content. Writes are rare: all dropped """
+        self.cache.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            'lazy': settings.vdb_lazy_content,
+            'fetches': self.fetches,
+            'fetched_docs': self.fetched_docs,
+            'fetched_chars': self.fetched_chars,
+            'not_found': self.not_found,
+            'invalidations': self.invalidations,
+        }
+
+
+def init_content_store() -> ContentStore:
+    return ContentStore(settings.content_cache_size, settings.content_cache_ttl)
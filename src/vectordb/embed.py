@@ -0,0 +1,38 @@
+from src.core.log import logger
+from src.core.metrics import timed
+from src.core.tracing import current_span, traced
+from src.core.settings import settings
+from src.core.util import CatState
+from src.vectordb.embedder import DiskEmbeddingStore, Embedder, EmbeddingCache
+
+
+@timed('embed')
+@traced('ollama.embed')
+async def embed_texts(texts: list[str], cat_state: CatState) -> list[list[float]]:
+    """
+    Embed texts with ollama embedding model (settings.embed_model)
+    """
+    logger.debug(msg := f"Embedding {len(texts)} texts ...")
+    if (span := current_span()) is not None:
+        span.set(texts=len(texts), model=settings.embed_model)
+    resp = await cat_state.ht_client.post(
+        f"{settings.embed_url}/api/embed",
+        json={'model': settings.embed_model, 'input': texts},
+    )
+    resp.raise_for_status()
+    embeddings: list[list[float]] = resp.json()['embeddings']
+    logger.debug(f"{msg} done")
+    return embeddings
+
+
+def init_embedder(cat_state: CatState) -> Embedder:
+    """ Batched, cached query embeddings. On disk too, if settings.embed_cache_path is set """
+    disk: DiskEmbeddingStore | None = None
+    if settings.embed_cache_path:
+        disk = DiskEmbeddingStore(settings.embed_cache_path, settings.embed_cache_disk_size)
+    return Embedder(
+        lambda texts: embed_texts(texts, cat_state),
+        EmbeddingCache(settings.embed_cache_size, settings.embed_cache_ttl, disk),
+        batch_size=settings.embed_batch_size,
+        batch_wait=settings.embed_batch_wait,
+    )
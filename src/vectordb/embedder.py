@@ -0,0 +1,238 @@
+"""
+Query embeddings computed by the backend (settings.embed_model), so vector stores are queried
+with near_vector and the embedding is reused by the semantic answer cache.
+
+- Embedder: concurrent requests are batched into one /api/embed call
+- EmbeddingCache: LRU by (model, normalised text), optionally backed by DiskEmbeddingStore
+- DiskEmbeddingStore: memory-mapped ring buffer of embeddings, survives restarts
+"""
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import nullcontext
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from src.core.cache import TTLCache, normalize_query
+from src.core.log import logger
+from src.core.settings import settings
+
+EmbedFunc = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+def embedding_key(text: str, model: str = None) -> str:
+    model = settings.embed_model if model is None else model
+    return hashlib.sha1(f"{model}|{text}".encode()).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Embeddings on disk, in settings.embed_cache_path:
+
+    - vectors.npy: float32 (capacity, dim), memory-mapped. Rows are reused as a ring buffer
+    - keys.jsonl:  {"key": ..., "row": ...} per write. Last write of a row wins
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path: str = path
+        self.capacity: int = capacity
+        self.vectors_path: str = os.path.join(path, 'vectors.npy')
+        self.keys_path: str = os.path.join(path, 'keys.jsonl')
+        self.vectors: np.memmap | None = None
+        self.rows: dict[str, int] = {}          # key -> row
+        self.row_keys: dict[int, str] = {}      # row -> key
+        self.next_row: int = 0
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.vectors_path) and os.path.exists(self.keys_path):
+            self.load()
+        self.keys_file = open(self.keys_path, 'a')
+
+    def load(self):
+        self.vectors = np.load(self.vectors_path, mmap_mode='r+')
+        lines: int = 0
+        with open(self.keys_path) as f:
+            for line in f:
+                item: dict = json.loads(line)
+                self.row_keys[item['row']] = item['key']
+                self.next_row = (item['row'] + 1) % len(self.vectors)
+                lines += 1
+        self.rows = {key: row for row, key in self.row_keys.items()}
+        if lines > 2 * len(self.rows):        # Compact: rows overwritten many times
+            with open(self.keys_path, 'w') as f:
+                for row, key in self.row_keys.items():
+                    f.write(json.dumps({'key': key, 'row': row}) + '\n')
+        logger.info(f"Embedding store loaded: {self.path}: {len(self.rows)} embeddings")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, key: str) -> list[float] | None:
+        row: int | None = self.rows.get(key)
+        return None if row is None else self.vectors[row].tolist()
+
+    def put(self, key: str, vector: list[float]):
+        if self.vectors is None:
+            self.vectors = np.lib.format.open_memmap(
+                self.vectors_path, mode='w+', dtype=np.float32, shape=(self.capacity, len(vector)),
+            )
+        if len(vector) != self.vectors.shape[1] or key in self.rows:
+            return
+        row: int = self.next_row
+        if (old_key := self.row_keys.get(row)) is not None:
+            del self.rows[old_key]
+        self.vectors[row] = vector
+        self.keys_file.write(json.dumps({'key': key, 'row': row}) + '\n')
+        self.rows[key] = row
+        self.row_keys[row] = key
+        self.next_row = (row + 1) % len(self.vectors)
+
+    def close(self):
+        if self.vectors is not None:
+            self.vectors.flush()
+        self.keys_file.close()
+
+
+class EmbeddingCache:
+    """ Embeddings by key: memory LRU, then disk store (if configured) """
+
+    def __init__(self, max_size: int, ttl: float, disk: DiskEmbeddingStore = None):
+        self.memory: TTLCache = TTLCache(max_size=max_size, ttl=ttl)
+        self.disk: DiskEmbeddingStore | None = disk
+        self.disk_hits: int = 0
+
+    def get(self, key: str) -> list[float] | None:
+        if (vector := self.memory.get(key)) is not None:
+            return vector
+        if self.disk is not None and (vector := self.disk.get(key)) is not None:
+            self.disk_hits += 1
+            self.memory.set(key, vector)
+            return vector
+        return None
+
+    def set(self, key: str, vector: list[float]):
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            self.disk.put(key, vector)
+
+    def clear(self):
+        self.memory.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> dict:
+        memory: dict = self.memory.stats()
+        lookups: int = memory['hits'] + memory['misses']
+        hits: int = memory['hits'] + self.disk_hits
+        return {
+            'memory': memory,
+            'disk': {'size': len(self.disk), 'hits': self.disk_hits} if self.disk is not None else None,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+
+class Embedder:
+    """
+    Batched, cached embedding client.
+    Texts requested within batch_wait are embedded in one call (up to batch_size),
+    identical texts in flight share one embedding. max_concurrency: parallel calls, None: unbounded
+    """
+
+    def __init__(
+            self,
+            embed_func: EmbedFunc,
+            cache: EmbeddingCache,
+            batch_size: int,
+            batch_wait: float,
+            max_concurrency: int = None,
+    ):
+        self.embed_func: EmbedFunc = embed_func
+        self.cache: EmbeddingCache = cache
+        self.batch_size: int = batch_size
+        self.batch_wait: float = batch_wait
+        self._semaphore: asyncio.Semaphore | None = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._batch: list[tuple[str, str, asyncio.Future]] = []     # (key, text, future)
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.calls: int = 0         # /api/embed calls
+        self.embedded: int = 0      # Texts embedded
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """ Embeddings of texts: cached, or embedded in a shared batch """
+        keys: list[str] = [embedding_key(text) for text in texts]
+        vectors: list = [self.cache.get(key) for key in keys]
+        futures: dict[int, asyncio.Future] = {
+            i: self._submit(key, text)
+            for i, (key, text, vector) in enumerate(zip(keys, texts, vectors))
+            if vector is None
+        }
+        # All awaited: a failed batch fails every text of it, each failure is retrieved
+        results: list = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        for i, vector in zip(futures, results):
+            vectors[i] = vector
+        return vectors
+
+    async def embed_query(self, query_text: str) -> list[float]:
+        """ Query embedding. Same text as the semantic answer cache: normalize_query """
+        return (await self.embed([normalize_query(query_text)]))[0]
+
+    def _submit(self, key: str, text: str) -> asyncio.Future:
+        if (future := self._in_flight.get(key)) is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._in_flight[key] = future
+        self._batch.append((key, text, future))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_wait, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task: asyncio.Task = asyncio.create_task(self._call(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, batch: list[tuple[str, str, asyncio.Future]]):
+        try:
+            async with self._semaphore or nullcontext():
+                vectors: list[list[float]] = await self.embed_func([text for _, text, _ in batch])
+            self.calls += 1
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedding count mismatch: {len(vectors)} vectors for {len(batch)} texts")
+        except Exception as e:
+            logger.warning(f"Embedding failed: {len(batch)} texts: {repr(e)}")
+            for key, _, future in batch:
+                self._in_flight.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.embedded += len(batch)
+        for (key, _, future), vector in zip(batch, vectors):
+            self.cache.set(key, vector)
+            self._in_flight.pop(key, None)
+            if not future.done():
+                future.set_result(vector)
+
+    def close(self):
+        self.cache.close()
+
+    def stats(self) -> dict:
+        return {
+            'model': settings.embed_model,
+            'calls': self.calls,
+            'embedded': self.embedded,
+            'avg_batch': self.embedded / self.calls if self.calls else 0.0,
+            'in_flight': len(self._in_flight),
+            'cache': self.cache.stats(),
+        }
@@ -0,0 +1,256 @@
+"""
+In-process vector store: numpy index, no network hop for the search.
+
+Collections are kept in memory and persisted in settings.local_vdb_path:
+
+- {name}/vectors.npy:    normalised float32 vectors (n, dim). Memory-mapped on load
+- {name}/objects.jsonl:  {"uuid": ..., "properties": {...}} per vector, same order
+
+Search is exact (cosine) for small collections. Above settings.local_vdb_ivf_threshold
+an IVF index (spherical k-means lists) is built and settings.local_vdb_nprobe lists
+are scanned.
+
+Export a weaviate collection:
+    python -m src.vectordb.local_vdb export catsearch
+"""
+import json
+import os
+import shutil
+import sys
+import threading
+from typing import Any
+
+import numpy as np
+
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.tracing import span
+from src.core.util import CatState, run_in_pool
+from src.vectordb.base import Doc, Retriever, match_filters
+from src.vectordb.weaviate_vdb import init_weaviate
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalIndex:
+    """ One collection: vectors, object ids and properties """
+
+    def __init__(self, ids: list[str], vectors: np.ndarray, properties: list[dict]):
+        self.ids: list[str] = ids
+        self.vectors: np.ndarray = vectors          # normalised, (n, dim)
+        self.properties: list[dict] = properties
+        self.ivf: tuple[np.ndarray, list[np.ndarray]] = None    # IVF: centroids (nlist, dim), row numbers per centroid
+        self._ivf_lock: threading.Lock = threading.Lock()
+        self._rows: dict[str, int] = None           # uuid -> row number
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self) -> dict[str, int]:
+        if self._rows is None:
+            self._rows = {uuid: row for row, uuid in enumerate(self.ids)}
+        return self._rows
+
+    @classmethod
+    def load(cls, path: str) -> 'LocalIndex':
+        vectors: np.ndarray = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        ids: list[str] = []
+        properties: list[dict] = []
+        with open(os.path.join(path, 'objects.jsonl'), encoding='utf-8') as f:
+            for line in f:
+                obj: dict = json.loads(line)
+                ids.append(obj['uuid'])
+                properties.append(obj['properties'])
+        return cls(ids, vectors, properties)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'vectors.npy'), np.asarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(path, 'objects.jsonl'), 'w', encoding='utf-8') as f:
+            for uuid, props in zip(self.ids, self.properties):
+                f.write(json.dumps({'uuid': uuid, 'properties': props}, ensure_ascii=False, default=str) + '\n')
+
+    def add(self, ids: list[str], vectors: np.ndarray, properties: list[dict]):
+        vectors = normalize_rows(vectors)
+        self.vectors = vectors if len(self.ids) == 0 else np.vstack([self.vectors, vectors])
+        self.ids = self.ids + list(ids)
+        self.properties = self.properties + list(properties)
+        self.ivf = None     # IVF is rebuilt on next search
+        self._rows = None
+
+    def build_ivf(self, nlist: int, iterations: int = 10, seed: int = 0) -> tuple[np.ndarray, list[np.ndarray]]:
+        """ Spherical k-means: nlist centroids, row numbers of vectors per centroid """
+        vectors: np.ndarray = self.vectors
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        logger.info(f"Local vdb IVF built: {len(vectors)} vectors, {nlist} lists")
+        return centroids, [np.flatnonzero(assign == c) for c in range(nlist)]
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray | None:
+        """ Row numbers to scan. None: all rows (exact search) """
+        if len(self) < settings.local_vdb_ivf_threshold:
+            return None
+        if (ivf := self.ivf) is None:
+            with self._ivf_lock:    # Searches run in the thread pool: concurrent first searches wait for one build
+                if (ivf := self.ivf) is None:
+                    ivf = self.ivf = self.build_ivf(settings.local_vdb_nlist or int(np.sqrt(len(self))))
+        centroids, lists = ivf
+        nearest = np.argsort(-(centroids @ query))[:nprobe]
+        return np.concatenate([lists[c] for c in nearest])
+
+    def search(self, query: list[float], k: int, filters: dict = None) -> list[Doc]:
+        if len(self) == 0:
+            return []
+        query: np.ndarray = normalize_rows(query)
+        rows: np.ndarray | None = self.candidates(query, settings.local_vdb_nprobe)
+        if filters:
+            rows = np.arange(len(self)) if rows is None else rows
+            rows = np.array([r for r in rows if match_filters(self.properties[r], filters)], dtype=np.int64)
+            if len(rows) == 0:
+                return []
+        similarity: np.ndarray = (self.vectors if rows is None else self.vectors[rows]) @ query
+        k = min(k, len(similarity))
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top])]
+        return [
+            Doc(
+                uuid=self.ids[row],
+                distance=float(1.0 - similarity[i]),    # cosine distance, as weaviate
+                properties=self.properties[row],
+            )
+            for i, row in ((i, int(i if rows is None else rows[i])) for i in top)
+        ]
+
+
+class LocalRetriever(Retriever):
+    """
+    In-process vector store (settings.vdb_type = 'local').
+    Query is embedded with settings.embed_model, same as the collection vectors.
+    Vector search only: bm25 and hybrid modes fall back to it
+    """
+    vdb_type: str = 'local'
+
+    def __init__(self, cat_state: CatState, path: str = None):
+        self.cat_state: CatState = cat_state
+        self.path: str = settings.local_vdb_path if path is None else path
+        self.collections: dict[str, LocalIndex] = {}
+
+    def collection_path(self, name: str) -> str:
+        """
+        Directory of the collection
+
+        Raises:
+            ValueError: name is not a plain directory name (path traversal)
+        """
+        root: str = os.path.realpath(self.path)
+        path: str = os.path.realpath(os.path.join(root, name))
+        if not name or name.startswith('.') or os.sep in name or os.path.dirname(path) != root:
+            raise ValueError(f"Invalid local vdb collection name: {name}")
+        return path
+
+    def collection(self, name: str) -> LocalIndex:
+        if name not in self.collections:
+            path: str = self.collection_path(name)
+            if not os.path.exists(path):
+                raise KeyError(f"Local vdb collection not found: {name}")
+            self.collections[name] = LocalIndex.load(path)
+        return self.collections[name]
+
+    async def search(
+            self,
+            query_text: str,
+            k: int,
+            filters: dict = None,
+            collection_name: str = None,
+            mode: str = None,
+            properties: list[str] = None,
+    ) -> list[Doc]:
+        collection_name = settings.weaviate_collection if collection_name is None else collection_name
+        index: LocalIndex = self.collection(collection_name)
+        with span('embed_query'):
+            vector: list[float] = await self.cat_state.embedder.embed_query(query_text)
+        docs: list[Doc] = await run_in_pool(self.cat_state, index.search, vector, k, filters)
+        if properties is not None:
+            for doc in docs:
+                doc.properties = {p: doc.properties[p] for p in properties if p in doc.properties}
+        return docs
+
+    async def fetch(self, collection_name: str, uuids: list[str], properties: list[str] = None) -> dict[str, dict]:
+        index: LocalIndex = self.collection(collection_name)
+        rows: dict[str, int] = index.rows()
+        objects: dict[str, dict] = {}
+        for uuid in uuids:
+            if (row := rows.get(uuid)) is not None:
+                props: dict = index.properties[row]
+                objects[uuid] = props if properties is None else {p: props[p] for p in properties if p in props}
+        return objects
+
+    def add_objects(self, name: str, ids: list[str], vectors, properties: list[dict], save: bool = True):
+        path: str = self.collection_path(name)
+        if name not in self.collections and not os.path.exists(path):
+            self.collections[name] = LocalIndex([], np.zeros((0, 0), dtype=np.float32), [])
+        index: LocalIndex = self.collection(name)
+        index.add(ids, vectors, properties)
+        if save:
+            index.save(path)
+
+    async def list_collections(self) -> list[str]:
+        on_disk: list[str] = os.listdir(self.path) if os.path.isdir(self.path) else []
+        return sorted(set(on_disk) | set(self.collections))
+
+    async def get_collection(self, name: str) -> Any:
+        index: LocalIndex = self.collection(name)
+        return {
+            'name': name,
+            'vdb_type': self.vdb_type,
+            'count': len(index),
+            'dim': index.vectors.shape[1] if len(index) else None,
+            'ivf_lists': len(index.ivf[1]) if index.ivf is not None else None,
+            'embed_model': settings.embed_model,
+        }
+
+    async def count(self, name: str) -> int:
+        return len(self.collection(name))
+
+    async def delete_collection(self, name: str):
+        path: str = self.collection_path(name)
+        self.collections.pop(name, None)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def export_weaviate(collection_name: str, path: str = None):
+    """ Copy weaviate collection (objects with vectors) into local vdb """
+    path = settings.local_vdb_path if path is None else path
+    wc = init_weaviate()
+    try:
+        ids, vectors, properties = [], [], []
+        for obj in wc.collections.get(collection_name).iterator(include_vector=True):
+            ids.append(str(obj.uuid))
+            vectors.append(obj.vector['default'])
+            properties.append(obj.properties)
+        index = LocalIndex([], np.zeros((0, 0), dtype=np.float32), [])
+        index.add(ids, np.array(vectors), properties)
+        index.save(os.path.join(path, collection_name))
+        logger.info(f"Exported {len(ids)} objects: {collection_name} -> {path}")
+    finally:
+        wc.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'export':
+        print(__doc__)
+        sys.exit(1)
+    export_weaviate(sys.argv[2])
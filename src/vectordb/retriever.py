@@ -0,0 +1,112 @@
+from contextlib import nullcontext
+
+from src.core.cache import RetrievalCache
+from src.core.log import logger
+from src.core.settings import settings
+from src.core.tracing import current_span, traced
+from src.core.util import CatState, measure_latency_async
+from src.vectordb.base import Doc, Retriever
+from src.vectordb.local_vdb import LocalRetriever
+from src.vectordb.weaviate_vdb import WeaviateRetriever, init_weaviate, init_weaviate_async
+
+
+@measure_latency_async(stage='vdb')
+@traced('vdb')
+async def query_docs(
+        query_id: str,
+        query_text: str,
+        cat_state: CatState,
+        collection_name: str = None,
+        k: int = None,
+        filters: dict = None,
+        mode: str = None,
+        content: bool = True,
+) -> list[Doc]:
+    """
+    Retrieve docs with configured vector store (settings.vdb_type)
+    and search mode (settings.vdb_search_mode, unless given).
+    Collection name is resolved as an alias on every call.
+    Docs are cached by collection version (cat_state.retrieval_cache)
+
+    Raises:
+        DependencyUnavailable: vector store circuit breaker is open (cache miss only)
+
+    Args:
+        content: Docs with contents: one search with all properties (cached docs: content store).
+                 False: light properties only with settings.vdb_lazy_content,
+                 content is fetched later for the docs that are used (fetch_content)
+    Returns:
+        (docs, vdb_latency)
+    """
+    logger.info(msg := f"VectorDB retrieving: {query_id} ...")
+    k = settings.weaviate_doc_limit if k is None else k
+    collection_name = cat_state.aliases.resolve(
+        settings.weaviate_collection if collection_name is None else collection_name
+    )
+    cache: RetrievalCache | None = cat_state.retrieval_cache
+    docs: list[Doc] | None = None
+    if cache is not None:
+        key: str = await cache.key(collection_name, query_text, k, filters, mode)
+        if (docs := await cache.get(key)) is not None and (span := current_span()) is not None:
+            span.set(cache_hit=True)
+    if docs is None:
+        # Cached docs are served above whatever the vector store health, a search fails fast if it is down
+        async with cat_state.health.guard('vdb') if cat_state.health is not None else nullcontext():
+            docs = await cat_state.retriever.search(
+                query_text, k=k, filters=filters, collection_name=collection_name, mode=mode,
+                properties=settings.vdb_light_properties if settings.vdb_lazy_content and not content else None,
+            )
+        if cache is not None:
+            await cache.set(key, docs)
+        if len(docs) == 0:
+            logger.warning(f"VectorDB docs retrieved: {query_id}: {len(docs)}")
+    for doc in docs:
+        doc.collection = collection_name
+    if content:
+        await cat_state.content_store.fill(docs, cat_state.retriever)
+    logger.info(f"{msg} done")
+    return docs
+
+
+@measure_latency_async(stage='content')
+@traced('vdb.content')
+async def fetch_content(query_id: str, docs: list[Doc], cat_state: CatState) -> list[Doc]:
+    """
+    Content of docs retrieved without it (query_docs(content=False)): content store, then one vector store
+    call per collection for the rest
+
+    Returns:
+        (docs, latency)
+    """
+    logger.info(msg := f"VectorDB fetching content: {query_id} ...")
+    await cat_state.content_store.fill(docs, cat_state.retriever)
+    logger.info(f"{msg} done")
+    return docs
+
+
+async def invalidate_retrieval(cat_state: CatState, collection_name: str, publish: bool = True):
+    """
+    Collection was written, deleted, or an alias points to it: cached docs and contents of it are stale
+
+    Args:
+        publish: Announce to the other workers (cat_state.cluster). False: event of another worker,
+                 the collection version is already bumped if the cache store is shared
+    """
+    if cat_state.retrieval_cache is not None and (publish or settings.cache_backend == 'memory'):
+        await cat_state.retrieval_cache.bump(collection_name)
+    if cat_state.content_store is not None:
+        cat_state.content_store.invalidate()
+    if publish and cat_state.cluster is not None:
+        await cat_state.cluster.publish('invalidate', collection=collection_name)
+
+
+async def init_retriever(cat_state: CatState) -> Retriever:
+    """ Vector store by settings.vdb_type: weaviate | local """
+    if settings.vdb_type == 'weaviate':
+        cat_state.wc = init_weaviate()
+        if settings.exec_mode == 'async':
+            cat_state.wca = await init_weaviate_async()
+        return WeaviateRetriever(cat_state)
+    if settings.vdb_type == 'local':
+        return LocalRetriever(cat_state)
+    raise ValueError(f"Unknown vdb_type: {settings.vdb_type}")
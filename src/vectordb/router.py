@@ -1,11 +1,16 @@
-from fastapi import APIRouter
+from datetime import datetime
+
+from dataclasses import asdict
+
+from fastapi import APIRouter, HTTPException, Query
 from starlette.requests import Request
-from weaviate import WeaviateClient
 
 from src.core.log import logger
 from src.core.settings import settings
 from src.core.util import CatState
-from src.vectordb.weaviate_vdb import retrieve_docs
+from src.vectordb.alias import AliasEntry
+from src.vectordb.base import Retriever, SearchMode, make_filters
+from src.vectordb.retriever import invalidate_retrieval, query_docs
 
 router = APIRouter()
 
@@ -15,14 +20,13 @@ router = APIRouter()
     "/vdb/collections",
     tags=['vdb'],
     summary="List collections",
-    description="Weaviate. List collection names",
+    description="Vector DB. List collection names",
 )
 async def get_collections(
         request: Request,
 ):
-    wc: WeaviateClient = request.app.state.cat.wc
-    result: dict = wc.collections.list_all()
-    result: list = [k for k in result]
+    retriever: Retriever = request.app.state.cat.retriever
+    result: list = await retriever.list_collections()
     return result
 
 
@@ -31,15 +35,14 @@ async def get_collections(
     "/vdb/collections/{name}",
     tags=['vdb'],
     summary="Get collection by name",
-    description="Weaviate. Get collection config by name",
+    description="Vector DB. Get collection config by name",
 )
 async def get_collections(
         request: Request,
         name: str,
 ):
-    wc: WeaviateClient = request.app.state.cat.wc
-    coll = wc.collections.get(name)
-    result = coll.config.get(simple=False)
+    retriever: Retriever = request.app.state.cat.retriever
+    result = await retriever.get_collection(name)
     return result
 
 
@@ -48,13 +51,16 @@ async def get_collections(
     "/vdb/collections_full",
     tags=['vdb'],
     summary="List collections",
-    description="Weaviate. List collections with full config",
+    description="Vector DB. List collections with full config",
 )
 async def get_collections_full(
         request: Request,
 ):
-    wc: WeaviateClient = request.app.state.cat.wc
-    result = wc.collections.list_all()
+    retriever: Retriever = request.app.state.cat.retriever
+    result: dict = {
+        name: await retriever.get_collection(name)
+        for name in await retriever.list_collections()
+    }
     return result
 
 
@@ -63,15 +69,14 @@ async def get_collections_full(
     "/vdb/collections/{name}/count",
     tags=['vdb'],
     summary="Count documents",
-    description="Weaviate. Count documents in collection",
+    description="Vector DB. Count documents in collection",
 )
 async def get_collection_count(
         request: Request,
         name: str,
 ):
-    wc: WeaviateClient = request.app.state.cat.wc
-    coll = wc.collections.get(name)
-    result = coll.aggregate.over_all(total_count=True)
+    retriever: Retriever = request.app.state.cat.retriever
+    result: dict = {'total_count': await retriever.count(name)}
     return result
 
 
@@ -81,39 +86,112 @@ async def get_collection_count(
     tags=['vdb'],
     summary="Get documents",
     description=f"""
-        Weaviate. Retrieve documents by query from collection
+        Vector DB. Retrieve documents by query from collection
         
         - Default collection: {settings.weaviate_collection}
+        - Default search mode: settings.vdb_search_mode
+        - Filters: site_name, type, updated_at range (updated_from, updated_to)
+        - content=false: light properties only (settings.vdb_light_properties), no content
     """,
 )
 async def get_docs(
         request: Request,
         query_text: str,
         collection_name: str = None,
+        mode: SearchMode = None,
+        limit: int = Query(None, ge=1),
+        site_name: str = None,
+        doc_type: str = Query(None, alias="type"),
+        updated_from: datetime = None,
+        updated_to: datetime = None,
+        content: bool = True,
 ):
     cat_state: CatState = request.app.state.cat
-    collection_name = settings.weaviate_collection if collection_name is None else collection_name
-    docs, vdb_latency = retrieve_docs('0', query_text, cat_state, collection_name)
+    filters: dict | None = make_filters(site_name, doc_type, updated_from, updated_to)
+    docs, vdb_latency = await query_docs(
+        '0', query_text, cat_state, collection_name, k=limit, filters=filters, mode=mode, content=content,
+    )
     return docs
 
 
+@logger.catch
+@router.get(
+    "/vdb/embeddings",
+    tags=['vdb'],
+    summary="Query embedding stats",
+    description="Query embeddings: /api/embed calls, batch size, cache hit rate (memory, disk)",
+)
+async def get_embeddings(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return cat_state.embedder.stats()
+
+
+@logger.catch
+@router.get(
+    "/vdb/cache",
+    tags=['vdb'],
+    summary="Retrieval cache stats",
+    description="""
+        Retrieval cache: hits, misses, invalidations (collection version bumps), backend errors.
+        Content store (lazy content): hit rate, vector store fetches, fetched docs and characters
+    """,
+)
+async def get_retrieval_cache(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    retrieval: dict = {'enabled': False}
+    if cat_state.retrieval_cache is not None:
+        retrieval = {'enabled': True, **cat_state.retrieval_cache.stats()}
+    return {'retrieval': retrieval, 'content': cat_state.content_store.stats()}
+
+
+@logger.catch
+@router.delete(
+    "/vdb/cache",
+    tags=['vdb'],
+    summary="Clear retrieval cache",
+    description="Drop all cached docs and collection versions (shared backend: for all workers)",
+)
+async def clear_retrieval_cache(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    if cat_state.retrieval_cache is None:
+        raise HTTPException(status_code=409, detail="Retrieval cache is off")
+    return {'result': 'success', 'dropped': await cat_state.retrieval_cache.clear()}
+
+
 @logger.catch
 @router.delete(
     "/vdb/collections/{name}",
     tags=['vdb'],
     summary="Delete collection",
     description=f"""
-        Weaviate. Delete collection by name
+        Vector DB. Delete collection by name
         
         - Default collection: {settings.weaviate_collection}
+        - Active or previous (rollback) collection of an alias: 409
     """,
 )
 async def delete_collection(
         request: Request,
         collection_name: str,
 ):
-    wc: WeaviateClient = request.app.state.cat.wc
-    wc.collections.delete(collection_name)
+    retriever: Retriever = request.app.state.cat.retriever
+    for entry in request.app.state.cat.aliases.aliases.values():
+        if entry.collection.lower() == collection_name.lower():
+            raise HTTPException(status_code=409, detail=f"Collection is active for alias: {entry.alias}")
+        if entry.previous is not None and entry.previous.lower() == collection_name.lower():
+            raise HTTPException(status_code=409, detail=f"Collection is the rollback target of alias: {entry.alias}")
+    try:
+        await retriever.delete_collection(collection_name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    request.app.state.cat.answer_cache.clear()
+    await invalidate_retrieval(request.app.state.cat, collection_name)
     return {'result': 'success'}
 
 
@@ -122,22 +200,64 @@ async def delete_collection(
     "/vdb/collections/{name}",
     tags=['vdb'],
     summary="Change collection",
-    description="Weaviate. Change active collection",
+    description=f"""
+        Vector DB. Change active collection: point alias settings.weaviate_collection ({settings.weaviate_collection})
+        to the collection, immediately (no warm-up, no validation: see POST /admin/reindex)
+    """,
 )
 async def set_collection(
         request: Request,
         collection_name: str,
 ):
     logger.info(msg := f"Setting active collection: {collection_name} ...")
-    previous_collection: str = settings.weaviate_collection
-    settings.weaviate_collection = collection_name
+    cat_state: CatState = request.app.state.cat
+    entry: AliasEntry = await cat_state.aliases.flip(settings.weaviate_collection, collection_name)
+    cat_state.answer_cache.clear()     # Cached answers are for old collection
+    await invalidate_retrieval(cat_state, entry.collection)
 
     result: dict = {
-        'settings.weaviate_collection': settings.weaviate_collection,
-        'previous_collection': previous_collection,
+        'alias': entry.alias,
+        'collection': entry.collection,
+        'previous_collection': entry.previous,
+        'settings.vdb_type': settings.vdb_type,
         'settings.weaviate_host': settings.weaviate_host,
         'settings.weaviate_port': settings.weaviate_port,
         'settings.weaviate_grpc_port': settings.weaviate_grpc_port,
     }
     logger.info(f"{msg} done")
     return result
+
+
+@logger.catch
+@router.get(
+    "/vdb/aliases",
+    tags=['vdb'],
+    summary="List aliases",
+    description="Vector DB. Collection aliases: alias -> active collection, previous collection (rollback)",
+)
+async def get_aliases(
+        request: Request,
+):
+    cat_state: CatState = request.app.state.cat
+    return [asdict(entry) for entry in cat_state.aliases.aliases.values()]
+
+
+@logger.catch
+@router.post(
+    "/vdb/aliases/{alias}/rollback",
+    tags=['vdb'],
+    summary="Roll back alias",
+    description="Vector DB. Point alias back to its previous collection",
+)
+async def rollback_alias(
+        request: Request,
+        alias: str,
+):
+    cat_state: CatState = request.app.state.cat
+    try:
+        entry: AliasEntry = await cat_state.aliases.rollback(alias)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    cat_state.answer_cache.clear()     # Cached answers are for the rolled back collection
+    await invalidate_retrieval(cat_state, entry.collection)
+    return asdict(entry)
@@ -1,16 +1,21 @@
+from typing import Any
+
 from weaviate import WeaviateClient, WeaviateAsyncClient
 from weaviate import connect_to_local as weaviate_connect_to_local
 from weaviate.auth import AuthApiKey
 from weaviate.classes.init import Auth
-from weaviate.classes.query import MetadataQuery
+from weaviate.classes.query import MetadataQuery, Filter
 from weaviate.collections.classes.internal import QueryReturn
+from weaviate.collections.collection.async_ import CollectionAsync as AsyncCollection
 from weaviate.collections.collection.sync import Collection as SyncCollection
 from weaviate.config import AdditionalConfig
 from weaviate.connect import ConnectionParams
 
 from src.core.log import logger
 from src.core.settings import settings
-from src.core.util import measure_latency_async, CatState, measure_latency
+from src.core.tracing import current_span, span, traced
+from src.core.util import CatState, run_in_pool
+from src.vectordb.base import Doc, Range, Retriever, SearchMode
 
 
 def init_weaviate() -> WeaviateClient:
@@ -18,6 +23,7 @@ def init_weaviate() -> WeaviateClient:
     client: WeaviateClient = weaviate_connect_to_local(
         host=settings.weaviate_host,  # Use a string to specify the host
         port=settings.weaviate_port,
+        grpc_port=settings.weaviate_grpc_port,
         auth_credentials=Auth.api_key(settings.weaviate_api_key),
         # additional_headers={"X-Ollama-Api-Key": "ollama"}
         skip_init_checks=True,
@@ -48,59 +54,214 @@ async def init_weaviate_async() -> WeaviateAsyncClient:
         skip_init_checks=True,  # What's this???
     )
     await client.connect()
-    # if not client.is_ready():
-    #     logger.error(msg := f"Weaviate client initialization failed")
-    #     raise AssertionError(msg)
+    if not await client.is_ready():
+        logger.error(msg := f"Weaviate async client initialization failed")
+        raise AssertionError(msg)
     return client
 
 
-@measure_latency
+def to_docs(result: QueryReturn) -> list[Doc]:
+    return [
+        Doc(uuid=str(obj.uuid), distance=obj.metadata.distance, properties=obj.properties)
+        for obj in result.objects
+    ]
+
+
+def property_filters(name: str, value: Any) -> list:
+    if isinstance(value, Range):
+        conditions: list = []
+        if value.gte is not None:
+            conditions.append(Filter.by_property(name).greater_or_equal(value.gte))
+        if value.lte is not None:
+            conditions.append(Filter.by_property(name).less_or_equal(value.lte))
+        return conditions
+    if isinstance(value, (list, tuple)):
+        return [Filter.by_property(name).contains_any(list(value))]
+    return [Filter.by_property(name).equal(value)]
+
+
+def make_filter(filters: dict = None):
+    """ {property: value | [values] | Range} -> weaviate filter: all must match """
+    if not filters:
+        return None
+    conditions: list = [c for k, v in filters.items() for c in property_filters(k, v)]
+    return Filter.all_of(conditions) if len(conditions) > 1 else conditions[0]
+
+
+def search_kwargs(
+        query_text: str,
+        vector: list[float] | None,
+        mode: SearchMode,
+        limit: int,
+        filters: dict,
+        properties: list[str] = None,
+) -> dict:
+    """ Arguments of collection.query.<mode> """
+    kwargs: dict = {'limit': limit, 'filters': make_filter(filters)}
+    if properties is not None:
+        kwargs['return_properties'] = properties
+    if mode == SearchMode.near_text:
+        kwargs.update(query=query_text, return_metadata=MetadataQuery(distance=True))
+    elif mode == SearchMode.near_vector:
+        kwargs.update(near_vector=vector, return_metadata=MetadataQuery(distance=True))
+    elif mode == SearchMode.bm25:
+        kwargs.update(query=query_text, return_metadata=MetadataQuery(score=True))
+    elif mode == SearchMode.hybrid:
+        kwargs.update(
+            query=query_text, alpha=settings.vdb_hybrid_alpha,
+            return_metadata=MetadataQuery(score=True, distance=True),
+        )
+    return kwargs
+
+
+def set_query_attributes(collection_name: str, mode: SearchMode, limit: int, result: QueryReturn):
+    """ Trace span attributes. near_text/hybrid: the span includes weaviate's own query embedding """
+    if (current := current_span()) is not None:
+        current.set(collection=collection_name, mode=mode.value, limit=limit, docs=len(result.objects))
+
+
+@traced('weaviate.query')
 def retrieve_docs(
-        query_id: str,
         query_text: str,
         cat_state: CatState,
-        collection_name: str = settings.weaviate_collection,
-) -> QueryReturn:
-    logger.info(msg := f"VectorDB retrieving: {query_id} ...")
+        collection_name: str,
+        limit: int,
+        filters: dict = None,
+        mode: SearchMode = SearchMode.near_text,
+        vector: list[float] = None,
+        properties: list[str] = None,
+) -> list[Doc]:
+    """
+    Search collection with weaviate client
 
+    Args:
+        mode:       near_text (weaviate vectorizer), near_vector (vector), bm25, hybrid
+        vector:     Query embedding for near_vector
+        properties: Properties to return. None: all
+    """
     wc: WeaviateClient = cat_state.wc
     coll: SyncCollection = wc.collections.get(collection_name)
-    result: QueryReturn = coll.query.near_text(
-        query=query_text,
-        limit=settings.weaviate_doc_limit,
-        return_metadata=MetadataQuery(distance=True),
+    kwargs: dict = search_kwargs(query_text, vector, mode, limit, filters, properties)
+    result: QueryReturn = getattr(coll.query, mode.value)(**kwargs)
+    set_query_attributes(collection_name, mode, limit, result)
+    return to_docs(result)
+
+
+@traced('weaviate.query')
+async def retrieve_docs_async(
+        query_text: str,
+        cat_state: CatState,
+        collection_name: str,
+        limit: int,
+        filters: dict = None,
+        mode: SearchMode = SearchMode.near_text,
+        vector: list[float] = None,
+        properties: list[str] = None,
+) -> list[Doc]:
+    """
+    Same as retrieve_docs, but with async weaviate client. Doesn't block event loop
+    """
+    wc: WeaviateAsyncClient = cat_state.wca
+    coll: AsyncCollection = wc.collections.get(collection_name)
+    kwargs: dict = search_kwargs(query_text, vector, mode, limit, filters, properties)
+    result: QueryReturn = await getattr(coll.query, mode.value)(**kwargs)
+    set_query_attributes(collection_name, mode, limit, result)
+    return to_docs(result)
+
+
+@traced('weaviate.fetch')
+def fetch_objects(
+        cat_state: CatState, collection_name: str, uuids: list[str], properties: list[str] = None,
+) -> dict[str, dict]:
+    """ Objects by uuid: uuid -> properties """
+    coll: SyncCollection = cat_state.wc.collections.get(collection_name)
+    result: QueryReturn = coll.query.fetch_objects_by_ids(uuids, limit=len(uuids), return_properties=properties)
+    return {str(obj.uuid): obj.properties for obj in result.objects}
+
+
+@traced('weaviate.fetch')
+async def fetch_objects_async(
+        cat_state: CatState, collection_name: str, uuids: list[str], properties: list[str] = None,
+) -> dict[str, dict]:
+    """ Same as fetch_objects, with async weaviate client """
+    coll: AsyncCollection = cat_state.wca.collections.get(collection_name)
+    result: QueryReturn = await coll.query.fetch_objects_by_ids(
+        uuids, limit=len(uuids), return_properties=properties,
     )
+    return {str(obj.uuid): obj.properties for obj in result.objects}
 
-    if len(result.objects) == 0:
-        logger.warning(f"VectorDB docs retrieved: {query_id}: {len(result.objects)}")
-    logger.info(f"{msg} done")
-    return result
 
+class WeaviateRetriever(Retriever):
+    """
+    Weaviate vector store. Query is embedded by weaviate vectorizer (near_text, hybrid)
+    or with settings.embed_model (near_vector). Must be the model of the collection vectorizer
 
-@measure_latency_async
-async def retrieve_docs_async(
-        query_id: str, query_text: str, cat_state: CatState
-) -> list[dict]:
-    logger.info(msg := f"VectorDB retrieving: {query_id} ...")
-
-    wc: WeaviateAsyncClient = cat_state.wc
-
-    coll = wc.collections.get(settings.vdb_type)
-    # result = await coll.query.near_text(
-    #     query=query_text,
-    #     limit=settings.vdb_doc_limit,
-    #     return_metadata=MetadataQuery(distance=True),
-    # )
-    # result = await wc.client.get(
-    #     class_name=settings.vdb_name,
-    #     properties=["context", 'name'],
-    # ).with_near_text(
-    #     near_text=NearText(
-    #         concepts=[query_text],
-    #         distance=0.7
-    #     ),
-    # ).with_limit(settings.vdb_doc_limit).do()
-
-    logger.info(f"{msg} done")
-    return result
+    - exec_mode async: async weaviate client
+    - exec_mode sync:  sync weaviate client in the bounded thread pool
+    """
+    vdb_type: str = 'weaviate'
+
+    def __init__(self, cat_state: CatState):
+        self.cat_state: CatState = cat_state
+
+    async def search(
+            self,
+            query_text: str,
+            k: int,
+            filters: dict = None,
+            collection_name: str = None,
+            mode: str = None,
+            properties: list[str] = None,
+    ) -> list[Doc]:
+        collection_name = settings.weaviate_collection if collection_name is None else collection_name
+        mode = SearchMode(settings.vdb_search_mode if mode is None else mode)
+        vector: list[float] | None = None
+        if mode == SearchMode.near_vector:
+            with span('embed_query'):
+                vector = await self.cat_state.embedder.embed_query(query_text)
+        if settings.exec_mode == 'sync':
+            return await run_in_pool(
+                self.cat_state, retrieve_docs,
+                query_text, self.cat_state, collection_name, k, filters, mode, vector, properties,
+            )
+        return await retrieve_docs_async(
+            query_text, self.cat_state, collection_name, k, filters, mode, vector, properties,
+        )
+
+    async def fetch(self, collection_name: str, uuids: list[str], properties: list[str] = None) -> dict[str, dict]:
+        if settings.exec_mode == 'sync':
+            return await run_in_pool(self.cat_state, fetch_objects, self.cat_state, collection_name, uuids, properties)
+        return await fetch_objects_async(self.cat_state, collection_name, uuids, properties)
+
+    async def list_collections(self) -> list[str]:
+        if settings.exec_mode == 'sync':
+            return list(await run_in_pool(self.cat_state, self.cat_state.wc.collections.list_all))
+        return list(await self.cat_state.wca.collections.list_all())
+
+    async def get_collection(self, name: str) -> Any:
+        if settings.exec_mode == 'sync':
+            return await run_in_pool(self.cat_state, self.cat_state.wc.collections.get(name).config.get, simple=False)
+        return await self.cat_state.wca.collections.get(name).config.get(simple=False)
+
+    async def count(self, name: str) -> int:
+        if settings.exec_mode == 'sync':
+            coll: SyncCollection = self.cat_state.wc.collections.get(name)
+            return (await run_in_pool(self.cat_state, coll.aggregate.over_all, total_count=True)).total_count
+        coll: AsyncCollection = self.cat_state.wca.collections.get(name)
+        return (await coll.aggregate.over_all(total_count=True)).total_count
+
+    async def delete_collection(self, name: str):
+        if settings.exec_mode == 'sync':
+            await run_in_pool(self.cat_state, self.cat_state.wc.collections.delete, name)
+            return
+        await self.cat_state.wca.collections.delete(name)
+
+    async def is_ready(self) -> bool:
+        if self.cat_state.wca is not None:
+            return await self.cat_state.wca.is_ready()
+        return await run_in_pool(self.cat_state, self.cat_state.wc.is_ready)
 
+    async def close(self):
+        if self.cat_state.wca is not None:
+            await self.cat_state.wca.close()
+        self.cat_state.wc.close()
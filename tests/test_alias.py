@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from src.vectordb.alias import AliasEntry, CollectionAliases
+
+
+class Pool:
+    """ asyncpg pool stand-in: alias rows in memory """
+
+    def __init__(self, rows: list[dict] = ()):
+        self.down: bool = False
+        self.rows: list[dict] = list(rows)
+        self.executed: list[tuple] = []
+
+    async def fetch(self, sql: str) -> list[dict]:
+        return self.rows
+
+    async def execute(self, sql: str, *args):
+        if self.down:
+            raise ConnectionError("db is down")
+        self.executed.append(args)
+
+
+def test_load_and_resolve():
+    async def main():
+        aliases: CollectionAliases = CollectionAliases(Pool([
+            {'alias': 'catsearch', 'collection': 'catsearch_v2', 'previous': 'catsearch_v1', 'updated_at': None},
+        ]))
+        await aliases.load()
+        assert aliases.resolve('catsearch') == 'catsearch_v2'
+        assert aliases.resolve('other') == 'other'      # No alias: collection name itself
+
+    asyncio.run(main())
+
+
+def test_flip_persists_and_keeps_previous():
+    async def main():
+        pool: Pool = Pool()
+        aliases: CollectionAliases = CollectionAliases(pool)
+        first: AliasEntry = await aliases.flip('catsearch', 'catsearch_v1')
+        assert first.previous == 'catsearch'
+        entry: AliasEntry = await aliases.flip('catsearch', 'catsearch_v2')
+        assert aliases.resolve('catsearch') == 'catsearch_v2'
+        assert entry.previous == 'catsearch_v1'
+        assert isinstance(entry.updated_at, datetime) and entry.updated_at.tzinfo is None
+        assert pool.executed[-1] == ('catsearch', 'catsearch_v2', 'catsearch_v1', entry.updated_at)
+
+    asyncio.run(main())
+
+
+def test_flip_is_not_applied_when_db_is_down():
+    async def main():
+        pool: Pool = Pool()
+        aliases: CollectionAliases = CollectionAliases(pool)
+        await aliases.flip('catsearch', 'catsearch_v1')
+        pool.down = True
+        with pytest.raises(ConnectionError):
+            await aliases.flip('catsearch', 'catsearch_v2')
+        assert aliases.resolve('catsearch') == 'catsearch_v1'
+
+    asyncio.run(main())
+
+
+def test_rollback():
+    async def main():
+        aliases: CollectionAliases = CollectionAliases(Pool())
+        await aliases.flip('catsearch', 'catsearch_v1')
+        await aliases.flip('catsearch', 'catsearch_v2')
+        entry: AliasEntry = await aliases.rollback('catsearch')
+        assert aliases.resolve('catsearch') == 'catsearch_v1'
+        assert entry.previous == 'catsearch_v2'             # Rollback of the rollback goes forward again
+
+    asyncio.run(main())
+
+
+def test_rollback_without_previous():
+    async def main():
+        aliases: CollectionAliases = CollectionAliases(Pool([
+            {'alias': 'same', 'collection': 'c', 'previous': 'c', 'updated_at': None},
+        ]))
+        await aliases.load()
+        with pytest.raises(ValueError):
+            await aliases.rollback('unknown')
+        with pytest.raises(ValueError):
+            await aliases.rollback('same')
+
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from src.core.settings import settings
+from src.llm.backends import Backend, LLMBackends, rendezvous
+from src.llm.scheduler import LLMOverloaded
+
+URLS: list[str] = [f"http://ollama{i}:11434" for i in range(4)]
+
+
+def pool(max_concurrency: int = 2, **kwargs) -> LLMBackends:
+    return LLMBackends(URLS, max_concurrency, lambda url, model: (url, model), **kwargs)
+
+
+def test_rendezvous_ranking_is_stable():
+    backends: LLMBackends = pool()
+    ranked: list[str] = [b.url for b in backends.hosts('qwen')]
+    assert ranked == sorted(URLS, key=lambda url: rendezvous('qwen', url), reverse=True)
+    again: LLMBackends = LLMBackends(list(reversed(URLS)), 2, lambda url, model: None)
+    assert [b.url for b in again.hosts('qwen')] == ranked          # Same hosts in every worker process
+
+
+def test_affinity_hosts_and_unhealthy_replacement():
+    backends: LLMBackends = pool(affinity_hosts=2)
+    first, second, third, _ = pool().hosts('qwen')
+    assert [b.url for b in backends.hosts('qwen')] == [first.url, second.url]
+    next(b for b in backends.backends if b.url == first.url).healthy = False
+    assert [b.url for b in backends.hosts('qwen')] == [second.url, third.url]
+    for b in backends.backends:
+        b.healthy = False
+    assert len(backends.hosts('qwen')) == 4                         # All unhealthy: all of them
+
+
+def test_model_hosts():
+    backends: LLMBackends = pool(affinity_hosts=1, model_hosts={'qwen': [URLS[3] + '/', URLS[1]]})
+    assert sorted(b.url for b in backends.hosts('qwen')) == [URLS[1], URLS[3]]
+
+
+def test_pick_least_outstanding():
+    backends: LLMBackends = pool(affinity_hosts=2)
+    first, second = backends.hosts('qwen')
+    assert backends.pick('qwen') is first                           # Ties: affinity order
+    first.in_flight = 1
+    assert backends.pick('qwen') is second
+    second.in_flight = first.in_flight = 2
+    assert backends.pick('qwen') is None
+    third: Backend = backends.pick('qwen', exclude=[first])        # Failover: next ranked host replaces it
+    assert third not in (first, second)
+
+
+def test_pick_latency_aware():
+    backends: LLMBackends = pool(affinity_hosts=2, balance='latency')
+    first, second = backends.hosts('qwen')
+    first.latency_ewma, second.latency_ewma = 4.0, 1.0
+    second.in_flight = 1
+    assert backends.pick('qwen') is second                          # 2 x 1s < 1 x 4s
+
+
+def test_unknown_balance():
+    with pytest.raises(ValueError):
+        pool(balance='random')
+
+
+def test_release_tracks_errors_and_latency(monkeypatch):
+    monkeypatch.setattr(settings, 'llm_unhealthy_errors', 2)
+    backend: Backend = Backend(URLS[0], 2, lambda url, model: None)
+    backend.in_flight = 5
+    backend.release(1.0)
+    backend.release(3.0)
+    assert backend.latency_ewma == pytest.approx(1.4)
+    backend.release(None)                                           # Cancelled: not counted
+    assert backend.requests == 2
+    backend.release(0.5, failed=True)
+    assert backend.healthy
+    backend.release(0.5, failed=True)
+    assert not backend.healthy
+    assert backend.errors == 2
+    assert backend.in_flight == 0
+
+
+def test_acquire_waits_for_release(monkeypatch):
+    monkeypatch.setattr(settings, 'llm_queue_timeout', 5.0)
+
+    async def main():
+        backends: LLMBackends = pool(max_concurrency=1, affinity_hosts=1)
+        backend: Backend = await backends.acquire('qwen')
+        waiter: asyncio.Task = asyncio.create_task(backends.acquire('qwen'))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        backends.release(backend, 0.1)
+        assert await asyncio.wait_for(waiter, 1) is backend
+        assert backend.in_flight == 1
+        assert backends.waits == 1
+
+    asyncio.run(main())
+
+
+def test_acquire_timeout_and_no_backend_left(monkeypatch):
+    monkeypatch.setattr(settings, 'llm_queue_timeout', 0.05)
+
+    async def main():
+        backends: LLMBackends = pool(max_concurrency=1, affinity_hosts=1)
+        backend: Backend = await backends.acquire('qwen')
+        with pytest.raises(LLMOverloaded) as e:
+            await backends.acquire('qwen')
+        assert e.value.status_code == 503
+        assert not backends._waiters
+        failover: Backend = await backends.acquire('qwen', exclude=[backend])     # Next ranked host
+        assert failover is not backend
+        with pytest.raises(LLMOverloaded):
+            await backends.acquire('qwen', exclude=backends.backends)
+
+    asyncio.run(main())
+
+
+def test_client_per_model():
+    backend: Backend = Backend(URLS[0] + '/', 1, lambda url, model: (url, model))
+    assert backend.client('qwen') == (URLS[0], 'qwen')
+    assert backend.client('qwen') is backend.client('qwen')
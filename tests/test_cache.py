@@ -0,0 +1,96 @@
+import pytest
+
+import src.core.cache as cache
+from src.core.cache import AnswerCache, TTLCache, answer_key, config_key
+
+
+class Clock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock: Clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_ttl_expiry(clock: Clock):
+    c: TTLCache = TTLCache(max_size=10, ttl=60)
+    c.set('a', 1)
+    clock.now += 59
+    assert c.get('a') == 1
+    clock.now += 1
+    assert c.get('a') is None
+    assert 'a' not in c
+    assert (c.hits, c.misses) == (1, 1)
+
+
+def test_lru_eviction(clock: Clock):
+    c: TTLCache = TTLCache(max_size=2, ttl=60)
+    c.set('a', 1)
+    c.set('b', 2)
+    c.get('a')                  # b is the least recently used now
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1 and c.get('c') == 3
+    assert c.evictions == 1
+
+
+def test_set_renews_ttl(clock: Clock):
+    c: TTLCache = TTLCache(max_size=2, ttl=60)
+    c.set('a', 1)
+    clock.now += 50
+    c.set('a', 2)
+    clock.now += 50
+    assert c.get('a') == 2
+
+
+def test_semantic_hit_within_distance(clock: Clock):
+    c: AnswerCache = AnswerCache(max_size=10, ttl=60, semantic_distance=0.1)
+    c.set('k1', 'answer', 'config', [1.0, 0.0])
+    assert c.get_similar('config', [0.99, 0.1]) == 'answer'         # cosine distance ~0.005
+    assert c.get_similar('config', [0.0, 1.0]) is None              # distance 1
+    assert (c.semantic_hits, c.semantic_misses) == (1, 1)
+
+
+def test_semantic_needs_same_config(clock: Clock):
+    c: AnswerCache = AnswerCache(max_size=10, ttl=60, semantic_distance=0.1)
+    c.set('k1', 'answer', 'config-blue', [1.0, 0.0])
+    assert c.get_similar('config-green', [1.0, 0.0]) is None
+
+
+def test_semantic_drops_expired_answers(clock: Clock):
+    c: AnswerCache = AnswerCache(max_size=10, ttl=60, semantic_distance=0.1)
+    c.set('k1', 'answer', 'config', [1.0, 0.0])
+    clock.now += 60
+    assert c.get_similar('config', [1.0, 0.0]) is None
+    assert c.stats()['semantic_size'] == 0
+
+
+def test_semantic_drops_evicted_answers(clock: Clock):
+    c: AnswerCache = AnswerCache(max_size=1, ttl=60, semantic_distance=0.1)
+    c.set('k1', 'first', 'config', [1.0, 0.0])
+    c.set('k2', 'second', 'config', [0.0, 1.0])
+    assert c.get_similar('config', [1.0, 0.0]) is None
+    assert c.get_similar('config', [0.0, 1.0]) == 'second'
+
+
+def test_clear(clock: Clock):
+    c: AnswerCache = AnswerCache(max_size=10, ttl=60, semantic_distance=0.1)
+    c.set('k1', 'answer', 'config', [1.0, 0.0])
+    c.clear()
+    assert c.get('k1') is None
+    assert c.get_similar('config', [1.0, 0.0]) is None
+    assert c.invalidations == 1
+
+
+def test_answer_key_normalises_query():
+    assert answer_key("Где  Лувр?", 'Blue') == answer_key("где лувр", 'Blue')
+    assert answer_key("где лувр", 'Blue') != answer_key("где лувр", 'Green')
+    assert answer_key("где лувр", 'Blue', {'site_name': 'Музеи'}) != answer_key("где лувр", 'Blue')
+    assert config_key('Blue') != config_key('Green')
@@ -0,0 +1,131 @@
+import pytest
+
+from src.core.settings import settings
+from src.llm.context import (
+    MIN_OVERLAP, TokenCounter, allocate, approx_tokens, build_context, dedup_chunks, overlap, trim,
+)
+from src.vectordb.base import Doc
+
+COUNTER: TokenCounter = TokenCounter()     # Approximate counts
+
+SENTENCES: str = " ".join(f"Sentence number {i} is about museum hall {i}." for i in range(200))
+
+
+def doc(content: str, link: str = 'https://ex.org/a.pdf', uuid: str = None) -> Doc:
+    return Doc(uuid=uuid or str(hash(content)), properties={'content': content, 'link': link, 'name': 'a.pdf'})
+
+
+def test_approx_tokens():
+    assert approx_tokens("") == 0
+    assert approx_tokens("a b c") == 3
+    assert approx_tokens("hello, world") == 5       # hello -> 2, ',' -> 1, world -> 2
+
+
+def test_overlap():
+    shared: str = "x" * MIN_OVERLAP + " shared tail"
+    assert overlap("head text " + shared, shared + " and more") == len(shared)
+    assert overlap("head text " + shared, "no common prefix" * 4) == 0
+
+
+def test_overlap_shorter_than_min_is_ignored():
+    short: str = "y" * (MIN_OVERLAP - 1)
+    assert overlap("a" * 40 + short, short + "b" * 40) == 0
+
+
+def test_dedup_drops_contained_chunk():
+    first: Doc = doc(SENTENCES[:500])
+    inside: Doc = doc(SENTENCES[100:300])
+    docs, contents = dedup_chunks([first, inside])
+    assert docs == [first]
+    assert contents == [SENTENCES[:500]]
+
+
+def test_dedup_cuts_overlap_of_lower_ranked_chunk():
+    first: Doc = doc(SENTENCES[:500])
+    second: Doc = doc(SENTENCES[400:900])      # Starts with the last 100 chars of first
+    docs, contents = dedup_chunks([first, second])
+    assert docs == [first, second]
+    assert contents == [SENTENCES[:500], SENTENCES[500:900]]
+
+
+def test_dedup_cuts_overlap_at_the_end_of_lower_ranked_chunk():
+    first: Doc = doc(SENTENCES[400:900])
+    second: Doc = doc(SENTENCES[:500])         # Ends with the first 100 chars of first
+    docs, contents = dedup_chunks([first, second])
+    assert contents == [SENTENCES[400:900], SENTENCES[:400]]
+
+
+def test_dedup_keeps_chunks_of_other_documents():
+    first: Doc = doc(SENTENCES[:500], link='https://ex.org/a.pdf')
+    same_text: Doc = doc(SENTENCES[100:300], link='https://ex.org/b.pdf')
+    no_link: Doc = doc(SENTENCES[100:300], link=None)
+    docs, contents = dedup_chunks([first, same_text, no_link])
+    assert docs == [first, same_text, no_link]
+
+
+def test_allocate_everything_fits():
+    assert allocate([10, 20, 30], [1, 1 / 2, 1 / 3], 100) == [10, 20, 30]
+
+
+def test_allocate_redistributes_unused_share():
+    alloc: list[int] = allocate([10, 1000, 1000], [1, 1, 1], 310)
+    assert alloc[0] == 10                       # Needs less than its share (103)
+    assert alloc[1] == alloc[2] == 150          # The rest is split again
+    assert sum(alloc) <= 310
+
+
+def test_allocate_by_weight():
+    alloc: list[int] = allocate([1000, 1000], [1, 1 / 2], 300)
+    assert alloc == [200, 100]
+
+
+@pytest.mark.parametrize('budget', [0, -5])
+def test_allocate_no_budget(budget: int):
+    assert allocate([10, 20], [1, 1], budget) == [0, 0]
+
+
+def test_allocate_empty():
+    assert allocate([], [], 100) == []
+
+
+def test_trim_short_text_unchanged():
+    assert trim("short text.", 100, COUNTER) == "short text."
+
+
+def test_trim_fits_and_cuts_at_sentence():
+    text: str = trim(SENTENCES, 100, COUNTER)
+    assert COUNTER.count(text) <= 100
+    assert SENTENCES.startswith(text)
+    assert text.endswith('.')
+
+
+def test_build_context_within_budget():
+    docs: list[Doc] = [doc(SENTENCES[i * 2000:(i + 1) * 2000], link=f'https://ex.org/{i}.pdf') for i in range(4)]
+    context = build_context(docs, 600, COUNTER)
+    assert context.tokens <= 600
+    assert context.budget == 600
+    assert context.docs == docs[:len(context.docs)]     # Rank order kept
+    assert context.trimmed > 0
+
+
+def test_build_context_counts_duplicates_as_dropped():
+    first: Doc = doc(SENTENCES[:500])
+    context = build_context([first, doc(SENTENCES[100:300])], 10_000, COUNTER)
+    assert context.docs == [first]
+    assert context.dropped == 1
+    assert context.trimmed == 0
+
+
+def test_build_context_drops_starved_lowest_ranked(monkeypatch):
+    monkeypatch.setattr(settings, 'llm_doc_min_tokens', 150)
+    docs: list[Doc] = [doc(SENTENCES[i * 2000:(i + 1) * 2000], link=f'https://ex.org/{i}.pdf') for i in range(4)]
+    context = build_context(docs, 500, COUNTER)
+    assert context.docs == docs[:len(context.docs)]
+    assert context.dropped == 4 - len(context.docs) > 0
+    assert context.tokens <= 500
+
+
+def test_build_context_no_docs():
+    context = build_context([], 500, COUNTER)
+    assert context.text == ""
+    assert context.docs == []
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from src.vectordb.embedder import Embedder, EmbeddingCache
+
+
+def embedder(embed_func, batch_size: int = 8) -> Embedder:
+    return Embedder(embed_func, EmbeddingCache(max_size=100, ttl=60), batch_size=batch_size, batch_wait=0.01)
+
+
+def test_concurrent_texts_share_one_call():
+    calls: list[list[str]] = []
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    async def main():
+        e: Embedder = embedder(embed)
+        results = await asyncio.gather(e.embed(['a', 'bb']), e.embed(['bb', 'ccc']))
+        assert results == [[[1.0], [2.0]], [[2.0], [3.0]]]
+        assert calls == [['a', 'bb', 'ccc']]            # One batch, identical texts embedded once
+        assert await e.embed(['ccc']) == [[3.0]]        # Cached
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_missing_vectors_fail_the_batch():
+    responses: list[list[list[float]]] = [[[1.0]], [[1.0], [2.0]]]
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        return responses.pop(0)
+
+    async def main():
+        e: Embedder = embedder(embed)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(e.embed(['a', 'b']), 1)
+        assert e.stats()['in_flight'] == 0
+        assert await asyncio.wait_for(e.embed(['a', 'b']), 1) == [[1.0], [2.0]]     # Not stuck on the failed batch
+
+    asyncio.run(main())
+
+
+def test_failed_call_is_not_cached():
+    fail: list[bool] = [True, False]
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        if fail.pop(0):
+            raise ConnectionError("embed endpoint is down")
+        return [[0.5] for _ in texts]
+
+    async def main():
+        e: Embedder = embedder(embed)
+        with pytest.raises(ConnectionError):
+            await e.embed(['a'])
+        assert await e.embed(['a']) == [[0.5]]
+
+    asyncio.run(main())
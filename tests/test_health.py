@@ -0,0 +1,113 @@
+import pytest
+
+import src.core.health as health
+from src.core.health import CircuitBreaker, DependencyUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock: Clock = Clock()
+    monkeypatch.setattr(health.time, 'monotonic', clock)
+    return clock
+
+
+def opened(clock: Clock) -> CircuitBreaker:
+    breaker: CircuitBreaker = CircuitBreaker('llm', failures=3, open_seconds=10)
+    for _ in range(3):
+        breaker.failure()
+    return breaker
+
+
+def test_opens_after_failures_in_a_row(clock: Clock):
+    breaker: CircuitBreaker = CircuitBreaker('llm', failures=3, open_seconds=10)
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert breaker.openings == 1
+    assert not breaker.allow()
+
+
+def test_success_resets_failures(clock: Clock):
+    breaker: CircuitBreaker = CircuitBreaker('llm', failures=3, open_seconds=10)
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == 'closed'
+
+
+def test_open_check_fails_fast(clock: Clock):
+    breaker: CircuitBreaker = opened(clock)
+    clock.now += 2.5
+    with pytest.raises(DependencyUnavailable) as e:
+        breaker.check()
+    assert e.value.dependency == 'llm'
+    assert e.value.retry_after == 8
+    assert breaker.rejected == 1
+    assert breaker.stats()['retry_after'] == 8
+
+
+def test_half_open_lets_one_trial_through(clock: Clock):
+    breaker: CircuitBreaker = opened(clock)
+    clock.now += 10
+    breaker.check()
+    assert breaker.state == 'half_open'
+    with pytest.raises(DependencyUnavailable):
+        breaker.check()
+    assert breaker.rejected == 1
+
+
+def test_trial_success_closes(clock: Clock):
+    breaker: CircuitBreaker = opened(clock)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == 'closed'
+    assert breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_trial_failure_opens_again(clock: Clock):
+    breaker: CircuitBreaker = opened(clock)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert breaker.openings == 2
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10
+    clock.now += 10
+    assert breaker.allow()          # Next trial after open_seconds again
+
+
+def test_released_trial_lets_the_next_call_through(clock: Clock):
+    breaker: CircuitBreaker = opened(clock)
+    clock.now += 10
+    breaker.check()                 # Trial taken, then the call is rejected before reaching the dependency
+    breaker.release()
+    assert breaker.state == 'half_open'
+    breaker.check()                 # Next trial
+    breaker.success()
+    assert breaker.state == 'closed'
+
+
+def test_release_after_an_outcome_is_a_no_op(clock: Clock):
+    breaker: CircuitBreaker = opened(clock)
+    clock.now += 10
+    breaker.check()
+    breaker.failure()
+    breaker.release()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
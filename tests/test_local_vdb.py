@@ -0,0 +1,97 @@
+from datetime import datetime, UTC
+
+import numpy as np
+import pytest
+
+from src.core.settings import settings
+from src.vectordb.base import Doc, make_filters
+from src.vectordb.local_vdb import LocalIndex, LocalRetriever, normalize_rows
+
+
+def index(n: int = 50, dim: int = 8, seed: int = 0) -> LocalIndex:
+    vectors: np.ndarray = np.random.default_rng(seed).normal(size=(n, dim))
+    properties: list[dict] = [
+        {
+            'content': f"doc {i}",
+            'type': 'pdf' if i % 2 else 'html',
+            'updated_at': f"2024-01-{i % 28 + 1:02d}T00:00:00+00:00",
+        }
+        for i in range(n)
+    ]
+    local: LocalIndex = LocalIndex([], np.empty((0, dim), dtype=np.float32), [])
+    local.add([f"id{i}" for i in range(n)], vectors, properties)
+    return local
+
+
+def exact(local: LocalIndex, query: np.ndarray, k: int) -> list[str]:
+    similarity: np.ndarray = local.vectors @ normalize_rows(query)
+    return [local.ids[i] for i in np.argsort(-similarity)[:k]]
+
+
+def test_exact_search_ranks_by_cosine():
+    local: LocalIndex = index()
+    query: np.ndarray = np.asarray(local.vectors[7]) * 3      # Scale does not matter
+    docs: list[Doc] = local.search(list(query), 5)
+    assert [d.uuid for d in docs] == exact(local, query, 5)
+    assert docs[0].uuid == 'id7'
+    assert docs[0].distance == pytest.approx(0.0, abs=1e-5)
+    assert [d.distance for d in docs] == sorted(d.distance for d in docs)
+
+
+def test_search_filters():
+    local: LocalIndex = index()
+    filters: dict = make_filters(
+        doc_type='pdf', updated_from=datetime(2024, 1, 10), updated_to=datetime(2024, 1, 20, tzinfo=UTC),
+    )
+    docs: list[Doc] = local.search(list(local.vectors[0]), 50, filters)
+    assert docs
+    for d in docs:
+        assert d.properties['type'] == 'pdf'
+        assert '2024-01-10' <= d.properties['updated_at'][:10] <= '2024-01-20'
+    assert local.search(list(local.vectors[0]), 5, {'type': 'docx'}) == []
+
+
+def test_k_above_collection_size():
+    local: LocalIndex = index(n=3)
+    assert len(local.search(list(local.vectors[0]), 10)) == 3
+    assert LocalIndex([], np.empty((0, 8)), []).search([1.0] * 8, 10) == []
+
+
+def test_ivf_search(monkeypatch):
+    monkeypatch.setattr(settings, 'local_vdb_ivf_threshold', 100)
+    monkeypatch.setattr(settings, 'local_vdb_nlist', 8)
+    monkeypatch.setattr(settings, 'local_vdb_nprobe', 8)      # All lists: same result as exact search
+    local: LocalIndex = index(n=400)
+    query: np.ndarray = np.asarray(local.vectors[11])
+    assert [d.uuid for d in local.search(list(query), 10)] == exact(local, query, 10)
+    centroids, lists = local.ivf
+    assert centroids.shape == (8, 8)
+    assert sorted(np.concatenate(lists)) == list(range(400))
+
+    monkeypatch.setattr(settings, 'local_vdb_nprobe', 2)      # Approximate: the nearest list holds the vector itself
+    assert local.search(list(query), 1)[0].uuid == 'id11'
+    local.add(['new'], np.ones((1, 8)), [{}])
+    assert local.ivf is None                                    # Rebuilt on next search
+
+
+def test_save_load(tmp_path):
+    local: LocalIndex = index(n=5)
+    local.save(str(tmp_path / 'c'))
+    loaded: LocalIndex = LocalIndex.load(str(tmp_path / 'c'))
+    assert loaded.ids == local.ids
+    assert loaded.properties == local.properties
+    assert np.allclose(loaded.vectors, local.vectors)
+    assert loaded.rows()['id3'] == 3
+
+
+@pytest.mark.parametrize('name', ['', '.', '..', '../etc', 'a/b', '.hidden'])
+def test_collection_path_rejects_traversal(tmp_path, name: str):
+    with pytest.raises(ValueError):
+        LocalRetriever(None, str(tmp_path)).collection_path(name)
+
+
+def test_collection_path(tmp_path):
+    retriever: LocalRetriever = LocalRetriever(None, str(tmp_path))
+    assert retriever.collection_path('catsearch') == str(tmp_path.resolve() / 'catsearch')
+    with pytest.raises(KeyError):
+        retriever.collection('catsearch')
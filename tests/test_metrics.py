@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from src.core.metrics import STAGE_ERRORS, STAGE_LATENCY, observe_call
+
+
+def test_errors_are_counted():
+    def fail():
+        raise RuntimeError("down")
+
+    errors: float = STAGE_ERRORS.labels('test_sync').value
+    with pytest.raises(RuntimeError):
+        observe_call('test_sync', fail)()
+    assert STAGE_ERRORS.labels('test_sync').value == errors + 1
+
+
+def test_cancellation_is_not_an_error():
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        task: asyncio.Task = asyncio.create_task(observe_call('test_cancel', slow)())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    errors: float = STAGE_ERRORS.labels('test_cancel').value
+    asyncio.run(main())
+    assert STAGE_ERRORS.labels('test_cancel').value == errors
+
+
+def test_latency_is_observed():
+    async def fast() -> int:
+        return 1
+
+    count: int = STAGE_LATENCY.labels('test_async').count
+    assert asyncio.run(observe_call('test_async', fast)()) == 1
+    assert STAGE_LATENCY.labels('test_async').count == count + 1
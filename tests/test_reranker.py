@@ -0,0 +1,39 @@
+from src.rerank.base import doc_text
+from src.rerank.reranker import BM25Reranker
+from src.vectordb.base import Doc
+
+
+def doc(content: str, name: str = 'a.pdf') -> Doc:
+    return Doc(uuid=str(hash(content)), properties={'content': content, 'name': name})
+
+
+def test_doc_text():
+    assert doc_text(doc("museum hours")) == "a.pdf\nmuseum hours"
+    assert doc_text(Doc(uuid='1', properties={})) == "\n"
+
+
+def test_bm25_matching_doc_scores_higher():
+    docs: list[Doc] = [doc("parking near the entrance"), doc("museum opening hours on sunday"), doc("tickets")]
+    scores: list[float] = BM25Reranker().bm25("Museum hours", docs)
+    assert scores[1] > 0
+    assert scores[0] == scores[2] == 0
+
+
+def test_bm25_rare_term_weighs_more():
+    docs: list[Doc] = [doc("museum cafe"), doc("museum library"), doc("museum garden")]
+    scores: list[float] = BM25Reranker().bm25("museum library", docs)
+    assert scores[1] > scores[0] == scores[2] > 0
+
+
+def test_rrf_fuses_vector_and_bm25_ranks():
+    # Candidates come ordered by vector distance
+    docs: list[Doc] = [doc("parking"), doc("cafe"), doc("museum opening hours")]
+    scores: list[float] = BM25Reranker(rrf_k=60).score("opening hours", docs)
+    assert scores[2] > scores[1]            # Lexical match moves up
+    assert scores[0] > scores[2]            # Vector top stays ahead: 1/61 + 1/62 > 1/63 + 1/61
+
+
+def test_rrf_equal_ranks_keep_vector_order():
+    docs: list[Doc] = [doc("a"), doc("b"), doc("c")]
+    scores: list[float] = BM25Reranker().score("unrelated", docs)
+    assert scores == sorted(scores, reverse=True)
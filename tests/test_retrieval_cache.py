@@ -0,0 +1,71 @@
+import asyncio
+
+from src.core.cache import MemoryBackend, RetrievalCache
+from src.vectordb.base import Doc
+
+DOCS: list[Doc] = [
+    Doc('u1', 0.1, {'name': 'a.pdf', 'link': 'https://ex.org/a.pdf', 'content': 'long text'}),
+    Doc('u2', 0.2, {'name': 'b.pdf', 'link': 'https://ex.org/b.pdf', 'content': 'more text'}),
+]
+
+
+class FailingBackend(MemoryBackend):
+    async def get(self, key: str):
+        raise ConnectionError("redis is down")
+
+
+def test_hit_keeps_compact_docs():
+    async def main():
+        c: RetrievalCache = RetrievalCache(MemoryBackend(100), ttl=60, properties=['name', 'link'])
+        key: str = await c.key('Blue', 'лувр', 6)
+        assert await c.get(key) is None
+        await c.set(key, DOCS)
+        docs: list[Doc] = await c.get(key)
+        assert [(d.uuid, d.distance) for d in docs] == [('u1', 0.1), ('u2', 0.2)]
+        assert docs[0].properties == {'name': 'a.pdf', 'link': 'https://ex.org/a.pdf'}    # Content: content store
+        assert (c.hits, c.misses) == (1, 1)
+
+    asyncio.run(main())
+
+
+def test_key_depends_on_search_params():
+    async def main():
+        c: RetrievalCache = RetrievalCache(MemoryBackend(100), ttl=60)
+        key: str = await c.key('Blue', 'лувр', 6)
+        assert key == await c.key('blue', ' лувр ', 6)
+        assert key != await c.key('Blue', 'лувр', 20)
+        assert key != await c.key('Blue', 'лувр', 6, {'site_name': 'Музеи'})
+        assert key != await c.key('Blue', 'лувр', 6, mode='bm25')
+        assert key != await c.key('Green', 'лувр', 6)
+
+    asyncio.run(main())
+
+
+def test_version_bump_invalidates_the_collection():
+    async def main():
+        c: RetrievalCache = RetrievalCache(MemoryBackend(100), ttl=60)
+        blue: str = await c.key('Blue', 'лувр', 6)
+        green: str = await c.key('Green', 'лувр', 6)
+        await c.set(blue, DOCS)
+        await c.set(green, DOCS)
+
+        await c.bump('Blue')
+        new_blue: str = await c.key('Blue', 'лувр', 6)
+        assert new_blue != blue
+        assert await c.get(new_blue) is None            # Written before the bump: not read any more
+        assert await c.get(await c.key('Green', 'лувр', 6)) is not None
+        assert c.bumps == 1
+
+        await c.set(new_blue, DOCS[:1])
+        assert len(await c.get(await c.key('Blue', 'лувр', 6))) == 1
+
+    asyncio.run(main())
+
+
+def test_backend_errors_are_misses():
+    async def main():
+        c: RetrievalCache = RetrievalCache(FailingBackend(100), ttl=60)
+        assert await c.get('retrieval:blue:0:key') is None
+        assert c.errors == 1
+
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from src.llm.scheduler import LLMOverloaded, LLMScheduler, Priority
+
+
+async def settle():
+    """ Let queued waiters run up to their next await """
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_acquire_free_slot_at_once():
+    async def main():
+        scheduler: LLMScheduler = LLMScheduler(2, 10, 1.0)
+        await scheduler.acquire()
+        await scheduler.acquire()
+        assert scheduler.stats()['in_flight'] == 2
+        assert scheduler.stats()['queued'] == 0
+        assert scheduler.admitted == 2
+
+    asyncio.run(main())
+
+
+def test_queue_full_is_429():
+    async def main():
+        scheduler: LLMScheduler = LLMScheduler(1, 1, 5.0)
+        await scheduler.acquire()
+        waiter: asyncio.Task = asyncio.create_task(scheduler.acquire())
+        await settle()
+        with pytest.raises(LLMOverloaded) as e:
+            await scheduler.acquire()
+        assert e.value.status_code == 429
+        assert e.value.retry_after >= 1
+        assert scheduler.rejected_full == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_queue_timeout_is_503():
+    async def main():
+        scheduler: LLMScheduler = LLMScheduler(1, 10, 0.05)
+        await scheduler.acquire()
+        with pytest.raises(LLMOverloaded) as e:
+            await scheduler.acquire()
+        assert e.value.status_code == 503
+        assert scheduler.rejected_timeout == 1
+        assert scheduler.stats()['queued'] == 0
+        assert scheduler.stats()['in_flight'] == 1
+
+    asyncio.run(main())
+
+
+def test_release_by_priority_then_fifo():
+    async def main():
+        scheduler: LLMScheduler = LLMScheduler(1, 10, 5.0)
+        await scheduler.acquire()
+        order: list[str] = []
+
+        async def wait(name: str, priority: Priority):
+            await scheduler.acquire(priority)
+            order.append(name)
+
+        tasks: list[asyncio.Task] = []
+        for name, priority in [('low', Priority.low), ('normal1', Priority.normal), ('high', Priority.high),
+                               ('normal2', Priority.normal)]:
+            tasks.append(asyncio.create_task(wait(name, priority)))
+            await settle()
+        assert scheduler.stats()['queued'] == 4
+        for _ in tasks:
+            scheduler.release()
+            await settle()
+        assert order == ['high', 'normal1', 'normal2', 'low']
+        assert scheduler.stats()['in_flight'] == 1
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_passes_on_the_slot():
+    async def main():
+        scheduler: LLMScheduler = LLMScheduler(1, 10, 5.0)
+        await scheduler.acquire()
+        first: asyncio.Task = asyncio.create_task(scheduler.acquire(Priority.high))
+        second: asyncio.Task = asyncio.create_task(scheduler.acquire(Priority.low))
+        await settle()
+        scheduler.release()             # Slot is handed to first...
+        first.cancel()                  # ...which is cancelled before it runs
+        await asyncio.gather(first, return_exceptions=True)
+        await settle()
+        assert second.done() and second.exception() is None
+        assert scheduler.stats()['in_flight'] == 1
+        assert scheduler.stats()['queued'] == 0
+
+    asyncio.run(main())
+
+
+def test_slot_releases():
+    async def main():
+        scheduler: LLMScheduler = LLMScheduler(1, 10, 5.0)
+        async with scheduler.slot():
+            assert scheduler.stats()['in_flight'] == 1
+        assert scheduler.stats()['in_flight'] == 0
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot():
+                raise RuntimeError("generation failed")
+        assert scheduler.stats()['in_flight'] == 0
+        assert scheduler.admitted == 2
+
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from src.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def main():
+        flight: SingleFlight = SingleFlight()
+        runs: list[int] = []
+
+        async def run() -> str:
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        results = await asyncio.gather(*(flight.do('key', run) for _ in range(5)))
+        assert [answer for answer, _ in results] == ['answer'] * 5
+        assert [shared for _, shared in results] == [False, True, True, True, True]
+        assert len(runs) == 1
+        assert flight.stats()['coalesced'] == 4
+        assert flight.stats()['in_flight'] == 0
+
+        await flight.do('key', run)      # Finished flights are not reused
+        assert len(runs) == 2
+
+    asyncio.run(main())
+
+
+def test_different_keys_run_separately():
+    async def main():
+        flight: SingleFlight = SingleFlight()
+
+        async def run() -> int:
+            await asyncio.sleep(0.01)
+            return 1
+
+        results = await asyncio.gather(flight.do('a', run), flight.do('b', run))
+        assert [shared for _, shared in results] == [False, False]
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def main():
+        flight: SingleFlight = SingleFlight()
+
+        async def run() -> str:
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        first: asyncio.Task = asyncio.create_task(flight.do('key', run))
+        second: asyncio.Task = asyncio.create_task(flight.do('key', run))
+        await asyncio.sleep(0.01)
+        first.cancel()                  # The caller that started the execution goes away
+        assert await second == ('answer', True)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(main())
+
+
+def test_error_is_shared():
+    async def main():
+        flight: SingleFlight = SingleFlight()
+
+        async def run():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("llm down")
+
+        results = await asyncio.gather(flight.do('key', run), flight.do('key', run), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.stats()['in_flight'] == 0
+
+    asyncio.run(main())
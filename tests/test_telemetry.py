@@ -0,0 +1,122 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, UTC
+
+from src.core.telemetry import TelemetryWriter
+
+
+class Conn:
+    def __init__(self, pool: 'Pool'):
+        self.pool: Pool = pool
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def executemany(self, sql: str, records: list[tuple]):
+        if self.pool.down:
+            raise ConnectionError("db is down")
+        self.pool.records.extend(records)
+
+
+class Pool:
+    """ asyncpg pool stand-in: collects written records """
+
+    def __init__(self):
+        self.down: bool = False
+        self.records: list[tuple] = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield Conn(self)
+
+
+def writer(pool: Pool, spill_file: str = None, max_size: int = 100) -> TelemetryWriter:
+    return TelemetryWriter(pool, max_size=max_size, batch_size=10, flush_interval=0.01, spill_file=spill_file)
+
+
+def detail(i: int) -> dict:
+    return {'query_id': f"q{i}", 'query_text': 'text', 'timestamp': datetime.now(UTC), 'total_latency': 0.5}
+
+
+def test_batched_write():
+    async def main():
+        pool: Pool = Pool()
+        w: TelemetryWriter = writer(pool)
+        w.start()
+        for i in range(25):
+            w.put_status(f"q{i}", 'done')
+        await asyncio.sleep(0.1)
+        await w.close()
+        assert len(pool.records) == w.written == 25
+        assert w.flushes >= 3
+
+    asyncio.run(main())
+
+
+def test_malformed_row_is_dropped_and_writer_keeps_running():
+    async def main():
+        pool: Pool = Pool()
+        w: TelemetryWriter = writer(pool)
+        w.start()
+        w.put_detail({**detail(0), 'timestamp': 'not a timestamp'})
+        w.put_detail({**detail(1), 'total_latency': 'slow'})
+        w.put_detail(detail(2))
+        await asyncio.sleep(0.1)
+        w.put_detail(detail(3))
+        await asyncio.sleep(0.1)
+        assert not w._task.done()
+        await w.close()
+        assert [r[0] for r in pool.records] == ['q2', 'q3']
+        assert w.dropped == 2
+
+    asyncio.run(main())
+
+
+def test_failed_flush_spills_and_rows_are_reloaded(tmp_path):
+    async def main():
+        pool: Pool = Pool()
+        spill_file: str = str(tmp_path / 'spill.jsonl')
+        w: TelemetryWriter = writer(pool, spill_file)
+        w.start()
+        pool.down = True
+        for i in range(5):
+            w.put_detail(detail(i))
+        await asyncio.sleep(0.1)
+        assert w.flush_errors >= 1
+        assert w.spilled == 5
+        with open(spill_file, encoding='utf-8') as f:
+            assert len(f.readlines()) == 5
+
+        pool.down = False
+        w.put_detail(detail(5))             # Successful flush: spilled rows are retried
+        await asyncio.sleep(0.1)
+        await w.close()
+        assert sorted(r[0] for r in pool.records) == [f"q{i}" for i in range(6)]
+        assert w.reloaded == 5
+
+    asyncio.run(main())
+
+
+def test_full_buffer_spills(tmp_path):
+    async def main():
+        pool: Pool = Pool()
+        spill_file: str = str(tmp_path / 'spill.jsonl')
+        w: TelemetryWriter = writer(pool, spill_file, max_size=2)      # Not started: nothing is consumed
+        for i in range(5):
+            w.put_status(f"q{i}", 'done')
+        assert w.spilled == 3
+        with open(spill_file, encoding='utf-8') as f:
+            assert [json.loads(line)[1]['query_id'] for line in f] == ['q2', 'q3', 'q4']
+        await w.close()
+        assert [r[0] for r in pool.records] == ['q0', 'q1']
+
+    asyncio.run(main())
+
+
+def test_no_spill_file_drops():
+    w: TelemetryWriter = writer(Pool(), max_size=1)
+    w.put_status('q0', 'done')
+    w.put_status('q1', 'done')
+    assert w.dropped == 1